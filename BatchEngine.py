@@ -0,0 +1,185 @@
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import cv2
+
+from FileUtils import write_atomic
+from ImagePipeline import make_pipeline
+from LibraryIndex import SCREENSHOT_EXTENSIONS
+
+MANIFEST_NAME = '.bulk_manifest.jsonl'
+DEFAULT_JPEG_QUALITY = 95
+
+
+def list_screenshots(folder):
+    """
+    :return: The sorted paths of every screenshot directly in folder (Steam's thumbnails folder is skipped)
+    """
+    with os.scandir(folder) as entries:
+        return sorted(entry.path for entry in entries
+                      if entry.is_file() and entry.name.lower().endswith(SCREENSHOT_EXTENSIONS))
+
+
+def recipe_key(settings):
+    # Identifies a set of edits in the manifest, so resuming with different settings redoes every file
+    return hashlib.sha1(repr(sorted(settings.items())).encode()).hexdigest()[:16]
+
+
+# Each pool process keeps one pipeline, so stage buffers are reused from one same sized screenshot to the next
+_process_pipeline = None
+
+
+def init_process():
+    global _process_pipeline
+    # Parallelism comes from the processes, OpenCV's own threads would only fight over the same cores
+    cv2.setNumThreads(1)
+    _process_pipeline = make_pipeline()
+
+
+def process_file(src_path, dst_path, settings, jpeg_quality=DEFAULT_JPEG_QUALITY):
+    """
+    It decodes, edits and encodes one screenshot in a pool process. The output is written atomically.
+
+    :return: The number of bytes written
+    """
+    img = cv2.imread(src_path)
+    if img is None:
+        raise ValueError(f"Could not read {src_path}")
+    pipeline = _process_pipeline if _process_pipeline is not None else make_pipeline()
+    edited = pipeline.render(img, settings)
+
+    ext = os.path.splitext(dst_path)[1]
+    ok, encoded = cv2.imencode(ext, edited, [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality])
+    if not ok:
+        raise ValueError(f"Could not encode {dst_path}")
+    write_atomic(dst_path, encoded.tobytes())
+    return len(encoded)
+
+
+def create_pool(workers):
+    """
+    :return: A process pool for BatchEngine.run, several runs can share one to skip starting the processes each time
+    """
+    # spawn, not fork: the GUI process has Qt threads running that a forked child would inherit half of
+    context = multiprocessing.get_context('spawn')
+    return ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=init_process)
+
+
+class BatchEngine:
+    """
+    Applies one set of edits to many screenshots on a pool of processes, one per core by default.
+
+    Every pool process decodes, edits and encodes on its own, so one process' disk reads and JPEG coding overlap
+    with the others' processing. Finished files are appended to a manifest in the output folder, so a cancelled or
+    crashed run picks up where it stopped.
+    """
+
+    def __init__(self, settings, output_dir, workers=None, jpeg_quality=DEFAULT_JPEG_QUALITY):
+        self.settings = dict(settings)
+        self.output_dir = output_dir
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.jpeg_quality = jpeg_quality
+        self.cancel_event = threading.Event()
+        self.manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def is_cancelled(self):
+        return self.cancel_event.is_set()
+
+    def load_manifest(self):
+        done = set()
+        key = recipe_key(self.settings)
+        if not os.path.exists(self.manifest_path):
+            return done
+        with open(self.manifest_path) as file:
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # A line cut short by a crash
+                    continue
+                if entry.get('recipe') == key:
+                    done.add(entry['file'])
+        return done
+
+    def run(self, paths, progress=None, pool=None):
+        """
+        It processes every path that isn't already in the manifest
+
+        :param paths: The screenshots to edit
+        :param progress: Optional signal (or anything with an emit method) that receives the number of files
+            finished so far, skipped files included
+        :param pool: Optional pool from create_pool to run on, it is left running afterwards.
+            By default a pool of self.workers processes is started and shut down for this run
+        :return: A dict with done, skipped, failed, cancelled, elapsed and images_per_sec
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        key = recipe_key(self.settings)
+        already_done = self.load_manifest()
+        todo = [x for x in paths if os.path.basename(x) not in already_done]
+        skipped = len(paths) - len(todo)
+        finished = skipped
+        if progress is not None:
+            progress.emit(finished)
+
+        start = time.perf_counter()
+        own_pool = pool is None
+        if own_pool:
+            pool = create_pool(self.workers)
+        try:
+            done, failed = self.process_all(pool, todo, key, progress, finished)
+        finally:
+            if own_pool:
+                pool.shutdown()
+
+        elapsed = time.perf_counter() - start
+        return {
+            'done': done,
+            'skipped': skipped,
+            'failed': failed,
+            'cancelled': self.is_cancelled(),
+            'elapsed': elapsed,
+            'images_per_sec': done / elapsed if elapsed > 0 else 0.0,
+        }
+
+    def process_all(self, pool, todo, key, progress, finished):
+        done, failed = 0, []
+        with open(self.manifest_path, 'a') as manifest:
+            queue = iter(todo)
+            in_flight = {}
+            while True:
+                # Only keep a couple of files per process queued, so cancelling doesn't wait for the whole folder
+                # and memory stays flat however many files there are
+                while not self.is_cancelled() and len(in_flight) < self.workers * 2:
+                    src_path = next(queue, None)
+                    if src_path is None:
+                        break
+                    dst_path = os.path.join(self.output_dir, os.path.basename(src_path))
+                    future = pool.submit(process_file, src_path, dst_path, self.settings, self.jpeg_quality)
+                    in_flight[future] = src_path
+                if not in_flight:
+                    break
+
+                completed, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in completed:
+                    src_path = in_flight.pop(future)
+                    try:
+                        future.result()
+                    except Exception as e:
+                        print(f"Bulk apply failed for {src_path}: {e}")
+                        failed.append(src_path)
+                    else:
+                        done += 1
+                        manifest.write(json.dumps({'file': os.path.basename(src_path), 'recipe': key}) + '\n')
+                        manifest.flush()
+                    finished += 1
+                    if progress is not None:
+                        progress.emit(finished)
+        return done, failed
@@ -1,11 +1,15 @@
 import sys
+import threading
+import time
 import traceback
+from abc import ABC, abstractmethod
 
 from PySide2.QtCore import QRunnable, Slot, Signal, QObject
-import sys
-import traceback
 
-from PySide2.QtCore import QRunnable, Slot, Signal, QObject
+from TaskTrace import OUTCOME_ERROR, OUTCOME_OK, get_default_tracer
+
+# Progress and partial results reach the GUI thread at most this often, about once a frame
+EMIT_INTERVAL = 1 / 60
 
 
 class WorkerSignals(QObject):
@@ -13,31 +17,161 @@ class WorkerSignals(QObject):
     error = Signal(tuple)
     progress = Signal(int)
     result = Signal(object)
+    # A list of items the function handed out before it finished
+    partial = Signal(object)
+
+
+class ThrottledEmitter(ABC):
+    """
+    Passes what a function emits on to a signal at most every interval seconds. Whatever is held back goes out from
+    the emitter's timer thread once the interval has passed, so the last value before a long pause isn't stuck until
+    the next emit, and flush() passes on whatever is left when the function returns.
+
+    The timer thread is started with the first value held back and reused for every interval after it, flush()
+    stops it. Signals are emitted with the lock held, so the timer firing late can't reorder them with flush().
+    """
+
+    def __init__(self, signal, interval=EMIT_INTERVAL):
+        self.signal = signal
+        self.interval = interval
+        self.lock = threading.Condition()
+        self.last_emit = 0
+        # Set while something is held back for the timer to send
+        self.waiting = False
+        self.timer = None
+
+    @abstractmethod
+    def hold(self, value):
+        # Keeps value until it is sent, called with the lock held
+        pass
+
+    @abstractmethod
+    def take(self):
+        # What to send now and forgets it, None if nothing is held. Called with the lock held
+        pass
+
+    def emit(self, value):
+        with self.lock:
+            self.hold(value)
+            if self.last_emit + self.interval <= time.perf_counter():
+                self.send()
+                return
+            self.waiting = True
+            if self.timer is None:
+                self.timer = threading.Thread(target=self.run_timer, daemon=True)
+                self.timer.start()
+            else:
+                self.lock.notify()
+
+    def run_timer(self):
+        with self.lock:
+            # Until flush() lets go of this thread
+            while self.timer is threading.current_thread():
+                if not self.waiting:
+                    self.lock.wait()
+                    continue
+                wait = self.last_emit + self.interval - time.perf_counter()
+                if wait > 0:
+                    self.lock.wait(wait)
+                else:
+                    self.send()
+
+    def send(self):
+        self.waiting = False
+        value = self.take()
+        if value is not None:
+            self.last_emit = time.perf_counter()
+            self.signal.emit(value)
+
+    def flush(self):
+        with self.lock:
+            self.timer = None
+            self.lock.notify()
+            self.send()
+
+
+class ThrottledProgress(ThrottledEmitter):
+    """
+    Stands in for the progress signal. Functions call emit() as often as they like, only the latest value is
+    passed on.
+    """
+
+    def __init__(self, signal, interval=EMIT_INTERVAL):
+        super().__init__(signal, interval)
+        self.value = None
+
+    def hold(self, value):
+        self.value = value
+
+    def take(self):
+        value, self.value = self.value, None
+        return value
+
+
+class PartialResults(ThrottledEmitter):
+    """
+    Collects the items a streaming function hands out with emit() and passes them on as lists. The first item goes
+    out straight away, so the first result isn't held back.
+    """
+
+    def __init__(self, signal, interval=EMIT_INTERVAL):
+        super().__init__(signal, interval)
+        self.items = []
+
+    def hold(self, item):
+        self.items.append(item)
+
+    def take(self):
+        batch, self.items = self.items, []
+        return batch or None
 
 
 class Worker(QRunnable, QObject):
-    def __init__(self, function, *args, **kwargs):
+    def __init__(self, function, *args, partial_results=False, **kwargs):
+        """
+        It runs function(*args, **kwargs, progress=...) on a thread pool
+
+        :param function: What to run. It gets a progress kwarg to emit() ints to, throttled to about once a frame
+        :param partial_results: Also pass function a partial kwarg to emit() items to as it goes. They arrive in
+            batches on signals.partial, all of them before signals.result
+        """
         super(Worker, self).__init__()
         self.running_function = function
         self.args = args
         self.kwargs = kwargs
         self.signals = WorkerSignals()
 
-        self.kwargs['progress'] = self.signals.progress
+        self.progress = ThrottledProgress(self.signals.progress)
+        self.kwargs['progress'] = self.progress
+        self.partial = PartialResults(self.signals.partial) if partial_results else None
+        if self.partial is not None:
+            self.kwargs['partial'] = self.partial
+        # Workers are started as soon as they are created, so this is when they are queued
+        self.tracer = get_default_tracer()
+        self.trace = self.tracer.enqueue(getattr(function, '__qualname__', repr(function)))
 
     @Slot()
     def run(self):
+        self.tracer.start(self.trace)
+        outcome = OUTCOME_ERROR
+        result = None
+        error = None
         try:
-            print("Try")
             result = self.running_function(*self.args, **self.kwargs)
-        except NotImplementedError:
-            print("error")
+            outcome = OUTCOME_OK
+        except Exception:
+            # Whatever went wrong, finished still goes out, so nothing waits on this worker forever
             traceback.print_exc()
             exctype, value = sys.exc_info()[:2]
-            self.signals.error.emit((exctype, value, traceback.format_exc()))
-        else:
-            print("else")
-            self.signals.result.emit(result)
+            error = (exctype, value, traceback.format_exc())
         finally:
-            print("Finally")
-            self.signals.finished.emit()
\ No newline at end of file
+            # Whatever was handed out before the function returned (or failed) arrives before the end
+            if self.partial is not None:
+                self.partial.flush()
+            self.progress.flush()
+            if outcome == OUTCOME_OK:
+                self.signals.result.emit(result)
+            elif error is not None:
+                self.signals.error.emit(error)
+            self.tracer.finish(self.trace, outcome, result)
+            self.signals.finished.emit()
@@ -0,0 +1,221 @@
+from concurrent.futures import ThreadPoolExecutor
+from itertools import combinations
+
+import cv2
+import numpy as np
+
+# Hashes within this many bits of each other are the same shot (a burst, or the same view a second later)
+DEFAULT_MAX_DISTANCE = 8
+HASH_THREADS = 8
+# Images are hashed this many at a time, so memory stays flat however big the library is
+HASH_BATCH = 256
+DHASH_SIZE = (9, 8)
+PHASH_SIZE = 32
+PHASH_KEEP = 8
+# Multi-index hashing splits the 64 bits into this many chunks of 16 bits
+MIH_CHUNKS = 4
+
+# Bits set in every byte value, for counting the bits of many hashes at once
+POPCOUNT_8 = np.array([bin(x).count('1') for x in range(256)], dtype=np.uint8)
+BIT_WEIGHTS = (1 << np.arange(63, -1, -1, dtype=np.uint64)).astype(np.uint64)
+
+
+def dct_matrix(size):
+    # Orthonormal DCT-II as a matrix, so a whole batch is transformed with two matmuls instead of one dct per image
+    k = np.arange(size)[:, None]
+    n = np.arange(size)[None, :]
+    matrix = np.sqrt(2 / size) * np.cos(np.pi * (2 * n + 1) * k / (2 * size))
+    matrix[0] /= np.sqrt(2)
+    return matrix.astype(np.float32)
+
+
+PHASH_DCT = dct_matrix(PHASH_SIZE)
+
+
+def load_small_gray(path):
+    """
+    :return: path as a small greyscale image, or None if it can't be read. JPEGs are decoded at 1/8 size, which
+        skips most of the decode, a 64 bit hash doesn't need more.
+    """
+    img = cv2.imread(path, cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    if img is None:
+        return None
+    # dHash and pHash both shrink further, INTER_AREA averages instead of sampling
+    return cv2.resize(img, (PHASH_SIZE, PHASH_SIZE), interpolation=cv2.INTER_AREA)
+
+
+def bits_to_hashes(bits):
+    # (n, 64) booleans -> (n,) uint64, first bit is the most significant
+    return (bits.astype(np.uint64) * BIT_WEIGHTS).sum(axis=1, dtype=np.uint64)
+
+
+def hash_batch(images):
+    """
+    It computes the dHash and pHash of a batch of images at once
+
+    :param images: A (n, 32, 32) uint8 array of greyscale images
+    :return: Two (n,) uint64 arrays, the dHashes and the pHashes
+    """
+    images = images.astype(np.float32)
+    n = len(images)
+
+    # dHash: is each pixel brighter than its right neighbour, on a 9x8 shrink
+    small = np.stack([cv2.resize(x, DHASH_SIZE, interpolation=cv2.INTER_AREA) for x in images])
+    dhashes = bits_to_hashes((small[:, :, 1:] > small[:, :, :-1]).reshape(n, 64))
+
+    # pHash: is each of the lowest 8x8 frequencies above their median, DC term left out of the median
+    dct = PHASH_DCT @ images @ PHASH_DCT.T
+    low = dct[:, :PHASH_KEEP, :PHASH_KEEP].reshape(n, -1)
+    median = np.median(low[:, 1:], axis=1, keepdims=True)
+    phashes = bits_to_hashes(low > median)
+    return dhashes, phashes
+
+
+def compute_hashes(paths, max_workers=HASH_THREADS, progress=None, cancel_event=None):
+    """
+    It hashes every path, decoding on a thread pool (OpenCV releases the GIL) and hashing in vectorized batches
+
+    :param paths: The images to hash
+    :param progress: Optional signal (or anything with an emit method) that receives the number of images done
+    :param cancel_event: Optional threading.Event, once it is set no more batches are started
+    :return: A dict of path -> (dhash, phash), paths that couldn't be read (or weren't reached) are left out
+    """
+    hashes = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for start in range(0, len(paths), HASH_BATCH):
+            if cancel_event is not None and cancel_event.is_set():
+                break
+            chunk = paths[start:start + HASH_BATCH]
+            loaded = [(path, img) for path, img in zip(chunk, pool.map(load_small_gray, chunk)) if img is not None]
+            if loaded:
+                dhashes, phashes = hash_batch(np.stack([img for _, img in loaded]))
+                for (path, _), dhash, phash in zip(loaded, dhashes, phashes):
+                    hashes[path] = (int(dhash), int(phash))
+            if progress is not None:
+                progress.emit(start + len(chunk))
+    return hashes
+
+
+def hamming(a, b):
+    """
+    :return: The number of differing bits between uint64 arrays a and b (broadcast)
+    """
+    xor = np.bitwise_xor(a, b)
+    return POPCOUNT_8[xor.view(np.uint8)].reshape(xor.shape + (8,)).sum(axis=-1)
+
+
+def connected_components(size, first, second):
+    """
+    It labels the connected components of a graph given as edge arrays, vectorized: every node repeatedly takes the
+    smallest label among its neighbours and its label's label, until nothing changes
+
+    :return: A (size,) array with the smallest node index of each node's component
+    """
+    labels = np.arange(size)
+    while True:
+        previous = labels.copy()
+        smallest = np.minimum(labels[first], labels[second])
+        np.minimum.at(labels, first, smallest)
+        np.minimum.at(labels, second, smallest)
+        # Pointer jumping, so long chains collapse in a few rounds
+        labels = labels[labels]
+        if np.array_equal(labels, previous):
+            return labels
+
+
+def chunk_masks(bits, radius):
+    # Every value of the given width with at most radius bits set
+    return np.array([sum(1 << x for x in flipped) for count in range(radius + 1)
+                     for flipped in combinations(range(bits), count)], dtype=np.uint64)
+
+
+def candidate_pairs(values, masks, bits):
+    """
+    :return: Every (i, j) with i < j whose values differ by one of masks. values are bits wide, so each value's
+        bucket is found with a table lookup rather than a search
+    """
+    order = np.argsort(values, kind='stable')
+    bucket_sizes = np.bincount(values.astype(np.int64), minlength=1 << bits)
+    bucket_starts = np.cumsum(bucket_sizes) - bucket_sizes
+    first, second = [], []
+    for mask in masks:
+        wanted = (values ^ mask).astype(np.int64)
+        counts = bucket_sizes[wanted]
+        found = np.flatnonzero(counts)
+        if len(found) == 0:
+            continue
+        counts = counts[found]
+        # Expand each query into one pair per match
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        a = np.repeat(found, counts)
+        b = order[np.repeat(bucket_starts[wanted[found]], counts) + offsets]
+        keep = a < b
+        first.append(a[keep])
+        second.append(b[keep])
+    return first, second
+
+
+def group_similar(hashes, max_distance=DEFAULT_MAX_DISTANCE):
+    """
+    It groups hashes that are within max_distance bits of each other (transitively), without comparing every pair.
+
+    Multi-index hashing: the 64 bits are split into MIH_CHUNKS chunks. Two hashes within max_distance bits have at
+    least one chunk within max_distance // MIH_CHUNKS bits of each other, so each hash only looks up the few
+    chunk values that close to its own, and only those candidates are compared in full.
+
+    :param hashes: A sequence of 64 bit hashes
+    :return: Lists of indices into hashes, one per group of two or more, largest group first
+    """
+    hashes = np.asarray(hashes, dtype=np.uint64)
+    if len(hashes) < 2:
+        return []
+    # Identical hashes (exact duplicates, all black frames) are grouped once up front
+    unique, inverse = np.unique(hashes, return_inverse=True)
+
+    bits = 64 // MIH_CHUNKS
+    masks = chunk_masks(bits, max_distance // MIH_CHUNKS)
+    chunk_mask = np.uint64((1 << bits) - 1)
+    first, second = [], []
+    for chunk in range(MIH_CHUNKS):
+        values = (unique >> np.uint64(chunk * bits)) & chunk_mask
+        chunk_first, chunk_second = candidate_pairs(values, masks, bits)
+        first += chunk_first
+        second += chunk_second
+
+    labels = np.arange(len(unique))
+    if first:
+        first, second = np.concatenate(first), np.concatenate(second)
+        close = hamming(unique[first], unique[second]) <= max_distance
+        if close.any():
+            labels = connected_components(len(unique), first[close], second[close])
+    labels = labels[inverse]
+
+    # Group the original indices by component, keeping components of two or more
+    order = np.argsort(labels, kind='stable')
+    sorted_labels = labels[order]
+    starts = np.flatnonzero(np.r_[True, sorted_labels[1:] != sorted_labels[:-1]])
+    groups = [x.tolist() for x in np.split(order, starts[1:]) if len(x) > 1]
+    return sorted(groups, key=len, reverse=True)
+
+
+def find_similar(library, app_id, max_distance=DEFAULT_MAX_DISTANCE, progress=None, cancel_event=None):
+    """
+    It groups app_id's near duplicate screenshots. Hashes are stored in the library index, so only new or changed
+    screenshots are decoded.
+
+    :param library: A LibraryIndex
+    :param app_id: The Steam App ID
+    :param progress: Optional signal (or anything with an emit method) that receives the number of images hashed
+    :param cancel_event: Optional threading.Event that stops the hashing early, the hashes done so far are kept
+    :return: Lists of screenshot paths, one per group of similar shots, largest group first
+    """
+    paths = library.screenshot_paths(app_id)
+    known = library.get_hashes(app_id)
+    missing = [x for x in paths if x not in known]
+    if missing:
+        computed = compute_hashes(missing, progress=progress, cancel_event=cancel_event)
+        library.put_hashes(computed)
+        known.update(computed)
+    paths = [x for x in paths if x in known]
+    groups = group_similar([known[x][1] for x in paths], max_distance)
+    return [[paths[x] for x in group] for group in groups]
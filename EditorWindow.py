@@ -3,17 +3,89 @@ import os
 import sys
 
 import cv2
-import imutils
-import numpy as np
-from PySide2.QtCore import Qt
-from PySide2.QtGui import QPixmap, QImage, QColor, qRgb
+from PySide2.QtCore import Qt, QObject, QThreadPool, Signal
+from PySide2.QtGui import QPixmap, QImage
 from PySide2.QtWidgets import QApplication, QWidget, QPushButton, QGridLayout, QLabel, \
-    QHBoxLayout, QVBoxLayout, QComboBox, QSlider, QLayout, QSizePolicy
+    QHBoxLayout, QVBoxLayout, QComboBox, QSlider, QProgressDialog, QSpinBox, QCheckBox
+from BatchEngine import BatchEngine, list_screenshots
 from CustomWorkerThread import Worker
+from ExportQueue import ExportQueue, export_path_for
+from ImagePipeline import EXPORT_FORMATS, FILTERS, ExportOptions, Tone, make_pipeline, make_proxy
+from TileViewer import TileView
+
+
+CONFIG_PATH = 'cache/steam_info.config'
+
+
+def get_export_path():
+    """
+    :return: The export_path from steam_info.config, or export/ if it isn't set
+    """
+    parser = configparser.ConfigParser()
+    parser.read(CONFIG_PATH)
+    return parser.get('INFO', 'export_path', fallback='export/')
+
+
+# Both previews are drawn at most this big, so all interactive edits run on an image this size
+PREVIEW_WIDTH = 600
+PREVIEW_HEIGHT = 400
+
+
+class PreviewRenderer(QObject):
+    """
+    Renders the preview on the thread pool, one frame at a time.
+
+    Requests that arrive while a frame is rendering are merged into one, and a frame that was superseded
+    while it rendered is dropped instead of shown, so dragging a slider never queues up stale frames.
+    """
+    rendered = Signal(object)
+
+    def __init__(self, pipeline, source, parent=None):
+        super().__init__(parent)
+        self.pipeline = pipeline
+        self.source = source
+        self.requested = 0
+        # The request the frame being rendered was started for
+        self.started = 0
+        self.busy = False
+
+    def request(self):
+        self.requested += 1
+        if not self.busy:
+            self.start()
+
+    def start(self):
+        self.busy = True
+        self.started = self.requested
+        # Snapshot the settings here, the sliders keep moving while the worker renders
+        worker = Worker(function=self.render, settings=self.pipeline.settings(), generation=self.requested)
+        worker.signals.result.connect(self.on_rendered)
+        # Also after a render that raised, so one bad frame doesn't stop the preview for good
+        worker.signals.finished.connect(self.on_finished)
+        QThreadPool.globalInstance().start(worker)
+
+    def render(self, settings, generation, progress):
+        try:
+            return generation, self.pipeline.render(self.source, settings)
+        except cv2.error as e:
+            print(e)
+            return generation, None
+
+    def on_rendered(self, result):
+        generation, img = result
+        # A frame that was superseded while it rendered is dropped
+        if generation == self.requested and img is not None:
+            self.rendered.emit(img)
+
+    def on_finished(self):
+        self.busy = False
+        if self.started != self.requested:
+            # Something changed while this frame rendered, render the latest settings instead
+            self.start()
 
 
 class EditorWindow(QWidget):
-    def __init__(self, img_path, app_id):
+    def __init__(self, img_path, app_id, export_queue=None):
         super().__init__()
 
         # Inits
@@ -24,9 +96,10 @@ class EditorWindow(QWidget):
         # Declarations for image preview area
         self.original_image_lbl = None
         self.edited_image_lbl = None
-        # Read in images
+        # Read in the image once. Slider changes only ever touch the small proxy,
+        # the full resolution image is only processed on export
         self.original_cv_img = cv2.imread(self.img_path)
-        self.edited_cv_img = cv2.imread(self.img_path)
+        self.proxy_cv_img = make_proxy(self.original_cv_img, PREVIEW_WIDTH, PREVIEW_HEIGHT)
 
         self.image_preview_layout = None
 
@@ -34,28 +107,46 @@ class EditorWindow(QWidget):
         self.editor_grid = None
         self.filter_label = None
         self.filter_dropdown = None
-        self.filters = ["None", "Sharpen", "Sepia"]
+        self.filters = list(FILTERS)
         self.curr_filter = None
 
-        ### Declarations for filter kernels
-        self.sepia_kernel = np.matrix(([[0.393, 0.769, 0.189],
-                                      [0.349, 0.686, 0.168],
-                                      [0.272, 0.534, 0.131]]))
-        self.sharpen_kernel = np.matrix(([[-1, -1, -1],
-                                        [-1, 9, -1],
-                                        [-1, -1, -1]]))
-
         # Tracks Slider Values (Allows manipulation before running filters)
         # Will be used to export images
         self.brightness_lvl = 0
         self.contrast_lvl = 0
 
+        # The edit chain, in order. Each stage keeps its last output, so moving a later slider
+        # doesn't rerun the stages before it
+        self.pipeline = make_pipeline({"filter": self.curr_filter, "tone": self.current_tone()})
+        self.preview_renderer = PreviewRenderer(self.pipeline, self.proxy_cv_img, parent=self)
+        self.preview_renderer.rendered.connect(lambda img: self.set_label(img, self.edited_image_lbl))
+
         # Declaration for btn area
         self.footer_hbox = None
         self.open_export_btn = None
         self.bulk_apply_btn = None
+        self.full_size_btn = None
         self.cancel_btn = None
 
+        # The full resolution viewer, a window of its own that goes away with the editor
+        self.full_size_viewer = None
+
+        # Declarations for export options
+        self.format_dropdown = None
+        self.quality_spin = None
+        self.progressive_check = None
+        self.png_compression_spin = None
+        self.export_status_label = None
+        # Exports run in the background, several can be queued at once. The browser hands every editor the same
+        # queue, so exports still running when an editor is closed carry on without it
+        self.export_queue = export_queue if export_queue is not None else ExportQueue(parent=self)
+        self.export_queue.pending_changed.connect(self.on_export_pending_changed)
+
+        # Set while a bulk apply is running
+        self.bulk_engine = None
+        self.bulk_worker = None
+        self.bulk_progress_box = None
+
         # Main Layout Init
         self.main_layout = QVBoxLayout()
 
@@ -66,6 +157,7 @@ class EditorWindow(QWidget):
 
         # Set the main layout after everything is build
         self.setLayout(self.main_layout)
+        self.on_export_pending_changed(self.export_queue.pending)
         # show call
         self.show()
 
@@ -77,15 +169,12 @@ class EditorWindow(QWidget):
         self.image_preview_layout = QHBoxLayout()
 
         self.original_image_lbl = QLabel()
-        self.original_image_lbl.setPixmap(QPixmap(self.img_path))
-        self.original_image_lbl.setPixmap(
-            QPixmap((self.img_path)).scaled(600, 400, Qt.KeepAspectRatio, Qt.SmoothTransformation))
+        self.set_label(self.proxy_cv_img, self.original_image_lbl)
         self.original_image_lbl.setScaledContents(False)
         self.image_preview_layout.addWidget(self.original_image_lbl)
 
         self.edited_image_lbl = QLabel()
-        self.edited_image_lbl.setPixmap(
-            QPixmap(self.img_path).scaled(600, 400, Qt.KeepAspectRatio, Qt.SmoothTransformation))
+        self.set_label(self.proxy_cv_img, self.edited_image_lbl)
         self.edited_image_lbl.setScaledContents(False)
         self.image_preview_layout.addWidget((self.edited_image_lbl))
 
@@ -124,11 +213,66 @@ class EditorWindow(QWidget):
         self.con_slider = QSlider(Qt.Horizontal)
         self.con_slider.setRange(1, 100)
         self.con_slider.setValue(50)
-        self.con_slider.sliderReleased.connect(self.set_contrast_levels)
+        self.con_slider.valueChanged['int'].connect(self.on_contrast_changed)
 
         self.editor_grid.addWidget(self.con_label, 2, 0)
         self.editor_grid.addWidget(self.con_slider, 2, 1)
 
+        self.create_export_options()
+
+    def create_export_options(self):
+        # Format and encoder settings used by Export
+        defaults = ExportOptions()
+        format_label = QLabel("Export Format")
+        format_label.setStyleSheet('color: white')
+        self.format_dropdown = QComboBox()
+        self.format_dropdown.addItems(list(EXPORT_FORMATS))
+        self.format_dropdown.setCurrentText(defaults.format)
+        self.format_dropdown.currentIndexChanged.connect(self.on_export_format_changed)
+
+        # Shared by JPEG and WebP, both take a 0..100 quality
+        self.quality_spin = QSpinBox()
+        self.quality_spin.setRange(0, 100)
+        self.quality_spin.setPrefix("Quality ")
+        self.quality_spin.setValue(defaults.jpeg_quality)
+
+        self.progressive_check = QCheckBox("Progressive")
+        self.progressive_check.setStyleSheet('color: white')
+        self.progressive_check.setChecked(defaults.jpeg_progressive)
+
+        self.png_compression_spin = QSpinBox()
+        self.png_compression_spin.setRange(0, 9)
+        self.png_compression_spin.setPrefix("Compression ")
+        self.png_compression_spin.setValue(defaults.png_compression)
+
+        self.export_status_label = QLabel()
+        self.export_status_label.setStyleSheet('color: white')
+
+        options_hbox = QHBoxLayout()
+        options_hbox.addWidget(self.format_dropdown)
+        options_hbox.addWidget(self.quality_spin)
+        options_hbox.addWidget(self.progressive_check)
+        options_hbox.addWidget(self.png_compression_spin)
+        options_hbox.addWidget(self.export_status_label)
+
+        self.editor_grid.addWidget(format_label, 3, 0)
+        self.editor_grid.addLayout(options_hbox, 3, 1)
+        self.on_export_format_changed()
+
+    def on_export_format_changed(self, *args):
+        ext = EXPORT_FORMATS[self.format_dropdown.currentText()]
+        # Only show the settings the chosen encoder understands
+        self.quality_spin.setVisible(ext != ".png")
+        self.progressive_check.setVisible(ext == ".jpg")
+        self.png_compression_spin.setVisible(ext == ".png")
+
+    def current_export_options(self):
+        return ExportOptions(format=self.format_dropdown.currentText(),
+                             jpeg_quality=self.quality_spin.value(),
+                             jpeg_progressive=self.progressive_check.isChecked(),
+                             png_compression=self.png_compression_spin.value(),
+                             webp_quality=self.quality_spin.value())
+
     def create_footer_btn_area(self):
         self.footer_hbox = QHBoxLayout()
 
@@ -141,18 +285,18 @@ class EditorWindow(QWidget):
         self.bulk_apply_btn = QPushButton("Bulk Apply")
         self.bulk_apply_btn.clicked.connect(self.on_bulk_apply)
         self.footer_hbox.addWidget(self.bulk_apply_btn)
+        self.full_size_btn = QPushButton("Full Size")
+        self.full_size_btn.clicked.connect(self.on_full_size)
+        self.footer_hbox.addWidget(self.full_size_btn)
 
         self.main_layout.addLayout(self.footer_hbox)
 
         self.main_layout.addLayout(self.editor_grid)
 
     def set_label(self, cv2_img, label):
-        """ This function will take image input and resize it
-            only for display purpose and convert it to QImage
-            to set at the label.
+        """ This function will take a preview sized image input
+            and convert it to QImage to set at the label.
         """
-        self.tmp = cv2_img
-        cv2_img = imutils.resize(cv2_img, width=600)
         frame = cv2.cvtColor(cv2_img, cv2.COLOR_BGR2RGB)
         q_image = QImage(frame, frame.shape[1], frame.shape[0], frame.strides[0], QImage.Format_RGB888)
         label.setPixmap(QPixmap.fromImage(q_image))
@@ -161,82 +305,97 @@ class EditorWindow(QWidget):
         if self.curr_filter == self.filter_dropdown.currentText():
             self.curr_filter = None
         self.curr_filter = self.filter_dropdown.currentText()
+        self.pipeline.set("filter", self.curr_filter)
         self.update_changes()
 
-    def set_filter(self, filter):
-        # Convert to proper forma, use numpy
-        img = cv2.cvtColor(self.edited_cv_img, cv2.COLOR_BGR2RGB)
-        img = np.array(img, dtype=np.float64)
-
-
-        # Simply determine which filter to use
-        if filter == "Sepia":
-            img = cv2.transform(img, self.sepia_kernel)
-        elif filter == "Sharpen":
-            img = cv2.filter2D(self.edited_cv_img, -1, self.sharpen_kernel)
-        elif filter == "None":
-            img = self.original_cv_img
-
-        # Clip Values and convert back to uint8 format for cv
-        # Also, convert back from RGB to BGR
-        img[np.where(img > 255)] = 255
-        img = np.array(img, dtype=np.uint8)
-        img = cv2.cvtColor(img, cv2.COLOR_RGB2BGR)
-        return img
-
-    def set_brightness_levels(self, img):
-        hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
-        h, s, v = cv2.split(hsv)
-        v = cv2.add(v, self.brightness_lvl)
-        v[v > 255] = 255
-        v[v < 0] = 0
-        final_hsv = cv2.merge((h, s, v))
-        back_to_bgr = cv2.cvtColor(final_hsv, cv2.COLOR_HSV2BGR)
-        return back_to_bgr
-
     def on_brightness_changed(self, new_val):
         # Limit the brightness value a bit
         # brightness > 25 = brighten, brightness < 25 = darken
         self.brightness_lvl = new_val - 25
+        self.pipeline.set("tone", self.current_tone())
         self.update_changes()
 
-    def set_contrast_levels(self):
-        pass
-
     def on_contrast_changed(self, new_val):
-        pass
+        # contrast > 50 = more contrast, contrast < 50 = flatter
+        self.contrast_lvl = new_val - 50
+        self.pipeline.set("tone", self.current_tone())
+        self.update_changes()
 
-    def update_changes(self):
-        # This method should iterate over ALL changes and apply them. Maybe only apply them if they've been updated?
-        img = self.edited_cv_img
-        if self.curr_filter is not None:
-            img = self.set_filter(self.curr_filter)
-        img = self.set_brightness_levels(img=img)
-        self.set_label(img, self.edited_image_lbl)
+    def current_tone(self):
+        return Tone(brightness=self.brightness_lvl, contrast=self.contrast_lvl)
 
-    def on_export_clicked(self):
-        pass
+    def apply_changes(self, img):
+        # Runs every current edit on a one-off image such as the full size export, leaving the preview cache alone
+        return self.pipeline.render(img, use_cache=False)
 
-    def on_export(self, img_path):
-        # Here load the cv2 img again and rerun all current values on it.
-        # TODO: Allow user to choose file path. Do this HERE IN THE EDITOR UI
-        # Do NOT create a separate file or class. Make widget and show it.
+    def render_preview(self):
+        # Synchronous preview render, reusing cached stage outputs
+        return self.pipeline.render(self.proxy_cv_img)
 
-        final_img = cv2.imread(img_path)
-        print("Exported Image")
-        if self.curr_filter is not None:
-            final_img = self.set_filter(self.curr_filter)
-        final_img = self.set_brightness_levels(final_img)
+    def update_changes(self):
+        # Rendered off the GUI thread, the label is updated when the latest frame is ready
+        self.preview_renderer.request()
 
-        if not os.path.exists("cache/test"):
-            os.mkdir("cache/test")
+    def on_export(self, img_path):
+        # The full resolution render and the encode both happen on the export queue's threads,
+        # with the edits and options as they are right now
+        options = self.current_export_options()
+        dst_path = export_path_for(os.path.join(get_export_path(), str(self.app_id)), img_path, options)
+        self.export_queue.submit(self.original_cv_img, self.pipeline, options, dst_path)
 
-        cv2.imwrite("cache/test/test_img.jpg", final_img)
+    def on_export_pending_changed(self, pending):
+        self.export_status_label.setText(f"Exporting {pending}..." if pending else "")
+
+    def shutdown(self):
+        """
+        It detaches the editor from the work that outlives it, before it is closed or replaced. Queued exports
+        carry on, a running bulk apply is cancelled
+        """
+        self.export_queue.pending_changed.disconnect(self.on_export_pending_changed)
+        if self.bulk_engine is not None:
+            # The worker stops after the files in flight, nothing it sends back reaches the editor
+            self.bulk_engine.cancel()
+            self.bulk_worker.signals.progress.disconnect(self.bulk_progress_box.setValue)
+            self.bulk_worker.signals.result.disconnect(self.on_bulk_apply_done)
+            self.bulk_progress_box.close()
+            self.bulk_engine = None
+            self.bulk_worker = None
+
+    def on_full_size(self):
+        # The original at up to full resolution, decoded a tile at a time as it is zoomed and panned
+        if self.full_size_viewer is not None:
+            self.full_size_viewer.close()
+            self.full_size_viewer.deleteLater()
+        self.full_size_viewer = TileView(self.img_path, parent=self)
+        self.full_size_viewer.setWindowFlag(Qt.Window)
+        self.full_size_viewer.resize(1280, 720)
+        self.full_size_viewer.show()
 
     def on_bulk_apply(self):
-        screenshot_dir = str(os.path.dirname(self.img_path))
-        for x in os.listdir(screenshot_dir):
-            print(x)
+        # Applies the current edits to every screenshot of this game, in other processes
+        if self.bulk_engine is not None:
+            return
+        screenshot_paths = list_screenshots(os.path.dirname(self.img_path))
+        output_dir = os.path.join(get_export_path(), str(self.app_id), "bulk")
+        self.bulk_engine = BatchEngine(self.pipeline.settings(), output_dir)
+
+        self.bulk_progress_box = QProgressDialog("Applying edits to every screenshot...", "Cancel", 0,
+                                                 len(screenshot_paths), self)
+        self.bulk_progress_box.setWindowTitle("Bulk Apply")
+        self.bulk_progress_box.canceled.connect(self.bulk_engine.cancel)
+        self.bulk_progress_box.show()
+
+        self.bulk_worker = Worker(function=self.bulk_engine.run, paths=screenshot_paths)
+        self.bulk_worker.signals.progress.connect(self.bulk_progress_box.setValue)
+        self.bulk_worker.signals.result.connect(self.on_bulk_apply_done)
+        QThreadPool.globalInstance().start(self.bulk_worker)
+
+    def on_bulk_apply_done(self, stats):
+        self.bulk_progress_box.close()
+        print(f"Bulk apply: {stats['done']} done, {stats['skipped']} already done, {len(stats['failed'])} failed, "
+              f"{stats['images_per_sec']:.1f} images/sec" + (" (cancelled)" if stats['cancelled'] else ""))
+        self.bulk_engine = None
+        self.bulk_worker = None
 
 
 if __name__ == "__main__":
@@ -0,0 +1,93 @@
+import os
+import traceback
+
+from PySide2.QtCore import QObject, QThreadPool, Signal
+
+from CustomWorkerThread import Worker
+from FileUtils import write_atomic
+from ImagePipeline import encode_image, encode_params
+
+# Each export holds a full resolution source and its edited copy, so only a couple run at the same time
+EXPORT_THREADS = 2
+
+
+class ExportJob:
+    """
+    One queued export: the edits to run on source, and where and how to write the result
+    """
+
+    def __init__(self, source, pipeline, settings, options, dst_path):
+        self.source = source
+        self.pipeline = pipeline
+        self.settings = settings
+        self.options = options
+        self.dst_path = dst_path
+
+
+def export_path_for(export_dir, img_path, options):
+    """
+    :return: The file the export of img_path with options is written to, export_dir/<name>.<format's extension>
+    """
+    ext, _ = encode_params(options)
+    name = os.path.splitext(os.path.basename(img_path))[0]
+    return os.path.join(export_dir, name + ext)
+
+
+class ExportQueue(QObject):
+    """
+    Renders, encodes and writes exports on its own thread pool, so the editor stays responsive while a full
+    resolution image is processed. Any number of exports can be queued, each with its own edits and encoder settings.
+    """
+    exported = Signal(str)
+    failed = Signal(str, str)
+    pending_changed = Signal(int)
+
+    def __init__(self, max_threads=EXPORT_THREADS, parent=None):
+        super().__init__(parent)
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max_threads)
+        self.pending = 0
+
+    def submit(self, source, pipeline, options, dst_path):
+        """
+        It queues an export of source with the pipeline's current settings
+
+        :param source: The full resolution BGR image, it is never modified
+        :param pipeline: The EditPipeline to render with. Its settings are snapshotted here, so the editor can keep
+            changing them while the export waits
+        :param options: An ExportOptions
+        :param dst_path: The file to write
+        """
+        job = ExportJob(source, pipeline, pipeline.settings(), options, dst_path)
+        worker = Worker(function=self.run_job, job=job)
+        worker.signals.result.connect(self.on_job_done)
+        self.pending += 1
+        self.pending_changed.emit(self.pending)
+        self.pool.start(worker)
+
+    @staticmethod
+    def run_job(job, progress):
+        try:
+            # use_cache=False keeps the preview's cached stages and buffers out of it
+            edited = job.pipeline.render(job.source, job.settings, use_cache=False)
+            data = encode_image(edited, job.options)
+            os.makedirs(os.path.dirname(job.dst_path) or '.', exist_ok=True)
+            write_atomic(job.dst_path, data)
+        except Exception as e:
+            traceback.print_exc()
+            return job.dst_path, str(e)
+        return job.dst_path, None
+
+    def on_job_done(self, result):
+        dst_path, error = result
+        self.pending -= 1
+        self.pending_changed.emit(self.pending)
+        if error is None:
+            print(f"Exported {dst_path}")
+            self.exported.emit(dst_path)
+        else:
+            print(f"Export to {dst_path} failed: {error}")
+            self.failed.emit(dst_path, error)
+
+    def wait(self, msecs=-1):
+        return self.pool.waitForDone(msecs)
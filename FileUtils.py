@@ -0,0 +1,18 @@
+import os
+import threading
+
+
+def write_atomic(path, data):
+    """
+    It writes data to a temp file next to path and renames it over path, so a crash or a second writer never
+    leaves a half written file behind
+    """
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, 'wb') as file:
+            file.write(data)
+        os.replace(tmp_path, path)
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
@@ -0,0 +1,68 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from HeaderCache import HeaderCache
+from MetadataStore import get_default_store
+from SteamAppAPI import DEFAULT_FETCH_CONCURRENCY, SteamApp, create_session
+
+
+def load_games(app_ids, header_cache=None, max_workers=DEFAULT_FETCH_CONCURRENCY, session=None, store=None,
+               scheduler=None, progress=None, partial=None, closing=None):
+    """
+    It resolves every game's metadata and header image on a bounded thread pool that shares one connection pool.
+    Each game's header is fetched straight after its metadata, so the first headers are ready long before the last
+    game is resolved, and games whose metadata is cached (they only need their header) go first.
+
+    :param app_ids: The Steam App IDs to load
+    :param header_cache: Optional HeaderCache, one over store is created if not given
+    :param max_workers: The maximum number of games in flight at once
+    :param session: Optional requests.Session to use, one is created if not given
+    :param store: Optional MetadataStore, the shared default store is used if not given
+    :param scheduler: Optional RequestScheduler, the shared default scheduler is used if not given
+    :param progress: Optional signal (or anything with an emit method) that receives the number of games done so far
+    :param partial: Optional, receives (app id, header path, title) for each game as soon as it is ready
+    :param closing: Optional threading.Event, once it is set the games that haven't started are dropped and the
+        ones in flight stop waiting on the store
+    :return: A dict of app id -> (header path, title). The header path is None when the game has none, the title
+        when the store doesn't know the game. Dropped games are left out
+    """
+    app_ids = [str(x) for x in app_ids]
+    max_workers = max(1, int(max_workers))
+    store = store if store is not None else get_default_store()
+    header_cache = header_cache if header_cache is not None else HeaderCache(store=store)
+    if session is None:
+        # One connection pool for the metadata requests and the header downloads
+        session = create_session(max_workers)
+    # Cached metadata is read in one query
+    cached = store.get_many(app_ids)
+    app_ids.sort(key=lambda x: x not in cached)
+
+    def resolve(app_id):
+        if closing is not None and closing.is_set():
+            return None, None
+        app = SteamApp(app_id, session=session, store=store, data=cached.get(app_id), scheduler=scheduler,
+                       closing=closing)
+        if closing is not None and closing.is_set():
+            return None, None
+        header_path = header_cache.fetch_app(app_id, app, session)
+        return header_path, app.get("name") if app.is_available() else None
+
+    games = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(resolve, x): x for x in app_ids}
+        for done, future in enumerate(as_completed(futures), start=1):
+            if closing is not None and closing.is_set():
+                # The ones in flight finish, the rest never start
+                executor.shutdown(cancel_futures=True)
+                break
+            app_id = futures[future]
+            try:
+                games[app_id] = future.result()
+            except Exception as e:
+                # One game going wrong doesn't hold up the others
+                print(f"Could not load {app_id}: {e}")
+                games[app_id] = (None, None)
+            if partial is not None:
+                partial.emit((app_id, *games[app_id]))
+            if progress is not None:
+                progress.emit(done)
+    return games
@@ -0,0 +1,109 @@
+import bisect
+import re
+import unicodedata
+
+# Titles are split into words on anything that isn't a letter or a digit ("Half-Life 2: Episode One")
+TOKEN_SPLIT = re.compile(r'[^0-9a-z]+')
+
+# Ranks, lower comes first
+RANK_TITLE_PREFIX = 0
+RANK_WORD_PREFIX = 1
+
+
+def normalize(text):
+    """
+    It folds text for matching: lower case, accents removed ("Pokémon" matches "pokemon"), apostrophes dropped
+    so "Assassin's" is one word
+
+    :param text: A title or a query
+    :return: The folded text
+    """
+    text = unicodedata.normalize('NFKD', str(text)).casefold()
+    text = ''.join(x for x in text if not unicodedata.combining(x))
+    return text.replace("'", '').replace('’', '')
+
+
+def tokenize(text):
+    return [x for x in TOKEN_SPLIT.split(normalize(text)) if x]
+
+
+class GameSearchIndex:
+    """
+    An in-memory type-ahead index over game titles.
+
+    Every word of every title (and the app id) is kept in one sorted list, so the games with a word starting with
+    a prefix are a bisect away. A query matches a game when each of its words is the start of one of the game's
+    words, in any order ("ep one half" finds Half-Life 2: Episode One). Games whose title starts with the query
+    come first, then the rest, each alphabetically.
+    """
+
+    def __init__(self):
+        self.names = {}
+        # The title's words joined by spaces, for ranking and sorting
+        self.folded_names = {}
+        # Sorted (word, app_id) pairs
+        self.words = []
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, app_id):
+        return str(app_id) in self.names
+
+    def add(self, app_id, name=None):
+        """
+        It adds a game, or renames it if it is already in the index
+
+        :param app_id: The Steam App ID
+        :param name: The game's title, None when the store doesn't know it (it is then found by app id only)
+        """
+        app_id = str(app_id)
+        if app_id in self.names:
+            self.remove(app_id)
+        self.names[app_id] = name or app_id
+        self.folded_names[app_id] = ' '.join(tokenize(name)) if name else app_id
+        for word in set(tokenize(name or '') + [app_id]):
+            bisect.insort(self.words, (word, app_id))
+
+    def remove(self, app_id):
+        app_id = str(app_id)
+        if app_id not in self.names:
+            return
+        for word in set(tokenize(self.folded_names[app_id]) + [app_id]):
+            index = bisect.bisect_left(self.words, (word, app_id))
+            if index < len(self.words) and self.words[index] == (word, app_id):
+                del self.words[index]
+        del self.names[app_id]
+        del self.folded_names[app_id]
+
+    def name(self, app_id):
+        """
+        :return: The title of app_id, its app id if the store doesn't know it
+        """
+        return self.names.get(str(app_id), str(app_id))
+
+    def games_with_prefix(self, prefix):
+        # Every (prefix, ...) pair sorts at or after (prefix,) and before the first word that stops matching
+        start = bisect.bisect_left(self.words, (prefix,))
+        end = bisect.bisect_left(self.words, (prefix + '\uffff',), start)
+        return {app_id for _, app_id in self.words[start:end]}
+
+    def search(self, query):
+        """
+        It finds the games matching a query
+
+        :param query: What the user typed
+        :return: The matching app ids, best first. Every game, alphabetically, when the query is empty
+        """
+        words = tokenize(query)
+        if not words:
+            return sorted(self.names, key=self.sort_key)
+        # The rarest word narrows things down fastest
+        matches = sorted((self.games_with_prefix(x) for x in words), key=len)
+        found = matches[0].intersection(*matches[1:])
+        folded_query = ' '.join(words)
+        return sorted(found, key=lambda x: (RANK_TITLE_PREFIX if self.folded_names[x].startswith(folded_query)
+                                            else RANK_WORD_PREFIX, self.sort_key(x)))
+
+    def sort_key(self, app_id):
+        return self.folded_names[app_id], app_id
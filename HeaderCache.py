@@ -0,0 +1,103 @@
+import os
+import threading
+import time
+
+import requests
+
+from FileUtils import write_atomic
+from MetadataStore import get_default_store
+from SteamAppAPI import REQUEST_TIMEOUT
+
+DEFAULT_HEADER_DIR = 'cache/headers'
+# A cached header is used as is for this long, after that it is revalidated with a conditional request
+HEADER_TTL = 7 * 24 * 60 * 60
+
+
+class HeaderCache:
+    """
+    The header images of every game on disk, one file per app id (cache_dir/<app_id>.jpg).
+
+    Headers are downloaded in parallel over one pooled session and written atomically, so an interrupted download
+    never looks cached. Once a header is older than ttl it is revalidated with If-None-Match/If-Modified-Since, so
+    unchanged art costs a 304 instead of the whole image. A new header_image url (Steam adds ?t=<timestamp> when the
+    art changes) is downloaded straight away.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_HEADER_DIR, store=None, ttl=HEADER_TTL):
+        self.cache_dir = cache_dir
+        self.store = store if store is not None else get_default_store()
+        self.ttl = ttl
+        # Counters for benchmarks and logging, reset them before a run
+        self.downloaded = 0
+        self.revalidated = 0
+        self.counter_lock = threading.Lock()
+
+    def path(self, app_id):
+        return os.path.join(self.cache_dir, f"{app_id}.jpg")
+
+    def cached(self, app_id):
+        """
+        :return: The header of app_id already on disk, without asking the network, or None if there is none
+        """
+        path = self.path(app_id)
+        return path if os.path.isfile(path) else None
+
+    def get(self, app_id, url, session=None, now=None):
+        """
+        It returns the cached header of app_id, downloading or revalidating it first if needed
+
+        :param app_id: The Steam App ID
+        :param url: The app's header_image url
+        :param session: Optional requests.Session, plain requests is used otherwise
+        :param now: The current unix time, for tests and benchmarks
+        :return: The path of the header image, or None if there is none and it couldn't be downloaded
+        """
+        path = self.path(app_id)
+        now = time.time() if now is None else now
+        entry = self.store.get_header(app_id)
+        exists = os.path.isfile(path)
+        if exists and entry is not None and entry['url'] == url and entry['checked_at'] + self.ttl >= now:
+            return path
+
+        headers = {}
+        if exists and entry is not None and entry['url'] == url:
+            # Only the validators of the same url mean anything
+            if entry['etag']:
+                headers['If-None-Match'] = entry['etag']
+            if entry['last_modified']:
+                headers['If-Modified-Since'] = entry['last_modified']
+
+        try:
+            response = (session or requests).get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+            if response.status_code == 304 and headers:
+                self.store.put_header(app_id, url, entry['etag'], entry['last_modified'])
+                with self.counter_lock:
+                    self.revalidated += 1
+                return path
+            response.raise_for_status()
+        except requests.RequestException as e:
+            print(f"Could not download the header of {app_id}: {e}")
+            # An old header beats no header
+            return path if exists else None
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        try:
+            write_atomic(path, response.content)
+        except OSError as e:
+            print(f"Could not save the header of {app_id}: {e}")
+            return path if exists else None
+        self.store.put_header(app_id, url, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+        with self.counter_lock:
+            self.downloaded += 1
+        return path
+
+    def fetch_app(self, app_id, app, session=None):
+        """
+        :return: The cached header of a resolved SteamApp, or None if it has none
+        """
+        url = app.get("header_image") if app.is_available() else None
+        if not url:
+            # Without metadata (e.g. the store request failed) a header downloaded before is still the game's art,
+            # it just can't be revalidated
+            return self.cached(app_id)
+        return self.get(app_id, url, session)
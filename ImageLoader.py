@@ -0,0 +1,136 @@
+import traceback
+
+from PySide2.QtCore import QObject, QRunnable, QThreadPool, Signal
+
+from TaskTrace import OUTCOME_CANCELLED, OUTCOME_ERROR, OUTCOME_OK, get_default_tracer
+
+# Cells on screen jump the queue, cells in the prefetch margin wait behind them
+PRIORITY_VISIBLE = 10
+PRIORITY_PREFETCH = 0
+
+
+class LoaderSignals(QObject):
+    loaded = Signal(object, object, int)
+
+
+class LoadTask(QRunnable):
+    """
+    One image decode. It can be taken back out of the pool's queue, and if it is cancelled after it started
+    the result is simply never handed out.
+    """
+
+    def __init__(self, key, function, generation, priority, signals, tracer):
+        super().__init__()
+        # The loader keeps the Python reference, the pool must not delete it behind our back
+        self.setAutoDelete(False)
+        self.key = key
+        self.function = function
+        self.generation = generation
+        self.priority = priority
+        self.signals = signals
+        self.cancelled = False
+        self.tracer = tracer
+        self.trace = tracer.enqueue('ImageLoader.load', 'image')
+
+    def run(self):
+        self.tracer.start(self.trace)
+        if self.cancelled:
+            self.tracer.finish(self.trace, OUTCOME_CANCELLED)
+            return
+        outcome = OUTCOME_OK
+        try:
+            result = self.function()
+        except Exception:
+            traceback.print_exc()
+            outcome = OUTCOME_ERROR
+            result = None
+        self.tracer.finish(self.trace, OUTCOME_CANCELLED if self.cancelled else outcome, result)
+        if not self.cancelled:
+            self.signals.loaded.emit(self.key, result, self.generation)
+
+
+class ImageLoader(QObject):
+    """
+    A priority queue of image decodes on its own thread pool.
+
+    request() queues a decode (or bumps the priority of one already queued), cancel_except() drops everything that
+    scrolled out of range and cancel_all() drops everything, e.g. when the user navigates away. Queued tasks are
+    taken straight out of the pool, tasks already running finish but their result is thrown away.
+    """
+    loaded = Signal(object, object)
+
+    def __init__(self, max_threads=None, parent=None):
+        super().__init__(parent)
+        self.pool = QThreadPool(self)
+        if max_threads is not None:
+            self.pool.setMaxThreadCount(max_threads)
+        self.signals = LoaderSignals()
+        self.signals.loaded.connect(self.on_task_loaded)
+        self.tracer = get_default_tracer()
+        self.tasks = {}
+        # Bumped by cancel_all, results from an older generation are stale
+        self.generation = 0
+
+    def request(self, key, function, priority=PRIORITY_VISIBLE):
+        task = self.tasks.get(key)
+        if task is not None:
+            if task.priority >= priority:
+                return
+            # Already queued at a lower priority, re-queue it higher if it hasn't started yet
+            if not self.pool.tryTake(task):
+                return
+            self.tracer.finish(task.trace, OUTCOME_CANCELLED)
+        task = LoadTask(key, function, self.generation, priority, self.signals, self.tracer)
+        self.tasks[key] = task
+        self.pool.start(task, priority)
+
+    def is_pending(self, key):
+        return key in self.tasks
+
+    def cancel(self, key):
+        task = self.tasks.pop(key, None)
+        if task is not None:
+            task.cancelled = True
+            if self.pool.tryTake(task):
+                # Never started, it won't finish its own trace
+                self.tracer.finish(task.trace, OUTCOME_CANCELLED)
+
+    def take(self, key):
+        """
+        It cancels key only if it is still queued, a decode that already started is left to finish
+
+        :return: Whether it was taken out of the queue
+        """
+        task = self.tasks.get(key)
+        if task is None or not self.pool.tryTake(task):
+            return False
+        del self.tasks[key]
+        task.cancelled = True
+        self.tracer.finish(task.trace, OUTCOME_CANCELLED)
+        return True
+
+    def cancel_except(self, keep_keys):
+        for key in [x for x in self.tasks if x not in keep_keys]:
+            self.cancel(key)
+
+    def cancel_all(self):
+        self.generation += 1
+        for key in list(self.tasks):
+            self.cancel(key)
+
+    def shutdown(self):
+        # Drops everything queued and waits for the decodes already running, e.g. before the app exits
+        self.cancel_all()
+        self.pool.waitForDone()
+
+    def pending_count(self):
+        return len(self.tasks)
+
+    def on_task_loaded(self, key, result, generation):
+        if generation != self.generation:
+            return
+        task = self.tasks.get(key)
+        if task is None or task.cancelled:
+            return
+        del self.tasks[key]
+        self.loaded.emit(key, result)
@@ -0,0 +1,280 @@
+from collections import namedtuple
+from functools import lru_cache
+
+import cv2
+import numpy as np
+
+
+# The classic sepia matrix is written for RGB, flipping both axes makes it work on OpenCV's BGR directly
+SEPIA_KERNEL = np.array([[0.393, 0.769, 0.189],
+                         [0.349, 0.686, 0.168],
+                         [0.272, 0.534, 0.131]], dtype=np.float32)[::-1, ::-1].copy()
+SHARPEN_KERNEL = np.array([[-1, -1, -1],
+                           [-1, 9, -1],
+                           [-1, -1, -1]], dtype=np.float32)
+# Rec. 601 luma weights, repeated for each BGR output channel
+GRAYSCALE_KERNEL = np.array([[0.114, 0.587, 0.299]] * 3, dtype=np.float32)
+
+
+def make_proxy(img, max_width, max_height):
+    """
+    It shrinks an image to fit within max_width x max_height, keeping the aspect ratio.
+    Images that already fit are returned as is.
+    """
+    height, width = img.shape[:2]
+    scale = min(max_width / width, max_height / height)
+    if scale >= 1:
+        return img
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    # INTER_AREA averages the source pixels, so the preview doesn't shimmer like a nearest/linear downscale
+    return cv2.resize(img, size, interpolation=cv2.INTER_AREA)
+
+
+class Filter:
+    """
+    A named image filter. function(img, out) writes the filtered image into out (or a new array when out is None)
+    and returns it. dtype is the type the filter works in, every built in filter stays in uint8 so no
+    temporary float copy of the image is ever made.
+    """
+
+    def __init__(self, name, function, dtype=np.uint8):
+        self.name = name
+        self.function = function
+        self.dtype = dtype
+
+
+FILTERS = {}
+
+
+def register_filter(name, dtype=np.uint8):
+    def decorator(function):
+        FILTERS[name] = Filter(name, function, dtype)
+        return function
+    return decorator
+
+
+@register_filter("None")
+def no_filter(img, out=None):
+    return img
+
+
+@register_filter("Sharpen")
+def sharpen_filter(img, out=None):
+    # filter2D accumulates in float per pixel and saturates straight into the uint8 output
+    return cv2.filter2D(img, -1, SHARPEN_KERNEL, dst=out)
+
+
+@register_filter("Sepia")
+def sepia_filter(img, out=None):
+    return cv2.transform(img, SEPIA_KERNEL, dst=out)
+
+
+@register_filter("Grayscale")
+def grayscale_filter(img, out=None):
+    return cv2.transform(img, GRAYSCALE_KERNEL, dst=out)
+
+
+@register_filter("Invert")
+def invert_filter(img, out=None):
+    return cv2.bitwise_not(img, dst=out)
+
+
+@register_filter("Soften")
+def soften_filter(img, out=None):
+    return cv2.GaussianBlur(img, (5, 5), 0, dst=out)
+
+
+def apply_filter(img, filter, out=None):
+    """
+    :param img: A BGR uint8 image, it is never modified
+    :param filter: The name of a registered filter, unknown names (and None) leave the image as is
+    :param out: Optional buffer to write into, it must not be img
+    :return: The filtered image
+    """
+    registered = FILTERS.get(filter)
+    if registered is None:
+        return img
+    if out is not None and (out.shape != img.shape or out.dtype != registered.dtype):
+        out = None
+    return registered.function(img, out)
+
+
+# Every tone adjustment, applied in this order: levels, gamma, contrast, brightness.
+# brightness is an offset in -255..255, contrast is -50..50 (0 is unchanged, -50 is flat grey, 50 doubles it),
+# gamma > 1 brightens the midtones, black/white are the input levels mapped to 0 and 255.
+# gamma, black and white can also be (b, g, r) tuples to adjust the channels separately.
+Tone = namedtuple('Tone', ['brightness', 'contrast', 'gamma', 'black', 'white'], defaults=[0, 0, 1.0, 0, 255])
+
+
+@lru_cache(maxsize=64)
+def build_tone_lut(tone):
+    """
+    It folds every adjustment in tone into one 256 entry lookup table per channel
+
+    :param tone: A Tone
+    :return: A uint8 table for cv2.LUT, (256,) when every channel gets the same curve, (256, 1, 3) otherwise
+    """
+    x = np.arange(256, dtype=np.float32)[:, None]
+    black = np.asarray(tone.black, dtype=np.float32).reshape(1, -1)
+    white = np.asarray(tone.white, dtype=np.float32).reshape(1, -1)
+    gamma = np.asarray(tone.gamma, dtype=np.float32).reshape(1, -1)
+
+    x = np.clip((x - black) / np.maximum(white - black, 1), 0, 1)
+    x = 255 * x ** (1 / np.maximum(gamma, 0.01))
+    x = (x - 128) * ((50 + tone.contrast) / 50) + 128
+    x = x + tone.brightness
+
+    lut = np.clip(np.rint(x), 0, 255).astype(np.uint8)
+    if lut.shape[1] == 1:
+        # A single table is a bit quicker than one per channel
+        return np.ascontiguousarray(lut[:, 0])
+    return np.ascontiguousarray(np.broadcast_to(lut, (256, 3)).reshape(256, 1, 3))
+
+
+def apply_tone(img, tone, out=None):
+    # One table lookup per pixel, however many adjustments are set
+    if tone == Tone():
+        return img
+    if out is not None and (out.shape != img.shape or out.dtype != img.dtype):
+        out = None
+    return cv2.LUT(img, build_tone_lut(tone), dst=out)
+
+
+class Stage:
+    """
+    One step of the edit chain. function(img, value, out) returns the edited image. It must not modify img, but may
+    write into out (the stage's output buffer from its last render) to save allocating a new image every time.
+    """
+
+    def __init__(self, name, function, value=None):
+        self.name = name
+        self.function = function
+        self.value = value
+        self.buffer = None
+
+    def run(self, img, value, reuse_buffer):
+        out = self.buffer if reuse_buffer else None
+        # A buffer that is also the input would be overwritten while it is being read
+        if out is img:
+            out = None
+        result = self.function(img, value, out)
+        if reuse_buffer and result is not img:
+            self.buffer = result
+        return result
+
+
+class EditPipeline:
+    """
+    An ordered chain of edit stages that keeps the output of every stage for the last image it rendered.
+
+    When only a later stage changes (e.g. brightness after the filter), render() starts from the cached output of
+    the last unchanged stage instead of running the whole chain again.
+    """
+
+    def __init__(self, stages):
+        self.stages = list(stages)
+        self.cached_source = None
+        # One (settings up to and including this stage, output) pair per stage
+        self.cache = [None] * len(self.stages)
+
+    def set(self, name, value):
+        for stage in self.stages:
+            if stage.name == name:
+                stage.value = value
+                return
+        raise KeyError(name)
+
+    def get(self, name):
+        for stage in self.stages:
+            if stage.name == name:
+                return stage.value
+        raise KeyError(name)
+
+    def settings(self):
+        return {stage.name: stage.value for stage in self.stages}
+
+    def render(self, img, settings=None, use_cache=True):
+        """
+        It runs img through every stage
+
+        :param img: The source image, it is never modified
+        :param settings: Optional dict of stage name -> value to render with instead of the current values.
+            Lets a worker thread render a snapshot while the UI keeps changing the live values.
+        :param use_cache: Reuse and keep intermediate outputs and output buffers. Turn off for one-off renders such as
+            a full size export, so they don't push the preview's intermediates out or leave full size buffers behind
+        :return: The edited image
+        """
+        settings = settings if settings is not None else self.settings()
+        if use_cache and img is not self.cached_source:
+            self.cached_source = img
+            self.cache = [None] * len(self.stages)
+
+        key = ()
+        for index, stage in enumerate(self.stages):
+            key += (settings.get(stage.name, stage.value),)
+            if use_cache and self.cache[index] is not None and self.cache[index][0] == key:
+                img = self.cache[index][1]
+                continue
+            img = stage.run(img, key[-1], reuse_buffer=use_cache)
+            if use_cache:
+                self.cache[index] = (key, img)
+        return img
+
+
+def make_pipeline(settings=None):
+    """
+    It builds the editor's edit chain (filter, then tone), optionally with settings already applied
+
+    :param settings: Optional dict of stage name -> value, as returned by EditPipeline.settings()
+    :return: An EditPipeline
+    """
+    pipeline = EditPipeline([
+        Stage("filter", apply_filter, None),
+        Stage("tone", apply_tone, Tone()),
+    ])
+    for name, value in (settings or {}).items():
+        pipeline.set(name, value)
+    return pipeline
+
+
+# Format name shown in the editor -> file extension
+EXPORT_FORMATS = {
+    "JPEG": ".jpg",
+    "PNG": ".png",
+    "WebP": ".webp",
+}
+
+# Encoder settings for an export. jpeg_quality and webp_quality are 0..100, png_compression is 0..9
+# (higher is smaller but slower, the pixels are the same either way).
+ExportOptions = namedtuple('ExportOptions', ['format', 'jpeg_quality', 'jpeg_progressive', 'png_compression',
+                                             'webp_quality'], defaults=["JPEG", 95, False, 3, 90])
+
+
+def encode_params(options):
+    """
+    :param options: An ExportOptions
+    :return: The file extension and the cv2.imencode flags for it
+    """
+    ext = EXPORT_FORMATS[options.format]
+    if ext == ".jpg":
+        params = [cv2.IMWRITE_JPEG_QUALITY, options.jpeg_quality,
+                  cv2.IMWRITE_JPEG_PROGRESSIVE, int(options.jpeg_progressive)]
+    elif ext == ".png":
+        params = [cv2.IMWRITE_PNG_COMPRESSION, options.png_compression]
+    else:
+        params = [cv2.IMWRITE_WEBP_QUALITY, options.webp_quality]
+    return ext, params
+
+
+def encode_image(img, options):
+    """
+    :param img: A BGR uint8 image
+    :param options: An ExportOptions
+    :return: The encoded file as bytes
+    """
+    ext, params = encode_params(options)
+    ok, encoded = cv2.imencode(ext, img, params)
+    if not ok:
+        raise ValueError(f"Could not encode image as {options.format}")
+    return encoded.tobytes()
+
@@ -1,20 +1,14 @@
 import os
 import sys
-import urllib.request
-from functools import partial
-
-from PySide2.QtCore import QSize, Qt
-from PySide2.QtCore import QThreadPool
-from PySide2.QtGui import QPixmap, QImage, QFont, QIcon
-from PySide2.QtWidgets import QApplication, QWidget, QMainWindow, QPushButton, QGridLayout, QLabel, \
-    QScrollArea, QHBoxLayout, QProgressBar, QProgressDialog, QVBoxLayout, QSizePolicy, QFileDialog
-
-from CustomWorkerThread import Worker
-from EditorWindow import EditorWindow
-from SteamAppAPI import SteamApp
-from MainWindow import ScreenshotBrowser
+
+from PySide2.QtCore import Qt
+from PySide2.QtGui import QFont, QIcon
+from PySide2.QtWidgets import QApplication, QWidget, QPushButton, QLabel, QHBoxLayout, QVBoxLayout, QFileDialog
+
 from configparser import ConfigParser
 
+from LibraryIndex import find_screenshot_roots
+
 
 class Installer(QWidget):
     def __init__(self):
@@ -67,35 +61,33 @@ class Installer(QWidget):
 
     def on_select_steam_install_path_clicked(self):
         self.steam_path = str(f"{QFileDialog.getExistingDirectory()}/userdata")
-        # simple print if no path selected
-        try:
-            self.steam_id = os.listdir(self.steam_path)[0]
-            if self.steam_id == "0":
-                self.steam_id = os.listdir(self.steam_path[1])
-            print(self.steam_path)
-            print(self.steam_id)
-
-
-            if not os.path.exists("cache"):
-                os.mkdir("cache")
-                os.mkdir("cache/image_cache")
-
-            parser = ConfigParser()
-            parser["INFO"] = {
-                "path": f"{self.steam_path}/{self.steam_id}",
-                "export_path": "export/"
-            }
-
-            with open("cache/steam_info.config", 'w') as config:
-                parser.write(config)
-
-
-            self.close()
-
-            ScreenshotBrowser(steam_path=f"{self.steam_path}/{self.steam_id}")
-
-        except FileNotFoundError:
-            print("No Path Selected")
+        # Every account in userdata is browsed together, so the config points at userdata itself
+        roots = find_screenshot_roots(self.steam_path)
+        if not roots:
+            print(f"No screenshots found in {self.steam_path}")
+            return
+        print(self.steam_path)
+        print(roots)
+
+        os.makedirs("cache", exist_ok=True)
+
+        parser = ConfigParser()
+        parser["INFO"] = {
+            "path": self.steam_path,
+            "export_path": "export/",
+            # More userdata folders, accounts or 760/remote folders, separated by os.pathsep
+            "extra_roots": "",
+        }
+
+        with open("cache/steam_info.config", 'w') as config:
+            parser.write(config)
+
+        self.close()
+
+        # Only needed once a path is picked, the installer itself shows without the browser's imports
+        from MainWindow import ScreenshotBrowser
+        self.browser = ScreenshotBrowser(steam_path=self.steam_path)
+        QApplication.instance().aboutToQuit.connect(self.browser.shutdown)
 
 
 
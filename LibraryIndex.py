@@ -0,0 +1,386 @@
+import os
+import re
+import sqlite3
+import struct
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_DB_PATH = 'cache/library.db'
+SCREENSHOT_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+# Steam names screenshots after the local time they were taken, e.g. 20220917154717_1.jpg
+CAPTURE_NAME_PATTERN = re.compile(r'^(\d{14})_\d+\.')
+# Image headers are read in parallel on a cold scan, it's small reads so it's I/O bound
+HEADER_READ_THREADS = 8
+HEADER_CHUNK = 4096
+# A JPEG's frame header is normally within the first few KB, give up well before reading a whole file
+HEADER_READ_LIMIT = 256 * 1024
+# SQLite limits the number of bound parameters per statement
+MAX_QUERY_PARAMS = 900
+
+Screenshot = namedtuple('Screenshot', ['path', 'app_id', 'size', 'mtime_ns', 'width', 'height', 'captured_at'])
+
+
+def parse_capture_time(name):
+    """
+    :param name: A screenshot's file name
+    :return: The unix time it was taken, from Steam's YYYYMMDDHHMMSS_n naming, or None for other names
+    """
+    match = CAPTURE_NAME_PATTERN.match(name)
+    if match is None:
+        return None
+    try:
+        return time.mktime(time.strptime(match.group(1), '%Y%m%d%H%M%S'))
+    except (ValueError, OverflowError):
+        return None
+
+
+def read_image_size(path):
+    """
+    It reads the pixel dimensions from a JPEG or PNG header, without decoding the image
+
+    :return: (width, height), or (None, None) if the header can't be read
+    """
+    try:
+        with open(path, 'rb') as file:
+            head = file.read(HEADER_CHUNK)
+            if head.startswith(b'\x89PNG\r\n\x1a\n') and head[12:16] == b'IHDR':
+                return struct.unpack('>II', head[16:24])
+            if not head.startswith(b'\xff\xd8'):
+                return None, None
+            return read_jpeg_size(file, head)
+    except (OSError, struct.error):
+        return None, None
+
+
+def read_jpeg_size(file, data):
+    # Walks the marker segments up to the first start-of-frame, which holds the size
+    offset = 2
+    while True:
+        while len(data) < offset + 9:
+            if len(data) >= HEADER_READ_LIMIT:
+                return None, None
+            chunk = file.read(HEADER_CHUNK)
+            if not chunk:
+                return None, None
+            data += chunk
+        if data[offset] != 0xFF:
+            return None, None
+        marker = data[offset + 1]
+        if marker == 0xFF:
+            # Fill byte
+            offset += 1
+            continue
+        # SOF0..SOF15, except DHT (C4), JPG (C8) and DAC (CC) which share the range
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            height, width = struct.unpack('>HH', data[offset + 5:offset + 9])
+            return width, height
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            # Markers without a length
+            offset += 2
+            continue
+        if marker == 0xDA:
+            # Start of scan before any frame header, the file is broken
+            return None, None
+        length = struct.unpack('>H', data[offset + 2:offset + 4])[0]
+        offset += 2 + length
+
+
+def to_signed(value):
+    # SQLite integers are signed 64 bit
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def to_unsigned(value):
+    return value + (1 << 64) if value < 0 else value
+
+
+def find_screenshot_roots(path):
+    """
+    It finds every screenshots root under path, which can be a 760/remote folder, one account (userdata/<id>) or
+    the userdata folder itself
+
+    :return: Every 760/remote folder found, sorted
+    """
+    path = os.path.normpath(path)
+    if os.path.basename(path) == 'remote' and os.path.basename(os.path.dirname(path)) == '760':
+        return [path] if os.path.isdir(path) else []
+    remote = os.path.join(path, '760', 'remote')
+    if os.path.isdir(remote):
+        return [remote]
+    roots = []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                remote = os.path.join(entry.path, '760', 'remote')
+                if entry.is_dir() and os.path.isdir(remote):
+                    roots.append(remote)
+    except OSError as e:
+        print(f"Could not look for screenshots in {path}: {e}")
+    return sorted(roots)
+
+
+class LibraryIndex:
+    """
+    A SQLite index of every screenshot in a Steam screenshots folder (760/remote), with its size, mtime,
+    pixel dimensions and capture time.
+
+    refresh() compares every game folder's mtime against the one stored and only rescans the folders that changed.
+    Adding, removing or renaming a screenshot changes its folder's mtime, so a relaunch over an unchanged library
+    is a single directory listing plus one stat per game.
+    """
+
+    def __init__(self, db_path=DEFAULT_DB_PATH):
+        self.db_path = db_path
+        self.lock = threading.Lock()
+
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+
+        # Refreshed from the loading thread and read from the GUI thread, so share one connection behind a lock
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        with self.lock, self.conn:
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            # It's rebuilt from the folders, losing the last few writes on a power cut is fine
+            self.conn.execute('PRAGMA synchronous=NORMAL')
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS folders (
+                    path TEXT PRIMARY KEY,
+                    root TEXT NOT NULL,
+                    app_id TEXT NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    scanned_at REAL NOT NULL
+                )''')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS folders_root ON folders (root)')
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS screenshots (
+                    path TEXT PRIMARY KEY,
+                    folder TEXT NOT NULL,
+                    app_id TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    width INTEGER,
+                    height INTEGER,
+                    captured_at REAL
+                )''')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS screenshots_app ON screenshots (app_id, name)')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS screenshots_folder ON screenshots (folder)')
+            # Perceptual hashes for the duplicate finder, valid while the file's size and mtime match
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS hashes (
+                    path TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    dhash INTEGER NOT NULL,
+                    phash INTEGER NOT NULL
+                )''')
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def refresh_all(self, roots, max_workers=None):
+        """
+        It refreshes several roots (one per Steam account or library drive) at the same time
+
+        :param roots: 760/remote folders
+        :param max_workers: The maximum number of roots scanned at once, one per root by default
+        :return: The app ids whose screenshots changed in any root
+        """
+        roots = list(dict.fromkeys(os.path.normpath(x) for x in roots))
+        if not roots:
+            return []
+        # Scanning is directory listings and small header reads, it's the disks that are waited on
+        with ThreadPoolExecutor(max_workers=max_workers or len(roots)) as pool:
+            changed = pool.map(self.refresh, roots)
+        return sorted(set(app_id for app_ids in changed for app_id in app_ids))
+
+    def forget_roots_except(self, roots):
+        """
+        It drops everything indexed from roots that are no longer configured
+        """
+        roots = [os.path.normpath(x) for x in roots]
+        with self.lock, self.conn:
+            old = [row['path'] for row in self.conn.execute(
+                f'SELECT path FROM folders WHERE root NOT IN ({",".join("?" * len(roots))})', roots)]
+            for folder in old:
+                self.conn.execute('DELETE FROM screenshots WHERE folder = ?', (folder,))
+                self.conn.execute('DELETE FROM folders WHERE path = ?', (folder,))
+
+    def refresh(self, root):
+        """
+        It brings the index up to date with root, rescanning only the game folders whose mtime changed
+
+        :param root: A 760/remote folder, holding one <app_id>/screenshots folder per game
+        :return: The app ids whose screenshots changed (new, removed or rescanned games)
+        """
+        root = os.path.normpath(root)
+        with self.lock:
+            known = {row['path']: (row['app_id'], row['mtime_ns'])
+                     for row in self.conn.execute('SELECT path, app_id, mtime_ns FROM folders WHERE root = ?',
+                                                  (root,))}
+
+        changed = []
+        seen = set()
+        with os.scandir(root) as entries:
+            for entry in entries:
+                if not entry.is_dir():
+                    continue
+                folder = os.path.join(entry.path, 'screenshots')
+                try:
+                    mtime_ns = os.stat(folder).st_mtime_ns
+                except OSError:
+                    continue
+                seen.add(folder)
+                if known.get(folder) == (entry.name, mtime_ns):
+                    continue
+                self.scan_folder(root, entry.name, folder, mtime_ns)
+                changed.append(entry.name)
+
+        for folder in set(known) - seen:
+            # The game's folder is gone
+            with self.lock, self.conn:
+                self.conn.execute('DELETE FROM screenshots WHERE folder = ?', (folder,))
+                self.conn.execute('DELETE FROM folders WHERE path = ?', (folder,))
+            changed.append(known[folder][0])
+        return changed
+
+    def refresh_folder(self, root, app_id, force=False):
+        """
+        It rescans a single game folder, e.g. when it is opened or a watcher reported a change in it
+
+        :param root: The 760/remote folder the game is in
+        :param app_id: The Steam App ID
+        :param force: Rescan even if the folder's mtime is unchanged. Rewriting a file in place doesn't change
+            the folder's mtime, only files whose size or mtime changed have their headers read again either way
+        :return: The paths that were added or modified and the paths that were removed
+        """
+        root = os.path.normpath(root)
+        folder = os.path.join(root, str(app_id), 'screenshots')
+        with self.lock:
+            row = self.conn.execute('SELECT mtime_ns FROM folders WHERE path = ?', (folder,)).fetchone()
+        try:
+            mtime_ns = os.stat(folder).st_mtime_ns
+        except OSError:
+            if row is None:
+                return [], []
+            with self.lock, self.conn:
+                removed = [x[0] for x in self.conn.execute('SELECT path FROM screenshots WHERE folder = ?',
+                                                           (folder,))]
+                self.conn.execute('DELETE FROM screenshots WHERE folder = ?', (folder,))
+                self.conn.execute('DELETE FROM folders WHERE path = ?', (folder,))
+            return [], removed
+        if not force and row is not None and row['mtime_ns'] == mtime_ns:
+            return [], []
+        return self.scan_folder(root, str(app_id), folder, mtime_ns)
+
+    def scan_folder(self, root, app_id, folder, mtime_ns):
+        """
+        :return: The paths that were added or modified and the paths that were removed
+        """
+        with self.lock:
+            known = {row['path']: (row['size'], row['mtime_ns'])
+                     for row in self.conn.execute('SELECT path, size, mtime_ns FROM screenshots WHERE folder = ?',
+                                                  (folder,))}
+
+        current = {}
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                # Skips Steam's thumbnails folder and anything else that isn't a screenshot
+                if not entry.name.lower().endswith(SCREENSHOT_EXTENSIONS) or not entry.is_file():
+                    continue
+                stat = entry.stat()
+                current[entry.path] = (entry.name, stat.st_size, stat.st_mtime_ns)
+
+        # Only new or modified files have their headers read
+        new = [path for path, (_, size, mtime) in current.items() if known.get(path) != (size, mtime)]
+        with ThreadPoolExecutor(max_workers=HEADER_READ_THREADS) as pool:
+            sizes = dict(zip(new, pool.map(read_image_size, new)))
+
+        removed = [path for path in known if path not in current]
+        with self.lock, self.conn:
+            for start in range(0, len(removed), MAX_QUERY_PARAMS):
+                chunk = removed[start:start + MAX_QUERY_PARAMS]
+                self.conn.execute(f'DELETE FROM screenshots WHERE path IN ({",".join("?" * len(chunk))})', chunk)
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO screenshots (path, folder, app_id, name, size, mtime_ns, width, height, '
+                'captured_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                [(path, folder, app_id, current[path][0], current[path][1], current[path][2], *sizes[path],
+                  parse_capture_time(current[path][0])) for path in new])
+            self.conn.execute('INSERT OR REPLACE INTO folders (path, root, app_id, mtime_ns, scanned_at) '
+                              'VALUES (?, ?, ?, ?, ?)', (folder, root, app_id, mtime_ns, time.time()))
+        return new, removed
+
+    def app_ids(self):
+        """
+        :return: Every indexed app id, sorted
+        """
+        with self.lock:
+            return [row['app_id'] for row in
+                    self.conn.execute('SELECT DISTINCT app_id FROM folders ORDER BY app_id')]
+
+    def screenshots(self, app_id):
+        """
+        :return: The Screenshots of app_id across every root, sorted by file name (so oldest first for Steam's
+            names). A screenshot found in several roots (same name and size, e.g. an account's backup on another
+            drive) is listed once.
+        """
+        with self.lock:
+            # SQLite takes the other columns from the row MIN() picked
+            rows = self.conn.execute('SELECT MIN(path), app_id, size, mtime_ns, width, height, captured_at '
+                                     'FROM screenshots WHERE app_id = ? GROUP BY name, size ORDER BY name',
+                                     (str(app_id),)).fetchall()
+        return [Screenshot(*row) for row in rows]
+
+    def screenshot_paths(self, app_id):
+        return [x.path for x in self.screenshots(app_id)]
+
+    def count(self, app_id=None):
+        # Duplicates across roots are counted once, like screenshots() lists them
+        with self.lock:
+            if app_id is None:
+                return self.conn.execute('SELECT COUNT(*) FROM (SELECT 1 FROM screenshots '
+                                         'GROUP BY app_id, name, size)').fetchone()[0]
+            return self.conn.execute('SELECT COUNT(*) FROM (SELECT 1 FROM screenshots WHERE app_id = ? '
+                                     'GROUP BY name, size)', (str(app_id),)).fetchone()[0]
+
+    def get_hashes(self, app_id):
+        """
+        :return: A dict of path -> (dhash, phash) for app_id's screenshots whose hashes are up to date
+        """
+        with self.lock:
+            rows = self.conn.execute('SELECT h.path, h.dhash, h.phash FROM screenshots s JOIN hashes h '
+                                     'ON h.path = s.path AND h.size = s.size AND h.mtime_ns = s.mtime_ns '
+                                     'WHERE s.app_id = ?', (str(app_id),)).fetchall()
+        return {row['path']: (to_unsigned(row['dhash']), to_unsigned(row['phash'])) for row in rows}
+
+    def put_hashes(self, hashes):
+        """
+        It stores hashes for screenshots that are in the index, tied to their current size and mtime
+
+        :param hashes: A dict of path -> (dhash, phash), both unsigned 64 bit
+        """
+        with self.lock, self.conn:
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO hashes (path, size, mtime_ns, dhash, phash) '
+                'SELECT path, size, mtime_ns, ?, ? FROM screenshots WHERE path = ?',
+                [(to_signed(dhash), to_signed(phash), path) for path, (dhash, phash) in hashes.items()])
+
+    def app_ids_in(self, root):
+        """
+        :return: The app ids indexed under root
+        """
+        with self.lock:
+            return [row['app_id'] for row in self.conn.execute('SELECT app_id FROM folders WHERE root = ?',
+                                                               (os.path.normpath(root),))]
+
+    def roots_of(self, app_id):
+        """
+        :return: The indexed roots that hold a screenshots folder for app_id
+        """
+        with self.lock:
+            return [row['root'] for row in
+                    self.conn.execute('SELECT root FROM folders WHERE app_id = ? ORDER BY root', (str(app_id),))]
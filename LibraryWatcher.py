@@ -0,0 +1,128 @@
+import os
+import time
+
+from PySide2.QtCore import QFileSystemWatcher, QObject, QTimer, Signal
+
+# Changes are collected for this long after the last event before anything is rescanned
+DEBOUNCE_MS = 500
+# A screenshot modified more recently than this may still be being written, the rescan waits for it
+SETTLE_SECONDS = 1.0
+
+
+class LibraryWatcher(QObject):
+    """
+    Watches every 760/remote root, every game folder in them and every game's screenshots folder, and keeps the
+    LibraryIndex up to date as screenshots are taken or deleted.
+
+    Events are debounced, and a folder holding a file that is still being written is rescanned once the file
+    settles. Only the folders that reported a change are rescanned, so the cost follows the change, not the library.
+    """
+    # app_id, paths added or modified, paths removed
+    screenshots_changed = Signal(str, list, list)
+    # app ids added, app ids removed
+    games_changed = Signal(list, list)
+
+    def __init__(self, library, roots, parent=None):
+        super().__init__(parent)
+        self.library = library
+        self.roots = [os.path.normpath(x) for x in roots]
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.directoryChanged.connect(self.on_directory_changed)
+        # (root, app_id) of game folders waiting for a rescan, and the roots a game was added to or removed from
+        self.pending_folders = set()
+        self.changed_roots = set()
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(DEBOUNCE_MS)
+        self.timer.timeout.connect(self.flush)
+        self.known_games = set(self.library.app_ids())
+        self.watch_games()
+
+    def watch_games(self):
+        paths = []
+        for root in self.roots:
+            paths.append(root)
+            try:
+                with os.scandir(root) as entries:
+                    for entry in entries:
+                        if entry.is_dir():
+                            # The game folder tells us when its screenshots folder is created
+                            paths.append(entry.path)
+                            screenshots = os.path.join(entry.path, 'screenshots')
+                            if os.path.isdir(screenshots):
+                                paths.append(screenshots)
+            except OSError as e:
+                # e.g. a library drive that isn't plugged in
+                print(f"Could not watch {root}: {e}")
+        watched = set(self.watcher.directories())
+        new_paths = [x for x in paths if x not in watched]
+        if new_paths:
+            self.watcher.addPaths(new_paths)
+
+    def on_directory_changed(self, path):
+        path = os.path.normpath(path)
+        if path in self.roots:
+            # A game was added or removed
+            self.changed_roots.add(path)
+        elif os.path.dirname(path) in self.roots:
+            # A game folder got (or lost) its screenshots folder
+            self.changed_roots.add(os.path.dirname(path))
+        else:
+            game_folder = os.path.dirname(path)
+            self.pending_folders.add((os.path.dirname(game_folder), os.path.basename(game_folder)))
+        self.timer.start()
+
+    def flush(self):
+        for root in self.changed_roots:
+            self.sync_games(root)
+        if self.changed_roots:
+            self.changed_roots = set()
+            self.watch_games()
+            games = set(self.library.app_ids())
+            added, removed = sorted(games - self.known_games), sorted(self.known_games - games)
+            self.known_games = games
+            if added or removed:
+                self.games_changed.emit(added, removed)
+
+        waiting = set()
+        for root, app_id in self.pending_folders:
+            if not self.is_settled(root, app_id):
+                waiting.add((root, app_id))
+                continue
+            changed, removed = self.library.refresh_folder(root, app_id, force=True)
+            if changed or removed:
+                self.screenshots_changed.emit(app_id, changed, removed)
+        self.pending_folders = waiting
+        if waiting:
+            self.timer.start()
+
+    def sync_games(self, root):
+        # Only games that appeared or disappeared are indexed or dropped, changes inside the other games' folders
+        # come through their own events
+        present = set()
+        try:
+            with os.scandir(root) as entries:
+                for entry in entries:
+                    if entry.is_dir() and os.path.isdir(os.path.join(entry.path, 'screenshots')):
+                        present.add(entry.name)
+        except OSError as e:
+            print(f"Could not scan {root}: {e}")
+            return
+        indexed = set(self.library.app_ids_in(root))
+        for app_id in present - indexed:
+            self.library.refresh_folder(root, app_id)
+            # Looked at again once settled, its first screenshot may still have been being written
+            self.pending_folders.add((root, app_id))
+        for app_id in indexed - present:
+            self.library.refresh_folder(root, app_id)
+            self.pending_folders.discard((root, app_id))
+
+    def is_settled(self, root, app_id):
+        # Steam writes a screenshot in several steps, a file touched very recently is still being written
+        folder = os.path.join(root, app_id, 'screenshots')
+        newest = time.time() - SETTLE_SECONDS
+        try:
+            with os.scandir(folder) as entries:
+                return all(entry.stat().st_mtime <= newest for entry in entries if entry.is_file())
+        except OSError:
+            return True
@@ -1,41 +1,81 @@
-import contextlib
+import bisect
 import os
 import sys
-import urllib.request, urllib.error
+import threading
 from functools import partial
 
 from PySide2.QtCore import QSize, Qt
 from PySide2.QtCore import QThreadPool
-from PySide2.QtGui import QPixmap, QImage
-from PySide2.QtWidgets import QApplication, QWidget, QMainWindow, QPushButton, QGridLayout, QLabel, \
-    QScrollArea, QHBoxLayout, QProgressBar, QProgressDialog, QVBoxLayout, QSizePolicy
+from PySide2.QtGui import QImage
+from PySide2.QtWidgets import QApplication, QWidget, QMainWindow, QPushButton, QLabel, \
+    QHBoxLayout, QProgressBar, QVBoxLayout, QSizePolicy, QLineEdit
 
 from CustomWorkerThread import Worker
-from EditorWindow import EditorWindow
-from SteamAppAPI import SteamApp
+from GameSearch import GameSearchIndex
+from LibraryIndex import LibraryIndex, find_screenshot_roots
+from LibraryWatcher import LibraryWatcher
+from ScreenshotGrid import GridItem, PixmapCache, ScreenshotGrid
+from ThumbnailCache import ThumbnailCache
+
+# The editor (OpenCV, numpy) and the store client (requests) are imported where they are first used,
+# so none of them hold up the first paint
+
+# Shown for apps the store has no header for (delisted, region locked)
+NO_HEADER_PATH = "no_header.jpg"
 
 
 # It creates a window with a scrollable grid of images.
 class ScreenshotBrowser(QMainWindow):
 
-    def __init__(self, steam_path):
+    def __init__(self, steam_path, fetch_concurrency=None, extra_roots=()):
         super().__init__()
         # Declarations
         self.title_label = None
-        self.scroll_area = None
         self.worker = None
         self.threadpool = None
-        self.labels = None
-
-        self.home_grid = None
-        self.game_grid = None
-        # Widgets holds scroll area (assigned in render_ui())
+        # Set when the app quits, the loading thread stops starting new games
+        self.closing = threading.Event()
+        # app id -> header image path, filled in by the loading thread
+        self.header_paths = {}
+        # Titles from the cached store metadata, for the search box
+        self.game_search = GameSearchIndex()
+        # app id -> its home grid cell, kept so filtering reuses the cells instead of looking them up
+        self.home_items = {}
+        self.search_box = None
+
+        # One virtualized grid shows either the home headers or a game's screenshots (assigned in render_ui())
+        self.grid_view = None
+        self.pixmap_cache = PixmapCache()
+        # None while the home grid is shown
+        self.current_app_id = None
+        # Set while a game's similar shots are shown instead of all of its screenshots
+        self.showing_similar = False
+        self.similar_btn = None
+        # The editor while one is shown
+        self.editor = None
+        # Shared by every editor and created with the first one, so closing an editor never waits on its exports
+        self.export_queue = None
+        # Widgets holds the grid
         self.main_widget = QWidget()
-        self.loading_box = QProgressDialog()
+        # Shown next to the title while the games' metadata and headers load
         self.loading_bar = QProgressBar()
         self.counter_test = 0
         self.steam_path = str(steam_path)
-        self.steam_screenshot_path = f"{self.steam_path}/760/remote/"
+        # steam_path is the userdata folder (every account) or a single account. Extra roots are other
+        # userdata folders, accounts or 760/remote folders, e.g. on other library drives or backups
+        self.screenshot_roots = []
+        for path in [self.steam_path, *extra_roots]:
+            self.screenshot_roots += [x for x in find_screenshot_roots(path) if x not in self.screenshot_roots]
+        # Max number of store requests in flight during the startup prefetch, None for SteamAppAPI's default
+        self.fetch_concurrency = fetch_concurrency
+        self.thumbnail_cache = ThumbnailCache()
+        # Created on the loading thread, with the store client
+        self.header_cache = None
+        # Only the game folders that changed since the last launch are rescanned, on the loading thread. The home
+        # grid starts from the games indexed at the last launch
+        self.library = LibraryIndex()
+        self.library.forget_roots_except(self.screenshot_roots)
+        self.library_watcher = None
         self.titles = self.get_app_ids_from_screenshot_folder()
         print(self.titles)
 
@@ -49,85 +89,152 @@ class ScreenshotBrowser(QMainWindow):
         palette.setColor(self.backgroundRole(), Qt.black)
         self.setPalette(palette)
 
-        # Start Loading Box
-        self.start_startup_loading_box()
+        # The window shows straight away, each game's cell appears on the home grid as soon as its header is ready
+        self.render_ui()
 
         self.threadpool = QThreadPool()
         self.start_thread(funct=self.get_img_header_paths, finished_func=self.after_initial_load,
-                          result_func=self.set_labels, progress_func=self.set_progress_bar)
+                          result_func=None, progress_func=self.set_progress_bar, partial_func=self.add_home_batch)
         # print(f"Grid Item Count: {str(self.grid.count())}")
 
     def after_initial_load(self):
-        self.loading_box.close()
-        self.render_ui()
+        self.loading_bar.hide()
+        # The loading thread's scan added the new games, the ones gone since the last launch come off the grid
+        self.on_games_changed([], sorted(set(self.titles) - set(self.library.app_ids())))
+        # New and deleted screenshots show up while the browser is open
+        self.library_watcher = LibraryWatcher(self.library, self.screenshot_roots, parent=self)
+        self.library_watcher.screenshots_changed.connect(self.on_screenshots_changed)
+        self.library_watcher.games_changed.connect(self.on_games_changed)
+
+    def on_screenshots_changed(self, app_id, changed_paths, removed_paths):
+        if self.current_app_id != app_id or self.showing_similar:
+            # Other grids read the index when they are opened
+            return
+        for path in removed_paths:
+            self.grid_view.remove_key(path)
+        model = self.grid_view.grid_model
+        for path in changed_paths:
+            if model.row_of(path) is not None:
+                self.grid_view.reload_key(path)
+            else:
+                # Keep the grid in the index's name order
+                row = bisect.bisect([os.path.basename(x.key) for x in model.items], os.path.basename(path))
+                self.grid_view.insert_item(row, GridItem(key=path, image_path=path, payload=path))
+
+    def on_games_changed(self, added_app_ids, removed_app_ids):
+        for app_id in removed_app_ids:
+            index = bisect.bisect_left(self.titles, app_id)
+            if index < len(self.titles) and self.titles[index] == app_id:
+                del self.titles[index]
+            self.header_paths.pop(app_id, None)
+            self.home_items.pop(app_id, None)
+            self.game_search.remove(app_id)
+            if self.current_app_id is None:
+                self.grid_view.remove_key(f"header:{app_id}")
+        if added_app_ids:
+            # Only the new games' metadata and headers are fetched
+            worker = Worker(function=self.get_img_header_paths, app_ids=added_app_ids, report_progress=False,
+                            partial_results=True)
+            worker.signals.partial.connect(self.add_home_batch)
+            self.threadpool.globalInstance().start(worker)
+
+    def add_home_batch(self, headers):
+        """
+        It adds games whose header is ready to the home grid
 
-    def header_clicked(self, img_path, event):
+        :param headers: A list of (app id, header path, title) from get_img_header_paths
+        """
+        new_app_ids = []
+        for app_id, header_path, name in headers:
+            if app_id in self.header_paths:
+                continue
+            index = bisect.bisect_left(self.titles, app_id)
+            if index == len(self.titles) or self.titles[index] != app_id:
+                self.titles.insert(index, app_id)
+            self.add_game(app_id, header_path, name)
+            new_app_ids.append(app_id)
+        if not new_app_ids or self.current_app_id is not None:
+            return
+        # Each new cell goes where the current search puts it, if it matches at all. Inserting from the top down
+        # puts every cell at its final row
+        results = self.game_search.search(self.search_box.text())
+        rows = {app_id: row for row, app_id in enumerate(results)}
+        for row in sorted(rows[x] for x in new_app_ids if x in rows):
+            self.grid_view.insert_item(row, self.home_item(results[row]))
+
+    def add_game(self, app_id, header_path, name):
+        self.header_paths[app_id] = header_path or NO_HEADER_PATH
+        self.game_search.add(app_id, name)
+
+    def grid_item_clicked(self, payload):
+        if self.current_app_id is None:
+            self.header_clicked(payload)
+        else:
+            self.img_clicked(payload)
+
+    def header_clicked(self, app_id):
         print("Label Clicked")
-        index = self.labels.index(img_path)
-        print(self.titles[index])
-        print(img_path)
+        print(app_id)
+        self.build_game_grid(app_id)
 
-        for x in reversed(range(self.home_grid.count())):
-            widget = self.home_grid.itemAt(x).widget()
-            widget.setParent(None)
-            widget.deleteLater()
-        with contextlib.suppress(IndexError):
-            self.build_game_grid(self.titles[index])
-        self.resizeEvent(None)
-
-    def img_clicked(self, img_path, event):
-        label = QLabel()
-        label.setPixmap(QPixmap(img_path))
+    def img_clicked(self, img_path):
         print(img_path)
-        editor = self.setup_image_editor(img_path, 107410)
+        # The grid is hidden behind the editor, stop decoding for it
+        self.grid_view.cancel_loading()
+        self.editor = self.setup_image_editor(img_path, self.current_app_id)
         self.main_widget.setParent(None)
-        self.setCentralWidget(editor)
+        self.setCentralWidget(self.editor)
 
     def setup_image_editor(self, img_path, app_id):
-        editor = EditorWindow(img_path, app_id)
+        from EditorWindow import EditorWindow
+        from ExportQueue import ExportQueue
+        if self.export_queue is None:
+            self.export_queue = ExportQueue(parent=self)
+        editor = EditorWindow(img_path, app_id, export_queue=self.export_queue)
         editor.cancel_btn.clicked.connect(self.back_btn_clicked)
         return editor
 
-
-        # NOT implemented, neither is create label below
-    def generate_qimage(self, img_path):
-        return QImage(img_path)
-
-    def create_label_for_curr_game(self, img):
-        pass
+    def close_editor(self):
+        # Done before the editor is replaced, Qt deletes it with the central widget
+        if self.editor is not None:
+            self.editor.shutdown()
+            self.editor = None
 
     def back_btn_clicked(self):
-        for x in reversed(range(self.home_grid.count())):
-            widget = self.home_grid.itemAt(x).widget()
-            widget.setParent(None)
-            widget.deleteLater()
-        with contextlib.suppress(IndexError):
-            self.build_home_grid()
-            self.setCentralWidget(self.main_widget)
-            self.resizeEvent(None)
+        self.close_editor()
+        self.build_home_grid()
+        self.setCentralWidget(self.main_widget)
 
 
 
-    def start_thread(self, funct, finished_func, result_func, progress_func, ):
-        self.worker = Worker(function=funct)
+    def shutdown(self):
+        """
+        It stops the background work and waits for what is already running, so nothing is left touching the
+        window or the interpreter once the app exits
+        """
+        self.closing.set()
+        self.close_editor()
+        if self.library_watcher is not None:
+            self.library_watcher.timer.stop()
+        if self.grid_view is not None:
+            self.grid_view.loader.shutdown()
+        QThreadPool.globalInstance().waitForDone()
+        if self.export_queue is not None:
+            # Queued exports are the user's edits, they are written out rather than dropped
+            self.export_queue.wait()
+
+    def start_thread(self, funct, finished_func, result_func, progress_func, partial_func=None):
+        self.worker = Worker(function=funct, partial_results=partial_func is not None)
         self.worker.signals.finished.connect(finished_func)
-        self.worker.signals.result.connect(result_func)
+        if result_func is not None:
+            self.worker.signals.result.connect(result_func)
+        if partial_func is not None:
+            self.worker.signals.partial.connect(partial_func)
         self.worker.signals.progress.connect(progress_func)
         self.threadpool.globalInstance().start(self.worker)
 
-    def start_startup_loading_box(self):
-        self.loading_box.setLabelText("Loading, please wait.")
-        self.loading_box.setWindowTitle("Sing's Steam Photo Editor")
-        self.loading_box.setBar(self.loading_bar)
-        self.loading_box.setMinimum(0)
-        self.loading_box.setMaximum(len(self.get_app_ids_from_screenshot_folder()))
-        self.loading_box.show()
-
-    def set_labels(self, labels):
-        self.labels = labels
-
     def set_progress_bar(self, value):
-        self.loading_box.setValue(value)
+        self.loading_bar.setValue(value)
 
     def render_ui(self):
         # Defining the UI Elements and their layouts
@@ -140,6 +247,18 @@ class ScreenshotBrowser(QMainWindow):
         self.title_label.setAlignment(Qt.AlignCenter)
         hbox.addWidget(self.title_label)
 
+        # Filters the home grid as the user types
+        self.search_box = QLineEdit()
+        self.search_box.setPlaceholderText("Search games")
+        self.search_box.setClearButtonEnabled(True)
+        self.search_box.textChanged.connect(self.filter_home_grid)
+        hbox.addWidget(self.search_box)
+
+        # One step per game whose header is ready
+        self.loading_bar.setRange(0, len(self.titles))
+        self.loading_bar.setFormat("Loading games %v/%m")
+        hbox.addWidget(self.loading_bar)
+
         # Q. Button Init
         quit_btn = QPushButton("Quit")
         # quit_btn.clicked.connect(self.close())
@@ -149,34 +268,23 @@ class ScreenshotBrowser(QMainWindow):
         back_btn.clicked.connect(self.back_btn_clicked)
         hbox.addWidget(back_btn)
 
-        # Scroll Area Init
-        self.scroll_area = QScrollArea()
+        # Groups the open game's near duplicate screenshots (bursts, repeated shots of the same view)
+        self.similar_btn = QPushButton("Similar Shots")
+        self.similar_btn.setEnabled(False)
+        self.similar_btn.clicked.connect(self.similar_btn_clicked)
+        hbox.addWidget(self.similar_btn)
 
-        # Widget that holds the scroll area
-        self.scroll_area.setWidgetResizable(True)
-        self.scroll_area.setVerticalScrollBarPolicy(Qt.ScrollBarAsNeeded)
-        self.scroll_area.setVisible(True)
-        self.scroll_area.setEnabled(True)
-        # Creation of image grid
-        self.home_grid = QGridLayout()
-        self.home_grid.setVerticalSpacing(10)
-        self.home_grid.setContentsMargins(10, 10, 10, 10)
+        # Creation of image grid, it scrolls by itself and only decodes the cells on screen
+        self.grid_view = ScreenshotGrid(load_func=self.load_header_image, pixmap_cache=self.pixmap_cache)
+        self.grid_view.item_clicked.connect(self.grid_item_clicked)
 
-        # Loop that adds returned values from different thread to the grid layout
+        # Fills the grid with the headers returned from the loading thread
         self.build_home_grid()
-
-        # TODO: here add a nested loop that builds the ENTIRE thing from render_ui() again, including a widget that can be set as central. Then try to replace the ENTIRE thing.
-        # If that doesn't work, then making everything class scoped and use the method you are now
-
-        print("Grid items after loop: ", self.home_grid.count())
-        self.scroll_widget = QWidget()
-        self.scroll_area.setWidget(self.scroll_widget)
-        self.scroll_widget.setLayout(self.home_grid)
+        print("Grid items after loop: ", self.grid_view.grid_model.rowCount())
 
         # Kinda like a parenting thing. Adds widget to grid, and sets the box to the main layout
-        print(vbox.sizeConstraint())
         vbox.addLayout(hbox)
-        vbox.addWidget(self.scroll_area)
+        vbox.addWidget(self.grid_view)
         self.main_widget.setLayout(vbox)
         self.setCentralWidget(self.main_widget)
         self.show()
@@ -184,72 +292,123 @@ class ScreenshotBrowser(QMainWindow):
     def show(self):
         super().show()
 
-    def get_img_header_paths(self, progress):
-        header_paths = []
-        for counter, x in enumerate(self.get_app_ids_from_screenshot_folder(), start=1):
-            steam_api = SteamApp(x)
-            img_path = self.load_pixmap_for_home(steam_api)
-            header_paths.append(img_path)
-
-            progress.emit(counter)
-
-        return header_paths
-
-    def get_screenshot_paths(self, progress):
-        screenshot_paths = []
-        for counter, x in enumerate(self.get_app_ids_from_screenshot_folder(), start=1):
-            steam_api = SteamApp(x)
-            img_path = self.load_pixmap_for_home(steam_api)
-            screenshot_paths.append(img_path)
-
-            progress.emit(counter)
-
-        return screenshot_paths
+    def get_img_header_paths(self, progress, app_ids=None, report_progress=True, partial=None):
+        """
+        It resolves every game's metadata and header image, each game's header straight after its metadata, so the
+        first headers are ready long before the last game is resolved
+
+        :param progress: Receives the number of games done so far
+        :param app_ids: The games to load. If None, every game indexed at the last launch, then the library is
+            scanned and the games new since then are loaded too
+        :param report_progress: Whether to emit progress at all
+        :param partial: Optional, receives (app id, header path, title) for each game as soon as it is ready
+        :return: A dict of app id -> (header path, title), see load_games
+        """
+        # Runs on the loading thread, so the HTTP stack loads while the window is already up
+        from GameLoader import load_games
+        from HeaderCache import HeaderCache
+        from SteamAppAPI import DEFAULT_FETCH_CONCURRENCY
+        if self.header_cache is None:
+            self.header_cache = HeaderCache()
+        max_workers = self.fetch_concurrency or DEFAULT_FETCH_CONCURRENCY
+        indexed = list(self.titles) if app_ids is None else app_ids
+        games = load_games(indexed, header_cache=self.header_cache, max_workers=max_workers,
+                           progress=progress if report_progress else None, partial=partial, closing=self.closing)
+        if app_ids is None and not self.closing.is_set():
+            # Every account is scanned at the same time, games found in several are merged into one
+            self.library.refresh_all(self.screenshot_roots)
+            indexed = set(indexed)
+            new_app_ids = [x for x in self.library.app_ids() if x not in indexed]
+            games.update(load_games(new_app_ids, header_cache=self.header_cache, max_workers=max_workers,
+                                    partial=partial, closing=self.closing))
+        return games
 
     def build_game_grid(self, app_id):
+        self.current_app_id = str(app_id)
+        self.showing_similar = False
+        self.similar_btn.setText("Similar Shots")
+        self.similar_btn.setEnabled(True)
+        self.search_box.setEnabled(False)
         screenshot_paths = self.load_screenshots_for_game(str(app_id))
-        row, col = 0, 0
-        for x in screenshot_paths:
-            label = QLabel()
-            pixmap = QPixmap(x)
-            label.setPixmap(pixmap.scaled(500, 300, Qt.KeepAspectRatio, Qt.SmoothTransformation))
-            label.setScaledContents(True)
-            label.mousePressEvent = partial(self.img_clicked, x)
-            self.home_grid.addWidget(label, row, col)
-            col += 1
-            if col == 4:
-                row += 1
-                col = 0
+        # Thumbnails are read (or generated) on the pool as their cells scroll into view
+        items = [GridItem(key=x, image_path=x, payload=x) for x in screenshot_paths]
+        self.grid_view.set_items(items, load_func=self.load_thumbnail)
+
+    def load_thumbnail(self, item):
+        return self.thumbnail_cache.load(item.image_path)
+
+    def similar_btn_clicked(self):
+        if self.showing_similar:
+            # Back to all of the game's screenshots
+            self.build_game_grid(self.current_app_id)
+            return
+        from DuplicateFinder import find_similar
+        app_id = self.current_app_id
+        self.similar_btn.setEnabled(False)
+        self.similar_btn.setText("Hashing...")
+        # Hashing new screenshots decodes them, so it runs off the GUI thread
+        worker = Worker(function=find_similar, library=self.library, app_id=app_id, cancel_event=self.closing)
+        worker.signals.progress.connect(partial(self.on_similar_progress, app_id))
+        worker.signals.result.connect(partial(self.build_similar_grid, app_id))
+        # Also after an error, so the button doesn't stay stuck on "Hashing..."
+        worker.signals.finished.connect(partial(self.on_similar_finished, app_id))
+        self.threadpool.globalInstance().start(worker)
+
+    def on_similar_progress(self, app_id, done):
+        # The button belongs to whichever grid is shown now
+        if app_id == self.current_app_id and not self.showing_similar:
+            self.similar_btn.setText(f"Hashing... {done}")
+
+    def on_similar_finished(self, app_id):
+        if app_id == self.current_app_id and not self.showing_similar:
+            # The hashing failed, the game's screenshots are still shown
+            self.similar_btn.setText("Similar Shots")
+            self.similar_btn.setEnabled(True)
+
+    def build_similar_grid(self, app_id, groups):
+        if app_id != self.current_app_id:
+            # The user left the game while it was hashing
+            return
+        self.showing_similar = True
+        self.similar_btn.setText("All Shots")
+        self.similar_btn.setEnabled(True)
+        # Every group's shots one after another, largest group first
+        items = [GridItem(key=path, image_path=path, payload=path, title=f"Group {number} ({len(group)} shots)")
+                 for number, group in enumerate(groups, start=1) for path in group]
+        print(f"{len(groups)} groups of similar shots in {app_id}")
+        self.grid_view.set_items(items, load_func=self.load_thumbnail)
 
     def build_home_grid(self):
-        row, col, curr_item = 0, 0, 0
-        for x in self.labels:
-            label = QLabel()
-            pixmap = QPixmap(x)
-            label.setPixmap(pixmap.scaled(400, 200, Qt.KeepAspectRatio, Qt.SmoothTransformation))
-            label.setScaledContents(True)
-            label.setContentsMargins(5, 5, 5, 5)
-            label.mousePressEvent = partial(self.header_clicked, self.labels[curr_item])
-            self.home_grid.addWidget(label, row, col)
-            col += 1
-            curr_item += 1
-            if col == 4:
-                row += 1
-                col = 0
+        self.current_app_id = None
+        self.showing_similar = False
+        self.similar_btn.setText("Similar Shots")
+        self.similar_btn.setEnabled(False)
+        self.search_box.setEnabled(True)
+        # The search is kept when coming back from a game
+        self.filter_home_grid(self.search_box.text())
+
+    def filter_home_grid(self, query):
+        """
+        It shows the games matching query on the home grid, every game when it is empty
+
+        :param query: The search box's text
+        """
+        if self.current_app_id is not None:
+            return
+        items = [self.home_item(x) for x in self.game_search.search(query)]
+        self.grid_view.set_items(items, load_func=self.load_header_image)
+
+    def home_item(self, app_id):
+        item = self.home_items.get(app_id)
+        if item is None:
+            item = GridItem(key=f"header:{app_id}", image_path=self.header_paths[app_id], payload=app_id,
+                            title=self.game_search.name(app_id))
+            self.home_items[app_id] = item
+        return item
 
     @staticmethod
-    def load_pixmap_for_home(steam_api):
-        img_path = "cache/image_cache/" + steam_api.get("name").replace(":", "") + "_header.jpg"
-        try:
-            if not os.path.exists(img_path):
-                header_link = steam_api.get("header_image")
-                print(header_link)
-                urllib.request.urlretrieve(header_link, img_path)
-                print(img_path)
-            return img_path
-        except urllib.error.URLError as e:
-            print(e)
-            return "no_header.jpg"
+    def load_header_image(item):
+        return QImage(item.image_path)
 
     # Loads screenshot links from directory based on app id
     def load_screenshots_for_game(self, app_id):
@@ -259,51 +418,35 @@ class ScreenshotBrowser(QMainWindow):
         param app_id: The Steam App ID of the game you want to get the screenshots for
         :return: A list of paths to the screenshots for a given game.
         """
-        paths_list = []
-        full_path = f"{self.steam_screenshot_path}/{app_id}/screenshots"
-        for file in os.listdir(full_path):
-            file_path = f"{full_path}/{file}"
-            paths_list.append(file_path)
-
-        return paths_list
+        # A single stat when nothing changed since the folder was last indexed
+        for root in self.library.roots_of(app_id):
+            self.library.refresh_folder(root, app_id)
+        return self.library.screenshot_paths(app_id)
 
     def get_app_ids_from_screenshot_folder(self):
-        return list(os.listdir(self.steam_screenshot_path))
-
-    def label_hover_begin(self, label, img_path):
-        index = self.labels.index(img_path)
-        label.setText(self.titles[index])
-
-    def label_hover_end(self, img_path):
-        pass
+        return self.library.app_ids()
 
     # Layout resize event
     def resizeEvent(self, event):
-        """
-        It sets the maximum size of each widget in the grid layout to be 1/5 of the size of the central widget, minus 20
-        pixels for the border, minus 10 pixels for the spacing, minus 10 pixels for the margin
+        super().resizeEvent(event)
+        self.update_cell_size()
 
-        :param event: The event object that was passed to the event handler
+    def update_cell_size(self):
+        """
+        It sets the size of every grid cell to be about 1/4.5 of the size of the central widget, minus a few pixels
+        for the border, the spacing and the margin
         """
+        if self.grid_view is None or self.centralWidget() is None:
+            return
         size = self.centralWidget().size()
         size -= QSize(4, 4)
         size /= 4.5
         size -= QSize(4, 4)
         size -= QSize(4, 4)
 
-        # Calculate the maximum aspect ratio
-        aspect_ratio = 0
-        for i in range(self.home_grid.count()):
-            item = self.home_grid.itemAt(i)
-            widget = item.widget()
-            pixmap = widget.pixmap()
-            height = pixmap.height()
-            if height != 0:
-                aspect_ratio = max(aspect_ratio, pixmap.width() / height)
-
-        for x in range(self.home_grid.count()):
-            cell = self.home_grid.itemAt(x)
-            cell.widget().setFixedSize(size)
+        # The grid lays itself out once a burst of these is over, and only the cells on screen are scaled
+        # (once per size bucket) when they are painted
+        self.grid_view.set_cell_size(size)
 
 
 if __name__ == "__main__":
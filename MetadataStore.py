@@ -0,0 +1,225 @@
+import glob
+import json
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_DB_PATH = 'cache/metadata.db'
+# Store metadata changes rarely, a month is plenty before checking again
+DEFAULT_TTL = 30 * 24 * 60 * 60
+# Apps the store reports as unavailable (delisted, region locked) are not asked for again for a week
+UNAVAILABLE_TTL = 7 * 24 * 60 * 60
+# Requests that failed for other reasons (network, rate limit) are retried on a later launch
+FAILED_TTL = 60 * 60
+# SQLite limits the number of bound parameters per statement
+MAX_QUERY_PARAMS = 900
+
+
+class MetadataStore:
+    """
+    A single SQLite database that holds the store metadata for every app, keyed by app id.
+
+    Only the fields the browser uses are projected into columns. The full appdetails payload is kept only when
+    keep_raw is set, since it is mostly large HTML descriptions that are never read.
+    """
+
+    def __init__(self, db_path=DEFAULT_DB_PATH, keep_raw=False, default_ttl=DEFAULT_TTL):
+        self.db_path = db_path
+        self.keep_raw = keep_raw
+        self.default_ttl = default_ttl
+        self.lock = threading.Lock()
+
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+
+        # The prefetch pool writes from several threads, so share one connection behind a lock
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        with self.lock, self.conn:
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            # It's a cache, losing the last few writes on a power cut is fine
+            self.conn.execute('PRAGMA synchronous=NORMAL')
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS apps (
+                    app_id TEXT PRIMARY KEY,
+                    name TEXT,
+                    header_image TEXT,
+                    is_free INTEGER,
+                    dlc TEXT,
+                    raw TEXT,
+                    fetched_at REAL NOT NULL,
+                    ttl REAL NOT NULL
+                )''')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS apps_name ON apps (name)')
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS failures (
+                    app_id TEXT PRIMARY KEY,
+                    reason TEXT,
+                    failed_at REAL NOT NULL,
+                    ttl REAL NOT NULL
+                )''')
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS headers (
+                    app_id TEXT PRIMARY KEY,
+                    url TEXT NOT NULL,
+                    etag TEXT,
+                    last_modified TEXT,
+                    checked_at REAL NOT NULL
+                )''')
+            self.conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def put(self, app_id, data, ttl=None):
+        """
+        It stores the data section of an appdetails response for app_id
+
+        :param app_id: The Steam App ID
+        :param data: The 'data' dict of the appdetails response
+        :param ttl: Seconds before the entry is considered stale, defaults to the store's default_ttl
+        """
+        ttl = self.default_ttl if ttl is None else ttl
+        raw = json.dumps(data) if self.keep_raw else None
+        with self.lock, self.conn:
+            self.conn.execute('DELETE FROM failures WHERE app_id = ?', (str(app_id),))
+            self.conn.execute(
+                'INSERT OR REPLACE INTO apps (app_id, name, header_image, is_free, dlc, raw, fetched_at, ttl) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (str(app_id), data.get('name'), data.get('header_image'), int(bool(data.get('is_free'))),
+                 json.dumps(data.get('dlc', [])), raw, time.time(), ttl))
+
+    def get(self, app_id, include_stale=False):
+        return self.get_many([app_id], include_stale=include_stale).get(str(app_id))
+
+    def get_many(self, app_ids, include_stale=False):
+        """
+        It looks up many app ids at once
+
+        :param app_ids: The Steam App IDs to look up
+        :param include_stale: Also return entries whose ttl has run out
+        :return: A dict of app id -> data dict, missing (and stale) ids are left out
+        """
+        app_ids = [str(x) for x in app_ids]
+        found = {}
+        now = time.time()
+        with self.lock:
+            for start in range(0, len(app_ids), MAX_QUERY_PARAMS):
+                chunk = app_ids[start:start + MAX_QUERY_PARAMS]
+                query = f'SELECT * FROM apps WHERE app_id IN ({",".join("?" * len(chunk))})'
+                params = list(chunk)
+                if not include_stale:
+                    query += ' AND fetched_at + ttl >= ?'
+                    params.append(now)
+                for row in self.conn.execute(query, params):
+                    found[row['app_id']] = self.row_to_data(row)
+        return found
+
+    def put_failure(self, app_id, reason, ttl=FAILED_TTL):
+        """
+        It records that app_id could not be resolved, so it is skipped until ttl seconds have passed
+
+        :param app_id: The Steam App ID
+        :param reason: A short description of what went wrong
+        :param ttl: Seconds before the app id may be requested again
+        """
+        with self.lock, self.conn:
+            self.conn.execute('INSERT OR REPLACE INTO failures (app_id, reason, failed_at, ttl) VALUES (?, ?, ?, ?)',
+                              (str(app_id), str(reason), time.time(), ttl))
+
+    def get_failure(self, app_id):
+        """
+        :return: The reason app_id failed last time, or None if it has no unexpired failure
+        """
+        with self.lock:
+            row = self.conn.execute('SELECT reason FROM failures WHERE app_id = ? AND failed_at + ttl >= ?',
+                                    (str(app_id), time.time())).fetchone()
+        return row['reason'] if row is not None else None
+
+    def put_header(self, app_id, url, etag=None, last_modified=None):
+        """
+        It records the validators of the header image cached for app_id, and that it was checked just now
+
+        :param app_id: The Steam App ID
+        :param url: The header_image url the file was downloaded from
+        :param etag: The ETag response header, if the server sent one
+        :param last_modified: The Last-Modified response header, if the server sent one
+        """
+        with self.lock, self.conn:
+            self.conn.execute('INSERT OR REPLACE INTO headers (app_id, url, etag, last_modified, checked_at) '
+                              'VALUES (?, ?, ?, ?, ?)', (str(app_id), url, etag, last_modified, time.time()))
+
+    def get_header(self, app_id):
+        """
+        :return: A dict with url, etag, last_modified and checked_at for app_id's cached header, or None
+        """
+        with self.lock:
+            row = self.conn.execute('SELECT url, etag, last_modified, checked_at FROM headers WHERE app_id = ?',
+                                    (str(app_id),)).fetchone()
+        return dict(row) if row is not None else None
+
+    @staticmethod
+    def row_to_data(row):
+        if row['raw'] is not None:
+            return json.loads(row['raw'])
+        return {
+            'name': row['name'],
+            'header_image': row['header_image'],
+            'is_free': bool(row['is_free']),
+            'dlc': json.loads(row['dlc']) if row['dlc'] else [],
+        }
+
+    def migrate_json_cache(self, cache_dir='cache'):
+        """
+        It imports the old one-file-per-app cache/<app_id>.json files into the store and removes them.
+        Runs once, later calls return straight away.
+
+        :param cache_dir: The folder that holds the old json files
+        :return: The number of apps imported
+        """
+        with self.lock:
+            done = self.conn.execute("SELECT value FROM meta WHERE key = 'json_cache_migrated'").fetchone()
+        if done is not None:
+            return 0
+
+        imported = 0
+        for file_path in glob.glob(os.path.join(cache_dir, '*.json')):
+            app_id = os.path.splitext(os.path.basename(file_path))[0]
+            try:
+                with open(file_path) as file:
+                    payload = json.loads(file.read())
+                entry = payload[app_id]
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                print(f"Skipping {file_path}: {e}")
+                continue
+            if not isinstance(entry, dict) or not isinstance(entry.get('data', {}), dict):
+                print(f"Skipping {file_path}: not an appdetails entry")
+                continue
+            # Old cache files also hold failed responses, those are simply dropped
+            if entry.get('success') and 'data' in entry:
+                self.put(app_id, entry['data'])
+                imported += 1
+            os.remove(file_path)
+
+        with self.lock, self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('json_cache_migrated', ?)",
+                              (str(time.time()),))
+        return imported
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_default_store():
+    """
+    It returns the shared store at DEFAULT_DB_PATH, creating it and migrating the old json cache on first use
+    """
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = MetadataStore()
+            _default_store.migrate_json_cache()
+        return _default_store
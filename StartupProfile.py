@@ -0,0 +1,90 @@
+import sys
+import time
+from contextlib import contextmanager
+
+# Libraries that should only load once the feature needing them is used
+HEAVY_MODULES = ('cv2', 'numpy', 'imutils', 'requests', 'bs4')
+# The report is printed anyway if the main window hasn't painted by then (e.g. a slow store prefetch)
+PAINT_TIMEOUT_MS = 120000
+
+
+class StartupProfile:
+    """
+    Times the phases of startup (imports, window construction, first paint) for --startup-profile.
+
+    Qt is only imported once watch_paint() is called, so the Qt import itself can be timed as a phase.
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        # (name, seconds, modules imported during the phase)
+        self.phases = []
+        self.last_mark = self.start
+        self.watcher = None
+        self.main_window_class = None
+        self.modules_at_first_paint = None
+
+    @contextmanager
+    def phase(self, name):
+        modules_before = len(sys.modules)
+        start = time.perf_counter()
+        yield
+        self.phases.append((name, time.perf_counter() - start, len(sys.modules) - modules_before))
+        self.last_mark = time.perf_counter()
+
+    def mark(self, name):
+        # A phase that ends now and started at the previous phase's end, e.g. the time to the first paint
+        now = time.perf_counter()
+        self.phases.append((name, now - self.last_mark, 0))
+        self.last_mark = now
+
+    def watch_paint(self, app, main_window_class):
+        """
+        It records the first paint of any window, then reports and quits the app once a main_window_class
+        window has painted
+
+        :param app: The QApplication
+        :param main_window_class: The class of the window whose first paint ends startup
+        """
+        from PySide2.QtCore import QEvent, QObject, QTimer
+
+        profile = self
+
+        class PaintWatcher(QObject):
+            def eventFilter(self, obj, event):
+                if event.type() == QEvent.Paint and obj.isWidgetType() and obj.isWindow():
+                    profile.on_window_painted(app, obj)
+                return False
+
+        self.main_window_class = main_window_class
+        self.watcher = PaintWatcher()
+        app.installEventFilter(self.watcher)
+        QTimer.singleShot(PAINT_TIMEOUT_MS, lambda: self.finish(app, timed_out=True))
+
+    def on_window_painted(self, app, window):
+        if self.modules_at_first_paint is None:
+            self.mark(f"first paint ({type(window).__name__})")
+            self.modules_at_first_paint = set(sys.modules)
+        if isinstance(window, self.main_window_class):
+            self.mark(f"main window painted ({type(window).__name__})")
+            self.finish(app)
+
+    def finish(self, app, timed_out=False):
+        if self.watcher is None:
+            return
+        app.removeEventFilter(self.watcher)
+        self.watcher = None
+        self.report(timed_out)
+        app.quit()
+
+    def report(self, timed_out=False):
+        print("Startup profile")
+        for name, seconds, modules in self.phases:
+            imported = f"  {modules} modules imported" if modules else ""
+            print(f"  {name:<45} {seconds * 1000:8.1f} ms{imported}")
+        print(f"  {'total':<45} {(self.last_mark - self.start) * 1000:8.1f} ms")
+        if timed_out:
+            print(f"  The main window didn't paint within {PAINT_TIMEOUT_MS // 1000}s")
+        loaded = self.modules_at_first_paint if self.modules_at_first_paint is not None else set(sys.modules)
+        heavy = [x for x in HEAVY_MODULES if x in loaded]
+        print(f"  Loaded before the first paint: {', '.join(heavy) if heavy else 'none of ' + ', '.join(HEAVY_MODULES)}")
@@ -1,34 +1,203 @@
 import json
-import os
+import random
+import threading
+import time
 
-from bs4 import BeautifulSoup
 import requests
+from requests.adapters import HTTPAdapter
+
+from MetadataStore import get_default_store, UNAVAILABLE_TTL, FAILED_TTL
+
+STORE_API_URL = 'https://store.steampowered.com/api/appdetails'
+DEFAULT_FETCH_CONCURRENCY = 8
+
+# The store API allows roughly 200 appdetails requests per 5 minutes per IP
+STORE_API_RATE = 200 / (5 * 60)
+STORE_API_BURST = 200
+REQUEST_TIMEOUT = 10
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class StoreRequestError(Exception):
+    pass
+
+
+class RequestCancelled(Exception):
+    # The app is closing, the request was given up on rather than failed
+    pass
+
+
+class TokenBucket:
+    """
+    A thread safe token bucket. Tokens refill at rate per second up to capacity, acquire() blocks until one is free.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0
+        self.lock = threading.Lock()
+
+    def acquire(self, closing=None):
+        """
+        :param closing: Optional threading.Event, the wait is cut short once it is set
+        :raises RequestCancelled: When closing was set before a token was free
+        """
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if now >= self.paused_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = max(self.paused_until - now, (1 - self.tokens) / self.rate)
+            if closing is None:
+                time.sleep(wait)
+            elif closing.wait(wait):
+                raise RequestCancelled("Closing")
+
+    def pause(self, seconds):
+        # Used when the server says we are going too fast, every caller waits, not just the one that got told off
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0
+
+
+class RequestScheduler:
+    """
+    It sends GET requests through a shared token bucket and retries 429/5xx responses and connection errors
+    with exponential backoff, honouring Retry-After when the server sends it.
+    """
+
+    def __init__(self, rate=STORE_API_RATE, burst=STORE_API_BURST, max_retries=5, backoff_base=1.0, backoff_max=60.0):
+        self.bucket = TokenBucket(rate, burst)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retries = 0
+
+    def backoff_delay(self, attempt, response=None):
+        if response is not None:
+            retry_after = response.headers.get('Retry-After', '')
+            if retry_after.isdigit():
+                return min(self.backoff_max, float(retry_after))
+        delay = min(self.backoff_max, self.backoff_base * 2 ** attempt)
+        return delay + random.uniform(0, self.backoff_base)
+
+    def get(self, url, params=None, session=None, closing=None):
+        """
+        :param url: The url to request
+        :param params: Query parameters
+        :param session: Optional requests.Session, plain requests is used otherwise
+        :param closing: Optional threading.Event, once it is set no more attempts are made and no waits are sat out
+        :return: The requests.Response of the first attempt that wasn't retried
+        :raises StoreRequestError: When all retries were used up
+        :raises RequestCancelled: When closing was set before a response came back
+        """
+        http = session if session is not None else requests
+        error = None
+        for attempt in range(self.max_retries + 1):
+            if closing is not None and closing.is_set():
+                raise RequestCancelled("Closing")
+            self.bucket.acquire(closing)
+            try:
+                response = http.get(url, params=params, timeout=REQUEST_TIMEOUT)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+                delay = self.backoff_delay(attempt)
+            else:
+                if response.status_code not in RETRY_STATUS_CODES:
+                    return response
+                error = f"HTTP {response.status_code}"
+                delay = self.backoff_delay(attempt, response)
+                if response.status_code == 429:
+                    self.bucket.pause(delay)
+            if attempt < self.max_retries:
+                self.retries += 1
+                if closing is None:
+                    time.sleep(delay)
+                elif closing.wait(delay):
+                    raise RequestCancelled("Closing")
+        raise StoreRequestError(f"{url} failed after {self.max_retries + 1} attempts: {error}")
+
+
+_default_scheduler = None
+_default_scheduler_lock = threading.Lock()
+
+
+def get_default_scheduler():
+    """
+    It returns the scheduler shared by every store request, so the rate limit holds across the whole app
+    """
+    global _default_scheduler
+    with _default_scheduler_lock:
+        if _default_scheduler is None:
+            _default_scheduler = RequestScheduler()
+        return _default_scheduler
+
+
+def create_session(pool_size=DEFAULT_FETCH_CONCURRENCY):
+    """
+    It creates a requests session whose connection pool is big enough for pool_size threads, so every worker
+    reuses a keep-alive connection instead of opening a new one per request
+
+    :param pool_size: The number of connections to keep open per host
+    :return: A requests.Session
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
 
 
 class SteamApp:
     r = None
     app_id = None
 
-    def __init__(self, app_id):
+    def __init__(self, app_id, session=None, store=None, data=None, scheduler=None, closing=None):
         self.app_id = str(app_id)
+        store = store if store is not None else get_default_store()
 
-        # If cached item exists, load it. Otherwise, send and receive request
-        if os.path.exists(f'./cache/{self.app_id}.json'):
-            cached_file = f'./cache/{self.app_id}.json'
+        # Data already looked up by the caller (bulk lookups) is used as is
+        if data is None:
+            data = store.get(self.app_id)
 
-            with open(cached_file) as file:
-                self.r = json.loads(file.read())
-                file.close()
+        # If cached item exists, use it. If it failed recently, don't ask again. Otherwise, send and receive request
+        if data is not None:
+            self.r = {self.app_id: {'success': True, 'data': data}}
+        elif store.get_failure(self.app_id) is not None:
+            self.r = {self.app_id: {'success': False}}
         else:
-            self.r = json.loads(
-                requests.get(
-                    f'https://store.steampowered.com/api/appdetails?appids={self.app_id}'
-                ).text
-            )
+            self.r = self.request(store, session, scheduler, closing)
 
-            with open(f'./cache/{self.app_id}.json', 'w') as file:
-                file.write(json.dumps(self.r))  # Need to write in proper json
-                file.close()
+    def request(self, store, session, scheduler, closing=None):
+        scheduler = scheduler if scheduler is not None else get_default_scheduler()
+        try:
+            response = scheduler.get(STORE_API_URL, params={'appids': self.app_id}, session=session, closing=closing)
+            entry = json.loads(response.text)[self.app_id]
+        except RequestCancelled:
+            # Not the store's fault, nothing is recorded and it is asked for again next launch
+            return {self.app_id: {'success': False}}
+        except (StoreRequestError, requests.RequestException, ValueError, KeyError, TypeError) as e:
+            # Out of date metadata beats none, the title and header stay and it is asked for again next time
+            stale = store.get(self.app_id, include_stale=True)
+            if stale is not None:
+                print(f"Could not refresh app {self.app_id}, using the cached data: {e}")
+                return {self.app_id: {'success': True, 'data': stale}}
+            print(f"Could not load app {self.app_id}: {e}")
+            store.put_failure(self.app_id, str(e), ttl=FAILED_TTL)
+            return {self.app_id: {'success': False}}
+
+        if entry.get('success') and 'data' in entry:
+            store.put(self.app_id, entry['data'])
+        else:
+            # Delisted or region locked, the store will keep saying no for a while
+            store.put_failure(self.app_id, "Not available on the store", ttl=UNAVAILABLE_TTL)
+        return {self.app_id: entry}
 
     def __str__(self, ) -> str:
         return "\nTitle: " + self.get(key="name") + "\nid: " + self.app_id
@@ -36,6 +205,9 @@ class SteamApp:
     def get_id(self):
         return self.app_id
 
+    def is_available(self):
+        return bool(self.r[self.app_id].get('success')) and 'data' in self.r[self.app_id]
+
     def is_free(self):
         # Checking if the game is free.
         if not self.r[self.app_id]['data']['is_free']:
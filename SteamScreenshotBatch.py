@@ -0,0 +1,131 @@
+"""
+Applies one set of edits to the screenshots of many games, without the GUI.
+
+    python SteamScreenshotBatch.py <userdata path> --apps 1061910 "10*" --filter Sepia --brightness 10 -j 4
+
+The userdata path can be a single account (userdata/<id>) or the userdata folder itself, then every account in it
+is used. Edits come from --recipe (a JSON file with filter, brightness, contrast, gamma, black and white) and/or the
+matching flags, flags win. Output goes to <output>/<app_id>/ (<output>/<account>/<app_id>/ when several accounts are
+used), finished files are remembered so a rerun resumes.
+
+Nothing here imports PySide2, so it runs on a headless machine.
+"""
+import argparse
+import fnmatch
+import json
+import os
+import sys
+import time
+
+from BatchEngine import BatchEngine, DEFAULT_JPEG_QUALITY, create_pool, list_screenshots
+from ImagePipeline import FILTERS, Tone
+from LibraryIndex import find_screenshot_roots
+
+TONE_FIELDS = Tone._fields
+
+
+def find_games(roots, patterns):
+    """
+    :param roots: 760/remote folders
+    :param patterns: App IDs or glob patterns of them, every game when empty
+    :return: (account, app_id, screenshots folder) tuples, in account then app ID order
+    """
+    games = []
+    for root in roots:
+        account = os.path.basename(os.path.dirname(os.path.dirname(root)))
+        with os.scandir(root) as entries:
+            for entry in entries:
+                folder = os.path.join(entry.path, "screenshots")
+                if not entry.is_dir() or not os.path.isdir(folder):
+                    continue
+                if patterns and not any(fnmatch.fnmatchcase(entry.name, x) for x in patterns):
+                    continue
+                games.append((account, entry.name, folder))
+    return sorted(games)
+
+
+def build_settings(args):
+    """
+    :return: The pipeline settings for the recipe file and flags in args
+    """
+    recipe = {}
+    if args.recipe:
+        with open(args.recipe) as file:
+            recipe = json.load(file)
+    for name in ("filter",) + TONE_FIELDS:
+        value = getattr(args, name)
+        if value is not None:
+            recipe[name] = value
+
+    filter_name = recipe.get("filter")
+    if filter_name is not None and filter_name not in FILTERS:
+        raise ValueError(f"Unknown filter {filter_name}, expected one of {', '.join(FILTERS)}")
+    # Per channel values come in as JSON lists, the tone LUT cache needs them hashable
+    tone = Tone(**{x: tuple(recipe[x]) if isinstance(recipe[x], list) else recipe[x]
+                   for x in TONE_FIELDS if x in recipe})
+    return {"filter": filter_name, "tone": tone}
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Apply edits to Steam screenshots without the GUI")
+    parser.add_argument("userdata", help="userdata/<id>, or userdata to use every account")
+    parser.add_argument("--apps", nargs="*", default=[], help="App IDs or globs such as 10*, default every game")
+    parser.add_argument("--recipe", help="JSON file with filter, brightness, contrast, gamma, black and white")
+    parser.add_argument("--filter", help=f"One of {', '.join(FILTERS)}")
+    parser.add_argument("--brightness", type=int, help="-255..255")
+    parser.add_argument("--contrast", type=int, help="-50..50")
+    parser.add_argument("--gamma", type=float)
+    parser.add_argument("--black", type=int)
+    parser.add_argument("--white", type=int)
+    parser.add_argument("-o", "--output", default="export/batch", help="Output folder, default export/batch")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1, help="Worker processes")
+    parser.add_argument("--quality", type=int, default=DEFAULT_JPEG_QUALITY, help="JPEG quality")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    try:
+        settings = build_settings(args)
+    except (OSError, ValueError, TypeError) as e:
+        print(f"Bad recipe: {e}")
+        return 2
+
+    roots = find_screenshot_roots(args.userdata)
+    games = find_games(roots, args.apps)
+    if not games:
+        print(f"No matching games under {args.userdata}")
+        return 1
+
+    jobs = max(1, args.jobs)
+    totals = {'done': 0, 'skipped': 0, 'failed': 0}
+    start = time.perf_counter()
+    # One pool for every game, so the processes (and their pipelines) start only once
+    with create_pool(jobs) as pool:
+        for account, app_id, folder in games:
+            # Two accounts can have screenshots of the same game with the same names
+            output_dir = os.path.join(args.output, *((account,) if len(roots) > 1 else ()), app_id)
+            engine = BatchEngine(settings, output_dir, workers=jobs,
+                                 jpeg_quality=args.quality)
+            try:
+                stats = engine.run(list_screenshots(folder), pool=pool)
+            except KeyboardInterrupt:
+                engine.cancel()
+                print("Cancelled, rerun the same command to resume")
+                return 130
+            name = f"{account}/{app_id}" if len(roots) > 1 else app_id
+            print(f"{name}: {stats['done']} done, {stats['skipped']} already done, {len(stats['failed'])} failed, "
+                  f"{stats['images_per_sec']:.1f} images/sec")
+            totals['done'] += stats['done']
+            totals['skipped'] += stats['skipped']
+            totals['failed'] += len(stats['failed'])
+
+    elapsed = time.perf_counter() - start
+    rate = totals['done'] / elapsed if elapsed > 0 else 0.0
+    print(f"Total: {totals['done']} done, {totals['skipped']} already done, {totals['failed']} failed "
+          f"in {elapsed:.1f}s across {len(games)} games with {jobs} processes, {rate:.1f} images/sec")
+    return 1 if totals['failed'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
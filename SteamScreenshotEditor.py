@@ -1,35 +1,62 @@
 import os
-from MainWindow import ScreenshotBrowser
-from Installer import Installer
-from configparser import ConfigParser
-import os
 import sys
-import urllib.request
-from functools import partial
+from configparser import ConfigParser
 
-from PySide2.QtCore import QSize, Qt
-from PySide2.QtCore import QThreadPool
-from PySide2.QtGui import QPixmap, QImage
-from PySide2.QtWidgets import QApplication, QWidget, QMainWindow, QPushButton, QGridLayout, QLabel, \
-    QScrollArea, QHBoxLayout, QProgressBar, QProgressDialog, QVBoxLayout, QSizePolicy
+from StartupProfile import StartupProfile
 
-from CustomWorkerThread import Worker
-from EditorWindow import EditorWindow
-from SteamAppAPI import SteamApp
+# Everything else is imported in the phases below. The editor's image libraries and the HTTP stack are imported
+# by the windows themselves the first time they are needed, so they don't hold up the first paint.
 
 if __name__ == "__main__":
+    # --startup-profile prints how long each phase of startup took, then quits once the first window painted
+    profiling = "--startup-profile" in sys.argv
+    if profiling:
+        sys.argv.remove("--startup-profile")
+    # --task-overlay shows the thread pools' queue depth and task latency in the corner of the browser
+    task_overlay = "--task-overlay" in sys.argv
+    if task_overlay:
+        sys.argv.remove("--task-overlay")
+    # --task-trace <file> writes every pooled task to file on exit, in Chrome's trace event format
+    task_trace_path = None
+    if "--task-trace" in sys.argv:
+        index = sys.argv.index("--task-trace")
+        task_trace_path = sys.argv[index + 1] if index + 1 < len(sys.argv) else "task_trace.json"
+        del sys.argv[index:index + 2]
+    profile = StartupProfile()
+
+    with profile.phase("import Qt"):
+        from PySide2.QtWidgets import QApplication
+    with profile.phase("create QApplication"):
+        app = QApplication(sys.argv)
 
     if os.path.exists('cache/steam_info.config'):
         parser = ConfigParser()
         parser.read('cache/steam_info.config')
         print(parser['INFO']['path'])
         steam_path = parser['INFO']['path']
-        app = QApplication(sys.argv)
-        main_window = ScreenshotBrowser(steam_path)
+        fetch_concurrency = parser['INFO'].getint('fetch_concurrency', fallback=None)
+        extra_roots = [x for x in parser['INFO'].get('extra_roots', '').split(os.pathsep) if x.strip()]
+        with profile.phase("import MainWindow"):
+            from MainWindow import ScreenshotBrowser
+        with profile.phase("create ScreenshotBrowser"):
+            main_window = ScreenshotBrowser(steam_path, fetch_concurrency=fetch_concurrency,
+                                            extra_roots=extra_roots)
+        window_class = ScreenshotBrowser
+        # Also when --startup-profile quits straight after the first paint, with the loading thread still busy
+        app.aboutToQuit.connect(main_window.shutdown)
+        if task_overlay:
+            from TaskOverlay import TaskOverlay
+            overlay = TaskOverlay(main_window)
     else:
-        app = QApplication(sys.argv)
-        installer = Installer()
+        with profile.phase("import Installer"):
+            from Installer import Installer
+        with profile.phase("create Installer"):
+            installer = Installer()
+        window_class = Installer
 
+    if profiling:
+        profile.watch_paint(app, window_class)
     app.exec_()
-
-
+    if task_trace_path is not None:
+        from TaskTrace import get_default_tracer
+        print(f"Wrote {get_default_tracer().export_chrome_trace(task_trace_path)} tasks to {task_trace_path}")
@@ -0,0 +1,47 @@
+from PySide2.QtCore import QEvent, Qt, QTimer
+from PySide2.QtWidgets import QLabel
+
+from TaskTrace import get_default_tracer
+
+REFRESH_MS = 250
+MARGIN = 8
+
+
+class TaskOverlay(QLabel):
+    """
+    A small read-out in the corner of a window with the thread pools' live queue depth and the p50/p95 queue wait,
+    run time and total latency of the latest tasks. It ignores the mouse, so the window works as usual under it.
+    """
+
+    def __init__(self, window, tracer=None):
+        super().__init__(window)
+        self.target = window
+        self.tracer = tracer if tracer is not None else get_default_tracer()
+        self.setAttribute(Qt.WA_TransparentForMouseEvents)
+        self.setStyleSheet('background-color: rgba(0, 0, 0, 180); color: #9f9; font-family: monospace; '
+                           'padding: 4px')
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+        self.timer.start(REFRESH_MS)
+        # Follows the window's corner as it resizes
+        window.installEventFilter(self)
+        self.refresh()
+        self.show()
+
+    def eventFilter(self, obj, event):
+        if obj is self.target and event.type() == QEvent.Resize:
+            self.move_to_corner()
+        return False
+
+    def move_to_corner(self):
+        self.adjustSize()
+        self.move(self.target.width() - self.width() - MARGIN, MARGIN)
+        self.raise_()
+
+    def refresh(self):
+        stats = self.tracer.stats()
+        self.setText(f"queued {stats['queued']}  running {stats['running']}  failed {stats['failed']}\n"
+                     f"wait    p50 {stats['wait_p50']:7.1f} ms  p95 {stats['wait_p95']:7.1f} ms\n"
+                     f"run     p50 {stats['run_p50']:7.1f} ms  p95 {stats['run_p95']:7.1f} ms\n"
+                     f"latency p50 {stats['latency_p50']:7.1f} ms  p95 {stats['latency_p95']:7.1f} ms")
+        self.move_to_corner()
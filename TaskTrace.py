@@ -0,0 +1,224 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+
+# Finished tasks kept for the trace export, the oldest are dropped first
+MAX_RECORDS = 20000
+# The overlay's percentiles cover this many of the latest tasks
+RECENT_TASKS = 500
+
+OUTCOME_OK = 'ok'
+OUTCOME_ERROR = 'error'
+OUTCOME_CANCELLED = 'cancelled'
+
+
+def payload_size(payload):
+    """
+    It estimates how many bytes a task handed back, without walking big structures
+
+    :param payload: A task's result
+    :return: The size in bytes, 0 for None and for anything it can't size cheaply
+    """
+    if payload is None:
+        return 0
+    if isinstance(payload, (bytes, bytearray, str)):
+        return len(payload)
+    # numpy arrays
+    if isinstance(getattr(payload, 'nbytes', None), int):
+        return payload.nbytes
+    # QImage
+    if hasattr(payload, 'sizeInBytes'):
+        return payload.sizeInBytes()
+    if isinstance(payload, (tuple, list)) and len(payload) <= 16:
+        # e.g. (generation, frame), one level deep only
+        return sum(payload_size(x) for x in payload if not isinstance(x, (tuple, list)))
+    return 0
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class TaskRecord:
+    """
+    One task's trip through a thread pool. Timestamps are time.perf_counter_ns(), 0 until reached.
+    """
+    __slots__ = ('name', 'category', 'enqueued', 'started', 'ended', 'thread_id', 'thread_name', 'outcome',
+                 'payload_bytes')
+
+    def __init__(self, name, category):
+        self.name = name
+        self.category = category
+        self.enqueued = time.perf_counter_ns()
+        self.started = 0
+        self.ended = 0
+        self.thread_id = 0
+        self.thread_name = ''
+        self.outcome = None
+        self.payload_bytes = 0
+
+    def wait_ms(self):
+        return ((self.started or self.ended) - self.enqueued) / 1e6
+
+    def run_ms(self):
+        return (self.ended - self.started) / 1e6 if self.started else 0.0
+
+
+class TaskTracer:
+    """
+    Records when every pooled task was queued, started and finished, on which thread, how it ended and how big
+    its result was.
+
+    It only takes timestamps and appends to bounded deques, so it is cheap enough to leave on. The records can be
+    exported in Chrome's trace event format (chrome://tracing, Perfetto) with export_chrome_trace(), and stats()
+    gives the live queue depth and latency percentiles for the overlay.
+    """
+
+    def __init__(self, max_records=MAX_RECORDS, enabled=True):
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.records = deque(maxlen=max_records)
+        self.recent = deque(maxlen=RECENT_TASKS)
+        self.queued = 0
+        self.running = 0
+        self.failed = 0
+        self.origin = time.perf_counter_ns()
+
+    def enqueue(self, name, category='worker'):
+        """
+        It records that a task was handed to a pool
+
+        :param name: What the task runs, e.g. the function's qualified name
+        :param category: Which pool or subsystem it belongs to, trace viewers can filter on it
+        :return: The TaskRecord to pass to start() and finish(), None while tracing is off
+        """
+        if not self.enabled:
+            return None
+        record = TaskRecord(name, category)
+        with self.lock:
+            self.queued += 1
+        return record
+
+    def start(self, record):
+        # Called on the pool thread that runs the task
+        if record is None:
+            return
+        record.started = time.perf_counter_ns()
+        thread = threading.current_thread()
+        record.thread_id = thread.ident
+        record.thread_name = thread.name
+        with self.lock:
+            self.queued -= 1
+            self.running += 1
+
+    def finish(self, record, outcome, payload=None):
+        """
+        It records that a task ended. A task cancelled before it started is finished without start()
+
+        :param record: The TaskRecord from enqueue()
+        :param outcome: OUTCOME_OK, OUTCOME_ERROR or OUTCOME_CANCELLED
+        :param payload: The task's result, only its size is kept
+        """
+        if record is None:
+            return
+        record.ended = time.perf_counter_ns()
+        record.outcome = outcome
+        record.payload_bytes = payload_size(payload)
+        with self.lock:
+            if record.started:
+                self.running -= 1
+            else:
+                self.queued -= 1
+            if outcome == OUTCOME_ERROR:
+                self.failed += 1
+            self.records.append(record)
+            if outcome != OUTCOME_CANCELLED:
+                self.recent.append(record)
+
+    def stats(self):
+        """
+        :return: A dict with the number of tasks queued, running and failed, and the p50/p95 queue wait, run time
+            and total latency in ms over the latest RECENT_TASKS tasks
+        """
+        with self.lock:
+            recent = list(self.recent)
+            stats = {'queued': self.queued, 'running': self.running, 'failed': self.failed, 'tasks': len(recent)}
+        waits = [x.wait_ms() for x in recent]
+        runs = [x.run_ms() for x in recent]
+        totals = [x.wait_ms() + x.run_ms() for x in recent]
+        for name, values in (('wait', waits), ('run', runs), ('latency', totals)):
+            stats[f'{name}_p50'] = percentile(values, 0.50)
+            stats[f'{name}_p95'] = percentile(values, 0.95)
+        return stats
+
+    def chrome_trace(self):
+        """
+        :return: The recorded tasks as a Chrome trace event dict. Each run is a complete event on its thread with
+            its wait, outcome and payload size in args, and the queue depth is a counter track
+        """
+        with self.lock:
+            records = list(self.records)
+        pid = os.getpid()
+        events = []
+        threads = {}
+        depth_changes = []
+        for record in records:
+            depth_changes.append((record.enqueued, 1))
+            depth_changes.append((record.started or record.ended, -1))
+            if not record.started:
+                # Cancelled while queued, it never ran on any thread
+                continue
+            threads[record.thread_id] = record.thread_name
+            events.append({
+                'name': record.name,
+                'cat': record.category,
+                'ph': 'X',
+                'ts': (record.started - self.origin) / 1000,
+                'dur': (record.ended - record.started) / 1000,
+                'pid': pid,
+                'tid': record.thread_id,
+                'args': {'wait_ms': round(record.wait_ms(), 3), 'outcome': record.outcome,
+                         'payload_bytes': record.payload_bytes},
+            })
+        for thread_id, thread_name in threads.items():
+            events.append({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': thread_id,
+                           'args': {'name': thread_name}})
+        depth = 0
+        for timestamp, change in sorted(depth_changes):
+            depth += change
+            events.append({'name': 'queue depth', 'ph': 'C', 'ts': (timestamp - self.origin) / 1000, 'pid': pid,
+                           'args': {'queued': depth}})
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def export_chrome_trace(self, path):
+        """
+        It writes the trace to path as JSON, load it in chrome://tracing or https://ui.perfetto.dev
+
+        :return: The number of tasks written
+        """
+        trace = self.chrome_trace()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as file:
+            json.dump(trace, file)
+        return sum(1 for x in trace['traceEvents'] if x['ph'] == 'X')
+
+
+_default_tracer = None
+_default_tracer_lock = threading.Lock()
+
+
+def get_default_tracer():
+    """
+    It returns the tracer shared by every pool in the app
+    """
+    global _default_tracer
+    with _default_tracer_lock:
+        if _default_tracer is None:
+            _default_tracer = TaskTracer()
+        return _default_tracer
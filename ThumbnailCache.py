@@ -0,0 +1,89 @@
+import hashlib
+import os
+import threading
+
+from PySide2.QtCore import QSize, Qt
+from PySide2.QtGui import QImage, QImageReader
+
+DEFAULT_THUMBNAIL_DIR = 'cache/thumbnails'
+THUMBNAIL_SIZE = QSize(500, 300)
+THUMBNAIL_QUALITY = 85
+
+
+class ThumbnailCache:
+    """
+    Scaled down copies of screenshots kept on disk, so a game's grid never decodes the full size originals twice.
+
+    Entries are keyed by the screenshot's path, size and mtime, so an edited or replaced screenshot gets a new
+    thumbnail. Everything here only touches QImage, which is safe to use from worker threads.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_THUMBNAIL_DIR, size=THUMBNAIL_SIZE):
+        self.cache_dir = cache_dir
+        self.size = size
+
+    def key(self, img_path):
+        stat = os.stat(img_path)
+        key = f"{os.path.abspath(img_path)}|{stat.st_size}|{stat.st_mtime_ns}|{self.size.width()}x{self.size.height()}"
+        return hashlib.sha1(key.encode()).hexdigest()
+
+    def cache_path(self, img_path):
+        key = self.key(img_path)
+        return os.path.join(self.cache_dir, key[:2], f"{key}.jpg")
+
+    @staticmethod
+    def steam_thumbnail_path(img_path):
+        """
+        Steam writes its own small copy of each screenshot to screenshots/thumbnails/<same name>
+        """
+        folder, name = os.path.split(img_path)
+        return os.path.join(folder, "thumbnails", name)
+
+    def lookup(self, img_path):
+        """
+        :return: The path of an existing thumbnail for img_path, or None if one has to be generated
+        """
+        steam_thumbnail = self.steam_thumbnail_path(img_path)
+        if os.path.isfile(steam_thumbnail):
+            return steam_thumbnail
+        cached = self.cache_path(img_path)
+        return cached if os.path.isfile(cached) else None
+
+    def load(self, img_path):
+        """
+        It returns the thumbnail for img_path as a QImage, generating and caching it first if needed
+
+        :param img_path: The path to the full size screenshot
+        :return: A QImage no bigger than the cache's size (null if the screenshot can't be read)
+        """
+        try:
+            existing = self.lookup(img_path)
+        except FileNotFoundError:
+            # Deleted since the grid was built, the library watcher removes its cell
+            return QImage()
+        if existing is not None:
+            image = QImage(existing)
+            if not image.isNull():
+                return image
+        return self.generate(img_path)
+
+    def generate(self, img_path):
+        reader = QImageReader(img_path)
+        source_size = reader.size()
+        if source_size.isValid():
+            # Lets the JPEG decoder skip most of the work instead of decoding at full size and shrinking afterwards
+            reader.setScaledSize(source_size.scaled(self.size, Qt.KeepAspectRatio))
+        image = reader.read()
+        if image.isNull():
+            print(f"Could not read {img_path}: {reader.errorString()}")
+            return image
+        if image.width() > self.size.width() or image.height() > self.size.height():
+            image = image.scaled(self.size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+
+        cached = self.cache_path(img_path)
+        os.makedirs(os.path.dirname(cached), exist_ok=True)
+        # Write to a temp file first so a crash never leaves a half written thumbnail behind
+        tmp_path = f"{cached}.{os.getpid()}.{threading.get_ident()}.tmp"
+        if image.save(tmp_path, "JPG", THUMBNAIL_QUALITY):
+            os.replace(tmp_path, cached)
+        return image
@@ -0,0 +1,367 @@
+import math
+import os
+
+from PySide2.QtCore import QRect, QRectF, Qt
+from PySide2.QtGui import QColor, QImageIOHandler, QImageReader, QPainter, QPixmap
+from PySide2.QtWidgets import QWidget
+
+from ImageLoader import ImageLoader, PRIORITY_PREFETCH, PRIORITY_VISIBLE
+from ScreenshotGrid import PixmapCache
+
+# Tiles are this many pixels square at every mip level
+TILE_SIZE = 256
+# Decoded tiles kept across all levels, whatever the resolution of the image
+DEFAULT_TILE_BUDGET = 64 * 1024 * 1024
+# One wheel notch zooms by this much
+ZOOM_STEP = 1.25
+MAX_ZOOM = 8.0
+# Tiles around the viewport decoded ahead of panning
+PREFETCH_TILES = 1
+BACKGROUND = QColor(32, 32, 32)
+
+
+def level_for_zoom(zoom, top_level):
+    """
+    It picks the mip level to draw at, the smallest one that still has at least one image pixel per screen pixel
+
+    :param zoom: Screen pixels per full resolution pixel
+    :param top_level: The coarsest level there is
+    :return: The level, 0 is full resolution and every level above it is half the size of the one below
+    """
+    if zoom >= 1:
+        return 0
+    return min(top_level, int(math.floor(math.log2(1 / zoom))))
+
+
+class TileSource:
+    """
+    The image file behind a TileView, seen as a pyramid of TILE_SIZE tiles. Level 0 is full resolution and each
+    level above it halves the size, up to a top level that fits in a single tile.
+
+    Nothing is decoded up front. read_tiles() decodes just the region a set of tiles covers, scaled down to their
+    level while decoding, so the full resolution image is never in memory at once. That relies on the format
+    supporting clipped reads (JPEG, what Steam saves screenshots as), for other formats Qt decodes the whole file
+    for every read and clips it afterwards.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        reader = QImageReader(path)
+        self.size = reader.size()
+        self.region_decoding = reader.supportsOption(QImageIOHandler.ClipRect)
+        self.top_level = 0
+        if self.size.isValid():
+            while max(self.level_size(self.top_level)) > TILE_SIZE:
+                self.top_level += 1
+
+    def is_valid(self):
+        return self.size.isValid() and not self.size.isEmpty()
+
+    def level_size(self, level):
+        scale = 1 << level
+        return -(-self.size.width() // scale), -(-self.size.height() // scale)
+
+    def tile_counts(self, level):
+        width, height = self.level_size(level)
+        return -(-width // TILE_SIZE), -(-height // TILE_SIZE)
+
+    def tile_rect(self, tile):
+        """
+        :param tile: A (level, column, row) tuple
+        :return: The QRect the tile covers in its level's pixels, edge tiles are cut short by the image
+        """
+        level, column, row = tile
+        width, height = self.level_size(level)
+        return QRect(column * TILE_SIZE, row * TILE_SIZE, TILE_SIZE, TILE_SIZE).intersected(QRect(0, 0, width, height))
+
+    def read_tiles(self, tiles):
+        """
+        It decodes the region covering tiles, all from the same level, in one read and cuts it into tiles. Runs on
+        a loader thread.
+
+        :param tiles: (level, column, row) tuples
+        :return: A dict of tile to QImage, empty if the file could not be read
+        """
+        level = tiles[0][0]
+        scale = 1 << level
+        region = QRect()
+        for tile in tiles:
+            region = region.united(self.tile_rect(tile))
+        source_rect = QRect(region.x() * scale, region.y() * scale, region.width() * scale, region.height() * scale)
+        source_rect = source_rect.intersected(QRect(0, 0, self.size.width(), self.size.height()))
+
+        reader = QImageReader(self.path)
+        reader.setClipRect(source_rect)
+        if level > 0:
+            # Lets the JPEG decoder skip most of the work instead of decoding at full size and shrinking afterwards
+            reader.setScaledSize(region.size())
+        image = reader.read()
+        if image.isNull():
+            print(f"Could not read {self.path}: {reader.errorString()}")
+            return {}
+        return {x: image.copy(self.tile_rect(x).translated(-region.topLeft())) for x in tiles}
+
+
+class TileView(QWidget):
+    """
+    A zoomable, pannable view of one image at up to full resolution. The wheel zooms around the cursor, dragging
+    pans and double clicking switches between fitting the window and 100%.
+
+    Only the tiles in (and just around) the viewport, at the level matching the zoom, are decoded, in the
+    background, and they are kept in a PixmapCache with a byte budget. Until a tile arrives it is drawn from the
+    closest coarser level already decoded, so zooming and panning never wait on the decoder and memory doesn't
+    grow with the image's resolution.
+    """
+
+    def __init__(self, img_path, tile_budget=DEFAULT_TILE_BUDGET, parent=None):
+        super().__init__(parent)
+        self.source = TileSource(img_path)
+        self.tiles = PixmapCache(tile_budget)
+        # The top level is a single small tile, kept outside the cache so there is always something to draw
+        self.overview = None
+        self.loader = ImageLoader(parent=self)
+        self.loader.loaded.connect(self.on_tiles_loaded)
+        # Loader key to the tiles it decodes, and every tile that is being decoded
+        self.requests = {}
+        self.pending_tiles = set()
+        self.next_request = 0
+
+        # Screen pixels per full resolution pixel, and the full resolution point at the widget's top left corner
+        self.zoom = 1.0
+        self.origin_x = 0.0
+        self.origin_y = 0.0
+        # Fitting the window follows the window as it is resized, until the user zooms
+        self.fitted = True
+        self.drag_start = None
+        self.drag_origin = None
+
+        self.setWindowTitle(os.path.basename(img_path))
+        self.setMinimumSize(320, 240)
+        if self.source.is_valid():
+            self.request([(self.source.top_level, 0, 0)], PRIORITY_VISIBLE)
+        else:
+            print(f"Could not read {img_path}")
+
+    # View
+
+    def fit_zoom(self):
+        if not self.source.is_valid():
+            return 1.0
+        return min(1.0, self.width() / self.source.size.width(), self.height() / self.source.size.height())
+
+    def fit(self):
+        self.fitted = True
+        self.zoom = self.fit_zoom()
+        self.view_changed()
+
+    def zoom_at(self, zoom, point):
+        """
+        It zooms keeping the image point under point where it is, e.g. under the cursor
+
+        :param zoom: The new zoom, clamped between fitting the window and MAX_ZOOM
+        :param point: A QPoint in the widget
+        """
+        zoom = max(self.fit_zoom(), min(MAX_ZOOM, zoom))
+        image_x = self.origin_x + point.x() / self.zoom
+        image_y = self.origin_y + point.y() / self.zoom
+        self.fitted = False
+        self.zoom = zoom
+        self.origin_x = image_x - point.x() / zoom
+        self.origin_y = image_y - point.y() / zoom
+        self.view_changed()
+
+    def clamp_origin(self):
+        # An image smaller than the window is centred, a bigger one can't be dragged past its edges
+        for axis, view, image in (('origin_x', self.width(), self.source.size.width()),
+                                  ('origin_y', self.height(), self.source.size.height())):
+            visible = view / self.zoom
+            if visible >= image:
+                setattr(self, axis, (image - visible) / 2)
+            else:
+                setattr(self, axis, max(0.0, min(image - visible, getattr(self, axis))))
+
+    def view_changed(self):
+        if not self.source.is_valid():
+            return
+        if self.fitted:
+            self.zoom = self.fit_zoom()
+        self.clamp_origin()
+        self.request_visible()
+        self.update()
+
+    def level(self):
+        return level_for_zoom(self.zoom, self.source.top_level)
+
+    def tiles_in_view(self, level, margin=0):
+        """
+        :param level: The mip level
+        :param margin: Extra tiles on every side
+        :return: The (level, column, row) tuples that cover the viewport at level
+        """
+        scale = 1 << level
+        columns, rows = self.source.tile_counts(level)
+        span = TILE_SIZE * scale
+        first_column = max(0, int(self.origin_x // span) - margin)
+        first_row = max(0, int(self.origin_y // span) - margin)
+        last_column = min(columns - 1, int((self.origin_x + self.width() / self.zoom) // span) + margin)
+        last_row = min(rows - 1, int((self.origin_y + self.height() / self.zoom) // span) + margin)
+        return [(level, column, row) for row in range(first_row, last_row + 1)
+                for column in range(first_column, last_column + 1)]
+
+    # Decoding
+
+    def is_loaded_or_pending(self, tile):
+        return tile in self.pending_tiles or tile in self.tiles.pixmaps
+
+    def request(self, tiles, priority):
+        key = self.next_request
+        self.next_request += 1
+        self.requests[key] = tiles
+        self.pending_tiles.update(tiles)
+        self.loader.request(key, lambda: self.source.read_tiles(tiles), priority)
+
+    def request_visible(self):
+        level = self.level()
+        visible = self.tiles_in_view(level)
+        nearby = self.tiles_in_view(level, PREFETCH_TILES)
+        wanted = set(nearby)
+
+        for key, tiles in list(self.requests.items()):
+            if tiles[0][0] == self.source.top_level:
+                continue
+            # Decodes for tiles that scrolled away or for another level are dropped. Ones still queued are folded
+            # into the requests below, so a drag doesn't leave a backlog of small reads behind it, and ones that
+            # already started carry on
+            if wanted.isdisjoint(tiles):
+                self.loader.cancel(key)
+            elif not self.loader.take(key):
+                continue
+            del self.requests[key]
+            self.pending_tiles.difference_update(tiles)
+
+        if level == self.source.top_level:
+            return
+        # The tiles on screen in one read, then the ring around them in another, behind them in the queue
+        for tiles, priority in ((visible, PRIORITY_VISIBLE), (nearby, PRIORITY_PREFETCH)):
+            missing = [x for x in tiles if not self.is_loaded_or_pending(x)]
+            if missing:
+                self.request(missing, priority)
+
+    def on_tiles_loaded(self, key, images):
+        tiles = self.requests.pop(key, None)
+        if tiles is None:
+            return
+        self.pending_tiles.difference_update(tiles)
+        if not images:
+            return
+        for tile, image in images.items():
+            if tile[0] == self.source.top_level:
+                self.overview = QPixmap.fromImage(image)
+            else:
+                self.tiles.put(tile, QPixmap.fromImage(image))
+        self.update()
+
+    def pending_count(self):
+        return len(self.requests)
+
+    def cancel_loading(self):
+        self.loader.cancel_all()
+        self.requests.clear()
+        self.pending_tiles.clear()
+
+    # Painting
+
+    def tile_target(self, tile):
+        # Edges are rounded the same way for neighbouring tiles, so there are no seams between them
+        scale = 1 << tile[0]
+        rect = self.source.tile_rect(tile)
+        left = round((rect.x() * scale - self.origin_x) * self.zoom)
+        top = round((rect.y() * scale - self.origin_y) * self.zoom)
+        right = round(((rect.x() + rect.width()) * scale - self.origin_x) * self.zoom)
+        bottom = round(((rect.y() + rect.height()) * scale - self.origin_y) * self.zoom)
+        return QRect(left, top, right - left, bottom - top)
+
+    def fallback(self, tile):
+        """
+        :return: The closest coarser pixmap already decoded that covers tile, and the QRectF of it that does,
+            or (None, None)
+        """
+        level, column, row = tile
+        rect = self.source.tile_rect(tile)
+        for coarser in range(level + 1, self.source.top_level + 1):
+            shift = coarser - level
+            parent = (coarser, column >> shift, row >> shift)
+            pixmap = self.overview if coarser == self.source.top_level else self.tiles.get(parent)
+            if pixmap is None:
+                continue
+            parent_rect = self.source.tile_rect(parent)
+            scale = 1 << shift
+            return pixmap, QRectF(rect.x() / scale - parent_rect.x(), rect.y() / scale - parent_rect.y(),
+                                  rect.width() / scale, rect.height() / scale)
+        return None, None
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), BACKGROUND)
+        if not self.source.is_valid():
+            return
+        level = self.level()
+        for tile in self.tiles_in_view(level):
+            target = self.tile_target(tile)
+            if not target.intersects(event.rect()):
+                continue
+            pixmap = self.overview if level == self.source.top_level else self.tiles.get(tile)
+            if pixmap is not None:
+                # Above 100% the pixels are shown as they are, that is what zooming in is for
+                painter.setRenderHint(QPainter.SmoothPixmapTransform, self.zoom < 1)
+                painter.drawPixmap(target, pixmap)
+                continue
+            pixmap, source_rect = self.fallback(tile)
+            if pixmap is not None:
+                painter.setRenderHint(QPainter.SmoothPixmapTransform, True)
+                painter.drawPixmap(QRectF(target), pixmap, source_rect)
+
+    # Events
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.view_changed()
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.view_changed()
+
+    def closeEvent(self, event):
+        self.cancel_loading()
+        self.tiles.clear()
+        super().closeEvent(event)
+
+    def wheelEvent(self, event):
+        steps = event.angleDelta().y() / 120
+        if steps:
+            self.zoom_at(self.zoom * ZOOM_STEP ** steps, event.pos())
+
+    def mousePressEvent(self, event):
+        if event.button() == Qt.LeftButton:
+            self.drag_start = event.pos()
+            self.drag_origin = (self.origin_x, self.origin_y)
+            self.setCursor(Qt.ClosedHandCursor)
+
+    def mouseMoveEvent(self, event):
+        if self.drag_start is None:
+            return
+        delta = event.pos() - self.drag_start
+        self.origin_x = self.drag_origin[0] - delta.x() / self.zoom
+        self.origin_y = self.drag_origin[1] - delta.y() / self.zoom
+        self.view_changed()
+
+    def mouseReleaseEvent(self, event):
+        if event.button() == Qt.LeftButton:
+            self.drag_start = None
+            self.unsetCursor()
+
+    def mouseDoubleClickEvent(self, event):
+        if self.fitted or self.zoom < 1:
+            self.zoom_at(1.0, event.pos())
+        else:
+            self.fit()
@@ -0,0 +1,160 @@
+"""
+Shared by the benchmark scripts: a local stub of the Steam store to run against offline, and the process's peak RSS.
+
+Nothing here imports the app's modules or OpenCV at the top, so a benchmark that times its own imports isn't skewed
+by importing this first.
+"""
+import hashlib
+import json
+import random
+import resource
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class ServerBucket:
+    """
+    The server side of a rate limit: rate requests per second with bursts of up to capacity. It never waits, a
+    request over the limit is refused.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def try_acquire(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+class StubStoreHandler(BaseHTTPRequestHandler):
+    """
+    Answers /api/appdetails for any app id and /header/<app_id>.jpg with the same header image for every app, with
+    an ETag and a 304 for If-None-Match. It is set up through start_stub_server and counts what it did in stats.
+    """
+    # HTTP/1.1 so the client can keep connections alive between requests
+    protocol_version = 'HTTP/1.1'
+    latency = 0.0
+    header_bytes = b''
+    # Whether appdetails points at a header image, without one only appdetails requests are made
+    with_headers = True
+    # Optional ServerBucket, appdetails requests over its rate get a 429 with Retry-After
+    bucket = None
+    # Share of appdetails requests that get a 503
+    error_rate = 0.0
+    # App ids the store reports as not available
+    delisted = set()
+    lock = threading.Lock()
+    stats = {'requests': 0, 'bytes_sent': 0, '429': 0, '503': 0}
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        self.count('requests')
+        url = urlparse(self.path)
+        if url.path == '/api/appdetails':
+            self.send_appdetails(parse_qs(url.query).get('appids', ['0'])[0])
+        elif url.path.startswith('/header/'):
+            etag = '"' + hashlib.sha1(self.header_bytes).hexdigest() + '"'
+            if self.headers.get('If-None-Match') == etag:
+                self.send_body(b'', status=304, headers={'ETag': etag})
+            else:
+                self.send_body(self.header_bytes, 'image/jpeg', headers={'ETag': etag})
+        else:
+            self.send_body(b'', status=404)
+
+    def send_appdetails(self, app_id):
+        if self.bucket is not None and not self.bucket.try_acquire():
+            self.count('429')
+            return self.send_body(b'Too Many Requests', status=429, headers={'Retry-After': '1'})
+        if self.error_rate and random.random() < self.error_rate:
+            self.count('503')
+            return self.send_body(b'<html>Service Unavailable</html>', 'text/html', status=503)
+
+        if app_id in self.delisted:
+            entry = {'success': False}
+        else:
+            header_image = f'http://{self.headers["Host"]}/header/{app_id}.jpg' if self.with_headers else ''
+            entry = {'success': True, 'data': {'name': f'Stub Game {app_id}', 'header_image': header_image,
+                                               'is_free': False, 'dlc': []}}
+        self.send_body(json.dumps({app_id: entry}).encode(), 'application/json')
+
+    def send_body(self, body, content_type='text/plain', status=200, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.count('bytes_sent', len(body))
+
+    def count(self, key, amount=1):
+        with self.lock:
+            StubStoreHandler.stats[key] += amount
+
+    @classmethod
+    def reset_stats(cls):
+        with cls.lock:
+            cls.stats = dict.fromkeys(cls.stats, 0)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_header_jpeg():
+    # A small gradient at the store's header size, a real JPEG so the browser can decode it
+    import cv2
+    import numpy as np
+
+    header = cv2.resize(np.arange(0, 256, 16, dtype=np.uint8).reshape(4, 4).repeat(3).reshape(4, 4, 3), (460, 215))
+    return cv2.imencode('.jpg', header)[1].tobytes()
+
+
+def start_stub_server(latency=0.0, header_bytes=None, with_headers=True, bucket=None, error_rate=0.0,
+                      delisted=()):
+    """
+    It starts the stub store on a free local port, served from a daemon thread
+
+    :param latency: Seconds every request waits before it is answered
+    :param header_bytes: The header image served for every app, a generated JPEG if None
+    :param with_headers: Whether appdetails points at a header image at all
+    :param bucket: Optional ServerBucket that rate limits appdetails
+    :param error_rate: Share of appdetails requests that get a 503
+    :param delisted: App ids the store reports as not available
+    :return: The ThreadingHTTPServer, its port is server.server_port
+    """
+    StubStoreHandler.latency = latency
+    StubStoreHandler.header_bytes = header_bytes if header_bytes is not None else make_header_jpeg()
+    StubStoreHandler.with_headers = with_headers
+    StubStoreHandler.bucket = bucket
+    StubStoreHandler.error_rate = error_rate
+    StubStoreHandler.delisted = set(delisted)
+    StubStoreHandler.reset_stats()
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubStoreHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def peak_rss_mb():
+    # VmHWM is this process's own peak, ru_maxrss also counts what the parent had when it started this one
+    try:
+        with open('/proc/self/status') as file:
+            for line in file:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
@@ -0,0 +1,319 @@
+"""
+End to end benchmark suite for the browser's hot paths, for catching regressions between runs.
+
+It generates a synthetic Steam library (userdata/<account>/760/remote/<app_id>/screenshots) at the given scale and
+starts a local stub of the store API that serves appdetails and header images, so it runs offline. Qt uses the
+offscreen platform, so it also runs on a headless box. It measures:
+  - cold startup: a fresh process with empty caches, until the first header is on screen and until every game
+    is loaded and the visible headers are decoded
+  - warm startup: the same again with every cache filled
+  - grid build: build_home_grid and build_game_grid on the largest game
+  - thumbnail throughput: generating thumbnails from the originals, then reading them back from the cache
+  - slider latency: from a brightness slider tick to its preview frame, through EditorWindow.update_changes
+  - export throughput: EditorWindow.on_export at full resolution, through the export queue
+  - peak RSS of the startup processes and of the suite itself
+
+Results are printed and written as JSON. Pass an earlier run's JSON with --compare to see what changed.
+
+Usage: python benchmarks/BenchmarkSuite.py --games 50 --screenshots 40 --width 1920 --height 1080 -o results.json
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from BenchmarkHelpers import StubStoreHandler, peak_rss_mb, start_stub_server
+
+# Nothing waits longer than this for the app to finish something
+WAIT_TIMEOUT = 300
+FIRST_APP_ID = 1000
+
+
+def write_library(userdata, accounts, games, screenshots, width, height):
+    """
+    It writes games screenshots folders spread over accounts, each with screenshots copies of one JPEG per game
+
+    :return: The number of screenshots written
+    """
+    import cv2
+    import numpy as np
+
+    rng = np.random.default_rng(0)
+    written = 0
+    for game in range(games):
+        # Smooth colour plus noise, about as hard to decode as a real screenshot
+        base = cv2.resize(rng.integers(0, 256, (height // 32 + 1, width // 32 + 1, 3), dtype=np.uint8),
+                          (width, height))
+        img = np.clip(base + rng.normal(0, 8, base.shape), 0, 255).astype(np.uint8)
+        data = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes()
+        account = str(100000 + game % accounts)
+        folder = os.path.join(userdata, account, '760', 'remote', str(FIRST_APP_ID + game), 'screenshots')
+        os.makedirs(folder, exist_ok=True)
+        for index in range(screenshots):
+            with open(os.path.join(folder, f"20220917{index:06d}_1.jpg"), 'wb') as file:
+                file.write(data)
+            written += 1
+    return written
+
+
+def use_stub_store(store_url):
+    # Every store request goes to the stub, which has no rate limit to respect
+    import SteamAppAPI
+    SteamAppAPI.STORE_API_URL = f'{store_url}/api/appdetails'
+    SteamAppAPI._default_scheduler = SteamAppAPI.RequestScheduler(rate=1e6, burst=1e6)
+
+
+def wait_until(app, condition, timeout=WAIT_TIMEOUT):
+    deadline = time.perf_counter() + timeout
+    while not condition():
+        if time.perf_counter() > deadline:
+            raise TimeoutError("The app took too long")
+        app.processEvents()
+        time.sleep(0.001)
+
+
+def visible_headers_decoded(window):
+    grid = window.grid_view
+    first, last, _ = grid.visible_rows()
+    return all(grid.pixmap_cache.get(grid.grid_model.item(row).key) is not None for row in range(first, last + 1))
+
+
+def first_header_decoded(window):
+    grid = window.grid_view
+    return any(grid.pixmap_cache.get(grid.grid_model.item(row).key) is not None
+               for row in range(grid.grid_model.rowCount()))
+
+
+def initial_load_done(window):
+    # The library watcher is created once every game's header is in
+    return window.library_watcher is not None
+
+
+def measure_startup(userdata, store_url):
+    """
+    Runs in its own process, so imports and caches start the way they do when the app is launched
+
+    :return: A dict of timings in seconds and the process's peak RSS
+    """
+    start = time.perf_counter()
+    from PySide2.QtWidgets import QApplication
+    app = QApplication.instance() or QApplication(sys.argv)
+    use_stub_store(store_url)
+    from MainWindow import ScreenshotBrowser
+    imported = time.perf_counter()
+    window = ScreenshotBrowser(userdata)
+    constructed = time.perf_counter()
+    wait_until(app, lambda: first_header_decoded(window))
+    first_header = time.perf_counter()
+    wait_until(app, lambda: initial_load_done(window) and visible_headers_decoded(window))
+    headers_shown = time.perf_counter()
+    return {
+        'import_s': imported - start,
+        'construct_s': constructed - imported,
+        'first_header_s': first_header - start,
+        'headers_shown_s': headers_shown - start,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def run_startup_process(work_dir, userdata, store_url):
+    StubStoreHandler.reset_stats()
+    output = subprocess.run([sys.executable, os.path.abspath(__file__), '--startup-child', userdata, store_url],
+                            cwd=work_dir, capture_output=True, text=True, timeout=WAIT_TIMEOUT)
+    if output.returncode != 0:
+        raise RuntimeError(f"The startup process failed:\n{output.stderr[-2000:]}")
+    # The app prints as it goes, the result is the last line
+    result = json.loads(output.stdout.strip().splitlines()[-1])
+    result['store_requests'] = StubStoreHandler.stats['requests']
+    return result
+
+
+def time_median(function, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def measure_grids(app, window, repeats):
+    largest = max(window.library.app_ids(), key=window.library.count)
+    home = time_median(lambda: (window.build_home_grid(), app.processEvents()), repeats)
+    game = time_median(lambda: (window.build_game_grid(largest), app.processEvents()), repeats)
+    window.build_home_grid()
+    return {'home_grid_ms': home * 1000, 'game_grid_ms': game * 1000, 'games': len(window.titles),
+            'largest_game_screenshots': window.library.count(largest)}
+
+
+def measure_thumbnails(paths, cache_dir):
+    from ThumbnailCache import ThumbnailCache
+    cache = ThumbnailCache(cache_dir=cache_dir)
+    result = {'images': len(paths)}
+    for label in ('generate', 'cached'):
+        start = time.perf_counter()
+        for path in paths:
+            cache.load(path)
+        result[f'{label}_images_per_s'] = len(paths) / (time.perf_counter() - start)
+    return result
+
+
+def measure_slider(app, img_path, ticks):
+    from EditorWindow import EditorWindow
+    editor = EditorWindow(img_path, FIRST_APP_ID)
+    frames = []
+    editor.preview_renderer.rendered.connect(frames.append)
+    timings = []
+    for tick in range(ticks):
+        shown = len(frames)
+        start = time.perf_counter()
+        # Goes through on_brightness_changed -> update_changes -> the preview renderer, as a real tick does
+        editor.bright_slider.setValue((editor.bright_slider.value() + 1) % 50)
+        wait_until(app, lambda: len(frames) > shown)
+        timings.append((time.perf_counter() - start) * 1000)
+    editor.close()
+    return {'ticks': ticks, 'median_ms': statistics.median(timings), 'max_ms': max(timings),
+            'width': editor.original_cv_img.shape[1], 'height': editor.original_cv_img.shape[0]}
+
+
+def measure_export(app, paths):
+    from EditorWindow import EditorWindow
+    editor = EditorWindow(paths[0], FIRST_APP_ID)
+    editor.bright_slider.setValue(35)
+    exported = []
+    editor.export_queue.exported.connect(exported.append)
+    start = time.perf_counter()
+    for path in paths:
+        editor.on_export(path)
+    wait_until(app, lambda: editor.export_queue.pending == 0)
+    elapsed = time.perf_counter() - start
+    editor.close()
+    return {'images': len(exported), 'images_per_s': len(exported) / elapsed,
+            'format': editor.current_export_options().format}
+
+
+def flatten(results, prefix=''):
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f'{prefix}{key}.'))
+        elif isinstance(value, (int, float)):
+            flat[f'{prefix}{key}'] = value
+    return flat
+
+
+def compare(old_results, new_results):
+    old, new = flatten(old_results), flatten(new_results)
+    print(f"\n{'metric':<42} {'before':>12} {'after':>12} {'change':>8}")
+    for key, value in new.items():
+        if key in old and old[key]:
+            print(f"{key:<42} {old[key]:12.2f} {value:12.2f} {(value - old[key]) / old[key] * 100:+7.1f}%")
+
+
+def main():
+    if len(sys.argv) == 4 and sys.argv[1] == '--startup-child':
+        print(json.dumps(measure_startup(sys.argv[2], sys.argv[3])))
+        os._exit(0)
+
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--accounts', type=int, default=1)
+    arg_parser.add_argument('--games', type=int, default=50)
+    arg_parser.add_argument('--screenshots', type=int, default=40, help="Screenshots per game")
+    arg_parser.add_argument('--width', type=int, default=1920)
+    arg_parser.add_argument('--height', type=int, default=1080)
+    arg_parser.add_argument('--latency', type=float, default=0.02, help="Seconds the stub store takes per request")
+    arg_parser.add_argument('--thumbnails', type=int, default=100, help="Screenshots to thumbnail")
+    arg_parser.add_argument('--ticks', type=int, default=30, help="Slider ticks to time")
+    arg_parser.add_argument('--exports', type=int, default=20)
+    arg_parser.add_argument('--repeats', type=int, default=5, help="Runs of each grid build, the median is kept")
+    arg_parser.add_argument('-o', '--output', default='benchmark_results.json')
+    arg_parser.add_argument('--compare', help="An earlier run's JSON to compare with")
+    arg_parser.add_argument('--keep', action='store_true', help="Keep the generated library")
+    args = arg_parser.parse_args()
+    output_path = os.path.abspath(args.output)
+
+    work_dir = tempfile.mkdtemp(prefix='sse_suite_')
+    server = None
+    start_dir = os.getcwd()
+    try:
+        userdata = os.path.join(work_dir, 'userdata')
+        start = time.perf_counter()
+        count = write_library(userdata, args.accounts, args.games, args.screenshots, args.width, args.height)
+        print(f"{count} screenshots in {args.games} games, {args.accounts} accounts, {args.width}x{args.height} "
+              f"({time.perf_counter() - start:.1f}s to generate)")
+        server = start_stub_server(args.latency)
+        store_url = f'http://127.0.0.1:{server.server_port}'
+
+        results = {}
+        results['cold_startup'] = run_startup_process(work_dir, userdata, store_url)
+        print(f"cold startup       {results['cold_startup']['headers_shown_s']:8.2f} s  first header "
+              f"{results['cold_startup']['first_header_s']:.2f} s  {results['cold_startup']['store_requests']} "
+              f"store requests")
+        results['warm_startup'] = run_startup_process(work_dir, userdata, store_url)
+        print(f"warm startup       {results['warm_startup']['headers_shown_s']:8.2f} s  first header "
+              f"{results['warm_startup']['first_header_s']:.2f} s  {results['warm_startup']['store_requests']} "
+              f"store requests")
+
+        # Everything else runs in this process, against the caches the startups filled
+        os.chdir(work_dir)
+        from PySide2.QtWidgets import QApplication
+        app = QApplication.instance() or QApplication(sys.argv)
+        use_stub_store(store_url)
+        from MainWindow import ScreenshotBrowser
+        window = ScreenshotBrowser(userdata)
+        wait_until(app, lambda: initial_load_done(window))
+        results['grid_build'] = measure_grids(app, window, args.repeats)
+        print(f"home grid          {results['grid_build']['home_grid_ms']:8.2f} ms")
+        print(f"game grid          {results['grid_build']['game_grid_ms']:8.2f} ms")
+
+        paths = [path for app_id in window.library.app_ids() for path in window.library.screenshot_paths(app_id)]
+        results['thumbnails'] = measure_thumbnails(paths[:args.thumbnails], os.path.join(work_dir, 'bench_thumbs'))
+        print(f"thumbnails         {results['thumbnails']['generate_images_per_s']:8.1f} images/s generated, "
+              f"{results['thumbnails']['cached_images_per_s']:.1f} images/s cached")
+        results['slider'] = measure_slider(app, paths[0], args.ticks)
+        print(f"slider tick        {results['slider']['median_ms']:8.2f} ms median, "
+              f"{results['slider']['max_ms']:.2f} ms max")
+        results['export'] = measure_export(app, paths[:args.exports])
+        print(f"export             {results['export']['images_per_s']:8.1f} images/s "
+              f"({results['export']['format']})")
+        window.threadpool.globalInstance().waitForDone()
+        results['suite_peak_rss_mb'] = peak_rss_mb()
+        print(f"peak RSS           {results['cold_startup']['peak_rss_mb']:8.1f} MB cold startup, "
+              f"{results['suite_peak_rss_mb']:.1f} MB suite")
+
+        report = {
+            'config': vars(args),
+            'environment': {'python': platform.python_version(), 'platform': platform.platform(),
+                            'cpus': os.cpu_count(), 'time': time.strftime('%Y-%m-%dT%H:%M:%S')},
+            'results': results,
+        }
+        with open(output_path, 'w') as file:
+            json.dump(report, file, indent=2)
+        print(f"Results written to {output_path}")
+        if args.compare:
+            with open(os.path.join(start_dir, args.compare)) as file:
+                compare(json.load(file)['results'], results)
+    finally:
+        os.chdir(start_dir)
+        if server is not None:
+            server.shutdown()
+        if args.keep:
+            print(f"Library kept in {work_dir}")
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    # Qt's thread pools may still hold finished workers, don't let their teardown fail the run
+    sys.stdout.flush()
+    os._exit(0)
+
+
+if __name__ == "__main__":
+    main()
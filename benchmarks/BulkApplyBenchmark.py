@@ -0,0 +1,66 @@
+"""
+Measures bulk apply throughput (images/sec) for different process counts.
+
+It writes a folder of synthetic screenshots, then runs BatchEngine over it with 1, 2, 4, ... processes up to the
+core count, each time into an empty output folder. A final run into the last output folder shows resuming: every
+file is already in the manifest, so nothing is processed again.
+
+Usage: python benchmarks/BulkApplyBenchmark.py --images 500 --width 1920 --height 1080
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+import numpy as np
+
+from BatchEngine import BatchEngine, list_screenshots
+from ImagePipeline import Tone
+
+
+def write_screenshots(folder, count, width, height):
+    rng = np.random.default_rng(0)
+    base = cv2.resize(rng.integers(0, 256, (height // 16, width // 16, 3), dtype=np.uint8), (width, height))
+    for index in range(count):
+        cv2.imwrite(os.path.join(folder, f"20220917{index:06d}_1.jpg"), np.roll(base, index, axis=1))
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--images', type=int, default=500)
+    arg_parser.add_argument('--width', type=int, default=1920)
+    arg_parser.add_argument('--height', type=int, default=1080)
+    args = arg_parser.parse_args()
+
+    settings = {"filter": "Sepia", "tone": Tone(brightness=10, contrast=10)}
+    cores = os.cpu_count() or 1
+    worker_counts = sorted({1, cores} | {2 ** x for x in range(1, 8) if 2 ** x < cores})
+
+    work_dir = tempfile.mkdtemp(prefix='sse_bulk_bench_')
+    try:
+        source = os.path.join(work_dir, 'screenshots')
+        os.mkdir(source)
+        write_screenshots(source, args.images, args.width, args.height)
+        paths = list_screenshots(source)
+
+        print(f"{args.images} images at {args.width}x{args.height}, {cores} cores")
+        single = None
+        for workers in worker_counts:
+            output_dir = os.path.join(work_dir, f'out_{workers}')
+            stats = BatchEngine(settings, output_dir, workers=workers).run(paths)
+            single = single or stats['images_per_sec']
+            print(f"j={workers:<3} {stats['images_per_sec']:7.1f} images/sec  "
+                  f"x{stats['images_per_sec'] / single:.2f}  ({stats['elapsed']:.1f}s)")
+
+        stats = BatchEngine(settings, output_dir, workers=worker_counts[-1]).run(paths)
+        print(f"resume: {stats['done']} processed, {stats['skipped']} skipped from the manifest")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Benchmark for the similar shots finder.
+
+It writes synthetic 1080p screenshots to a temp dir and times hashing them (decode at 1/8 size, batched hashes).
+It then times grouping a large set of synthetic hashes, made of bursts of near identical shots among unrelated ones,
+and checks the groups against comparing every pair on a smaller set.
+
+Usage: python benchmarks/DuplicateFinderBenchmark.py --images 200 --hashes 50000
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from DuplicateFinder import DEFAULT_MAX_DISTANCE, compute_hashes, group_similar, hamming
+
+
+def synthetic_hashes(count, burst_size, rng):
+    # A third of the shots are bursts, every shot in a burst is a few bits off the first one
+    bursts = count // 3 // burst_size
+    hashes = rng.integers(0, 1 << 63, count, dtype=np.uint64) * np.uint64(2) + rng.integers(0, 2, count,
+                                                                                            dtype=np.uint64)
+    for burst in range(bursts):
+        start = burst * burst_size
+        for x in range(start + 1, start + burst_size):
+            flips = rng.choice(64, rng.integers(0, 4), replace=False)
+            hashes[x] = hashes[start] ^ np.uint64(sum(1 << int(bit) for bit in flips))
+    return hashes
+
+
+def brute_force_groups(hashes, max_distance):
+    # Every pair compared, then merged, the slow way
+    labels = list(range(len(hashes)))
+
+    def find(x):
+        while labels[x] != x:
+            x = labels[x]
+        return x
+
+    for x in range(len(hashes)):
+        for y in np.flatnonzero(hamming(hashes[x], hashes[x + 1:]) <= max_distance):
+            labels[find(x + 1 + int(y))] = find(x)
+    groups = {}
+    for x in range(len(hashes)):
+        groups.setdefault(find(x), []).append(x)
+    return sorted(sorted(x) for x in groups.values() if len(x) > 1)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--images', type=int, default=200)
+    arg_parser.add_argument('--hashes', type=int, default=50000)
+    arg_parser.add_argument('--check', type=int, default=3000, help="Hashes to check against comparing every pair")
+    arg_parser.add_argument('--max-distance', type=int, default=DEFAULT_MAX_DISTANCE)
+    args = arg_parser.parse_args()
+    rng = np.random.default_rng(0)
+
+    work_dir = tempfile.mkdtemp(prefix='sse_dup_bench_')
+    try:
+        paths = []
+        for x in range(args.images):
+            path = os.path.join(work_dir, f'{x}.jpg')
+            img = cv2.resize(rng.integers(0, 255, (54, 96, 3), dtype=np.uint8), (1920, 1080))
+            cv2.imwrite(path, img)
+            paths.append(path)
+        start = time.perf_counter()
+        hashes = compute_hashes(paths)
+        elapsed = time.perf_counter() - start
+        print(f"hash {len(hashes)} 1080p images   {elapsed:7.2f}s  {len(hashes) / elapsed:8.0f} images/s")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    hashes = synthetic_hashes(args.hashes, 5, rng)
+    start = time.perf_counter()
+    groups = group_similar(hashes, args.max_distance)
+    elapsed = time.perf_counter() - start
+    print(f"group {args.hashes} hashes         {elapsed:7.2f}s  {len(groups)} groups")
+
+    check = hashes[:args.check]
+    start = time.perf_counter()
+    expected = brute_force_groups(check, args.max_distance)
+    brute_elapsed = time.perf_counter() - start
+    start = time.perf_counter()
+    found = sorted(sorted(x) for x in group_similar(check, args.max_distance))
+    elapsed = time.perf_counter() - start
+    print(f"check {args.check} hashes          {elapsed:7.2f}s vs {brute_elapsed:.2f}s every pair, "
+          f"{'same groups' if found == expected else 'DIFFERENT GROUPS'}")
+
+
+if __name__ == "__main__":
+    main()
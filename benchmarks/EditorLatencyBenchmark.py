@@ -0,0 +1,77 @@
+"""
+Measures how long one slider tick takes in the editor.
+
+It writes a synthetic screenshot of the given size, opens it in an EditorWindow on the offscreen Qt platform and
+times a preview render (which only touches the display sized proxy and reuses the cached filter output when only
+brightness moves) against running the same edits on the full resolution image and shrinking the result afterwards,
+which is what every tick used to cost.
+
+Usage: python benchmarks/EditorLatencyBenchmark.py --width 3840 --height 2160 --ticks 20
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+import cv2
+import numpy as np
+from PySide2.QtWidgets import QApplication
+
+from EditorWindow import EditorWindow, PREVIEW_HEIGHT, PREVIEW_WIDTH
+from ImagePipeline import make_proxy
+
+
+def write_screenshot(path, width, height):
+    # Smooth gradients plus noise, so the JPEG is about as hard to decode as a real screenshot
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    img = np.dstack([(x + y) / 2, np.broadcast_to(x, (height, width)), np.broadcast_to(y, (height, width))])
+    img += np.random.default_rng(0).normal(0, 12, img.shape).astype(np.float32)
+    cv2.imwrite(path, np.clip(img, 0, 255).astype(np.uint8))
+
+
+def time_ticks(function, editor, ticks):
+    timings = []
+    for tick in range(ticks):
+        # Brightness is the slider that moves, the filter stays put
+        editor.brightness_lvl = tick % 50 - 25
+        editor.pipeline.set("tone", editor.current_tone())
+        start = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--width', type=int, default=3840)
+    arg_parser.add_argument('--height', type=int, default=2160)
+    arg_parser.add_argument('--ticks', type=int, default=20)
+    args = arg_parser.parse_args()
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    with tempfile.TemporaryDirectory(prefix='sse_editor_bench_') as work_dir:
+        img_path = os.path.join(work_dir, '20220917154717_1.jpg')
+        write_screenshot(img_path, args.width, args.height)
+        editor = EditorWindow(img_path, 0)
+        # The editor shows (and lays out) before any tick is timed
+        app.processEvents()
+
+        print(f"{args.width}x{args.height}, preview {editor.proxy_cv_img.shape[1]}x{editor.proxy_cv_img.shape[0]}, "
+              f"median of {args.ticks} ticks")
+        for name in editor.filters:
+            editor.pipeline.set("filter", name)
+            full = time_ticks(lambda: make_proxy(editor.apply_changes(editor.original_cv_img), PREVIEW_WIDTH,
+                                                 PREVIEW_HEIGHT), editor, args.ticks)
+            proxy = time_ticks(editor.render_preview, editor, args.ticks)
+            print(f"{name:<10} full resolution {full:8.2f} ms   proxy {proxy:6.2f} ms   x{full / proxy:.0f}")
+        editor.close()
+
+
+if __name__ == "__main__":
+    main()
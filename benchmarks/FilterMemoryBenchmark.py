@@ -0,0 +1,100 @@
+"""
+Checks the peak memory each registered filter needs on a 7680x4320 image.
+
+Every filter runs in its own subprocess, so one filter's peak doesn't hide another's. The child allocates the
+source image and an output buffer first, then reads the process' peak RSS before and after one filter call. The
+difference is the transient memory the filter needed, reported as a multiple of the image size. The old float64
+sepia path is measured the same way for comparison.
+
+The script exits non-zero if any registered filter (or the full filter + tone pipeline) needs more than
+--limit times the image size on top of its input and output.
+
+Usage: python benchmarks/FilterMemoryBenchmark.py --width 7680 --height 4320 --limit 1.0
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+
+def peak_rss_bytes():
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def legacy_sepia(img, out=None):
+    # The editor's original float64 sepia path
+    import cv2
+    kernel = np.matrix([[0.393, 0.769, 0.189], [0.349, 0.686, 0.168], [0.272, 0.534, 0.131]])
+    rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+    rgb = np.array(rgb, dtype=np.float64)
+    rgb = cv2.transform(rgb, kernel)
+    rgb[np.where(rgb > 255)] = 255
+    rgb = np.array(rgb, dtype=np.uint8)
+    return cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR)
+
+
+def measure_child(name, width, height):
+    from ImagePipeline import FILTERS, EditPipeline, Stage, Tone, apply_filter, apply_tone
+
+    img = np.random.default_rng(0).integers(0, 256, (height, width, 3), dtype=np.uint8)
+    out = np.empty_like(img)
+    out.fill(0)
+    if name == "pipeline":
+        pipeline = EditPipeline([Stage("filter", apply_filter, "Sepia"),
+                                 Stage("tone", apply_tone, Tone(brightness=10, contrast=10))])
+        # The first render allocates the stage buffers, later renders (what a slider tick costs) reuse them
+        pipeline.render(img)
+        pipeline.set("tone", Tone(brightness=20))
+        pipeline.set("filter", "Sharpen")
+        run = lambda: pipeline.render(img)
+    elif name == "legacy Sepia":
+        run = lambda: legacy_sepia(img)
+    else:
+        run = lambda: FILTERS[name].function(img, out)
+
+    before = peak_rss_bytes()
+    run()
+    print(json.dumps({'extra': peak_rss_bytes() - before}))
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--width', type=int, default=7680)
+    arg_parser.add_argument('--height', type=int, default=4320)
+    arg_parser.add_argument('--limit', type=float, default=1.0,
+                            help='Allowed transient memory, as a multiple of the image size')
+    arg_parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = arg_parser.parse_args()
+
+    if args.child:
+        return measure_child(args.child, args.width, args.height)
+
+    from ImagePipeline import FILTERS
+
+    image_bytes = args.width * args.height * 3
+    print(f"{args.width}x{args.height}, image size {image_bytes / 2 ** 20:.0f} MiB, limit x{args.limit}")
+    failed = []
+    for name in list(FILTERS) + ["pipeline", "legacy Sepia"]:
+        output = subprocess.run([sys.executable, __file__, '--child', name, '--width', str(args.width),
+                                 '--height', str(args.height)], capture_output=True, text=True, check=True).stdout
+        ratio = json.loads(output.strip().splitlines()[-1])['extra'] / image_bytes
+        checked = name != "legacy Sepia"
+        status = ("ok" if ratio <= args.limit else "OVER") if checked else "reference"
+        if checked and ratio > args.limit:
+            failed.append(name)
+        print(f"{name:<14} x{ratio:5.2f}  {status}")
+
+    if failed:
+        print(f"Over the limit: {', '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
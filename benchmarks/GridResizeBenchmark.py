@@ -0,0 +1,109 @@
+"""
+Measures how long each frame of a window edge drag takes on a large grid.
+
+It fills a ScreenshotGrid on the offscreen Qt platform with items whose thumbnails are already decoded, then
+resizes it step by step the way dragging the window edge does and repaints after every step. It is run:
+  - the old way, the view laying every item out again on every resize event (QListView.Adjust) and every cell's
+    pixmap scaled as it is painted
+  - the new way, the grid laying itself out once after the burst (its relayout timer) and cells painted from the
+    scaled pixmap cache
+and reports the mean and worst frame and the cell size layout passes for each.
+
+Usage: python benchmarks/GridResizeBenchmark.py --items 1000 --steps 60
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PySide2.QtCore import QSize
+from PySide2.QtGui import QColor, QImage, QPixmap
+from PySide2.QtWidgets import QApplication, QListView
+
+from ScreenshotGrid import GridItem, PixmapCache, ScaledPixmapCache, ScreenshotGrid
+
+THUMBNAIL_SIZE = QSize(500, 281)
+PALETTE_SIZE = 16
+
+
+def cell_size_for(width, height):
+    # The same arithmetic as ScreenshotBrowser.update_cell_size
+    size = QSize(width, height) - QSize(4, 4)
+    size /= 4.5
+    return size - QSize(8, 8)
+
+
+def make_grid(items):
+    pixmap_cache = PixmapCache(budget_bytes=1 << 40)
+    grid = ScreenshotGrid(load_func=lambda item: QImage(), pixmap_cache=pixmap_cache)
+    grid.set_items([GridItem(key=str(x), image_path='', payload=x) for x in range(items)])
+    # A few distinct thumbnails, implicitly shared between the items, so 10000 of them fit in memory
+    palette = []
+    for x in range(PALETTE_SIZE):
+        image = QImage(THUMBNAIL_SIZE, QImage.Format_RGB32)
+        image.fill(QColor.fromHsv(x * 37 % 360, 160, 200))
+        palette.append(QPixmap.fromImage(image))
+    for x in range(items):
+        pixmap_cache.put(str(x), palette[x % PALETTE_SIZE])
+    return grid
+
+
+def drag(app, grid, steps, debounced):
+    timings = []
+    layouts = 0
+    width, height = 1280, 720
+    grid.resize(width, height)
+    grid.set_cell_size(cell_size_for(width, height))
+    grid.show()
+    grid.relayout()
+    app.processEvents()
+    for step in range(steps):
+        # Out and back in, like dragging the edge
+        width = 1280 - 8 * (step if step < steps // 2 else steps - step)
+        start = time.perf_counter()
+        grid.resize(width, height)
+        grid.set_cell_size(cell_size_for(width, height))
+        if not debounced:
+            grid.relayout()
+            layouts += 1
+        grid.viewport().repaint()
+        app.processEvents()
+        timings.append((time.perf_counter() - start) * 1000)
+    if debounced:
+        # The relayout timer firing once the drag stopped
+        start = time.perf_counter()
+        grid.relayout()
+        layouts += 1
+        grid.viewport().repaint()
+        timings.append((time.perf_counter() - start) * 1000)
+    grid.hide()
+    return timings, layouts
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--items', type=int, default=1000)
+    arg_parser.add_argument('--steps', type=int, default=60)
+    args = arg_parser.parse_args()
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    print(f"{args.items} items, {args.steps} resize steps")
+    for label, debounced, scaled in (("every event, scale on paint", False, False),
+                                     ("debounced, scaled cache", True, True)):
+        grid = make_grid(args.items)
+        grid.scaled_cache = ScaledPixmapCache() if scaled else None
+        if not debounced:
+            grid.setResizeMode(QListView.Adjust)
+        # Once over, so both runs start with the visible cells laid out and painted
+        drag(app, grid, 2, debounced)
+        timings, layouts = drag(app, grid, args.steps, debounced)
+        print(f"{label:<30} mean {statistics.mean(timings):6.2f} ms  worst {max(timings):6.2f} ms  "
+              f"{layouts} layouts")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Benchmark for the header image cache.
+
+It starts a local stub CDN that serves a header image per app after a fixed delay, with an ETag, and answers
+If-None-Match with 304. It then fetches every header:
+  - serially with urllib.request.urlretrieve, the old startup path
+  - through load_games (the path the browser uses, with the metadata already cached) from an empty cache
+  - again straight after, when every header is fresh and nothing is requested
+  - again once the headers are past their ttl, when every header is revalidated with a 304
+and reports the time, the requests made and the bytes the server sent for each.
+
+Usage: python benchmarks/HeaderCacheBenchmark.py --apps 100 --latency 0.05 --concurrency 8
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from BenchmarkHelpers import StubStoreHandler, start_stub_server
+from GameLoader import load_games
+from HeaderCache import HEADER_TTL, HeaderCache
+from MetadataStore import MetadataStore
+
+HEADER_BYTES = 60 * 1024
+
+
+def measure(label, function):
+    StubStoreHandler.reset_stats()
+    start = time.perf_counter()
+    function()
+    elapsed = time.perf_counter() - start
+    stats = StubStoreHandler.stats
+    print(f"{label:<28} {elapsed:7.2f}s  {stats['requests']:5d} requests  {stats['bytes_sent'] / 1024:9.0f} KB sent")
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--apps', type=int, default=100)
+    arg_parser.add_argument('--latency', type=float, default=0.05)
+    arg_parser.add_argument('--concurrency', type=int, default=8)
+    args = arg_parser.parse_args()
+
+    # The same header for every app, about the size of a real one
+    server = start_stub_server(latency=args.latency, header_bytes=b'\x5a' * HEADER_BYTES)
+    base = f'http://127.0.0.1:{server.server_port}'
+    urls = {str(x): f'{base}/header/{x}.jpg' for x in range(1000, 1000 + args.apps)}
+
+    work_dir = tempfile.mkdtemp(prefix='sse_header_bench_')
+    try:
+        def serial():
+            folder = os.path.join(work_dir, 'serial')
+            os.makedirs(folder)
+            for app_id, url in urls.items():
+                urllib.request.urlretrieve(url, os.path.join(folder, f'{app_id}.jpg'))
+
+        store = MetadataStore(os.path.join(work_dir, 'metadata.db'))
+        # Only the headers are measured, the games' metadata is already in the store
+        for app_id, url in urls.items():
+            store.put(app_id, {'name': f'Stub Game {app_id}', 'header_image': url, 'is_free': False, 'dlc': []})
+        cache = HeaderCache(os.path.join(work_dir, 'headers'), store=store)
+
+        def fetch():
+            load_games(list(urls), header_cache=cache, max_workers=args.concurrency, store=store)
+
+        print(f"{args.apps} headers, {args.latency * 1000:.0f} ms latency, {args.concurrency} connections")
+        measure("serial urlretrieve", serial)
+        measure("cold cache", fetch)
+        measure("warm cache", fetch)
+
+        # Pretend a week went by, so every header is revalidated
+        get = cache.get
+        cache.get = lambda app_id, url, session=None: get(app_id, url, session, now=time.time() + HEADER_TTL + 1)
+        cache.revalidated = 0
+        cache.downloaded = 0
+        measure("stale cache (revalidate)", fetch)
+        print(f"revalidated {cache.revalidated}, downloaded {cache.downloaded}")
+        store.close()
+    finally:
+        server.shutdown()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
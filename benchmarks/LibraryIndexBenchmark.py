@@ -0,0 +1,84 @@
+"""
+Measures how long indexing a large screenshot library takes: the first scan, a relaunch with nothing changed, and a
+relaunch after a screenshot was added to one game. It compares them with listing every folder the way the browser
+used to.
+
+Every screenshot is a copy of one small JPEG, so what is measured is directory walking and header reading, not
+image size.
+
+Usage: python benchmarks/LibraryIndexBenchmark.py --games 200 --screenshots 250
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+import numpy as np
+
+from LibraryIndex import LibraryIndex
+
+
+def write_library(root, games, screenshots):
+    ok, encoded = cv2.imencode('.jpg', np.zeros((108, 192, 3), np.uint8))
+    data = encoded.tobytes()
+    for game in range(games):
+        folder = os.path.join(root, str(1000 + game), 'screenshots')
+        os.makedirs(os.path.join(folder, 'thumbnails'))
+        for index in range(screenshots):
+            with open(os.path.join(folder, f"20220917{index:06d}_1.jpg"), 'wb') as file:
+                file.write(data)
+
+
+def list_everything(root):
+    # What the browser did before: list the games, then every game's folder
+    count = 0
+    for app_id in os.listdir(root):
+        count += len(os.listdir(os.path.join(root, app_id, 'screenshots')))
+    return count
+
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return time.perf_counter() - start, result
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--games', type=int, default=200)
+    arg_parser.add_argument('--screenshots', type=int, default=250)
+    args = arg_parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='sse_index_bench_')
+    try:
+        root = os.path.join(work_dir, 'remote')
+        write_library(root, args.games, args.screenshots)
+        index = LibraryIndex(os.path.join(work_dir, 'library.db'))
+        print(f"{args.games} games x {args.screenshots} screenshots = {args.games * args.screenshots} files")
+
+        seconds, _ = timed(lambda: list_everything(root))
+        print(f"listdir every folder      {seconds * 1000:9.1f} ms")
+        seconds, changed = timed(lambda: index.refresh(root))
+        print(f"first scan                {seconds * 1000:9.1f} ms  {len(changed)} games scanned")
+        seconds, changed = timed(lambda: index.refresh(root))
+        print(f"relaunch, nothing changed {seconds * 1000:9.1f} ms  {len(changed)} games scanned")
+
+        folder = os.path.join(root, '1000', 'screenshots')
+        shutil.copy(os.path.join(folder, '20220917000000_1.jpg'), os.path.join(folder, '20221231235959_1.jpg'))
+        seconds, changed = timed(lambda: index.refresh(root))
+        print(f"relaunch, one game changed {seconds * 1000:8.1f} ms  {len(changed)} games scanned")
+
+        seconds, paths = timed(lambda: index.screenshot_paths('1000'))
+        print(f"one game's screenshots    {seconds * 1000:9.1f} ms  {len(paths)} files")
+        index.close()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
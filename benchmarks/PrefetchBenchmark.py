@@ -0,0 +1,99 @@
+"""
+Benchmark for loading the games at startup.
+
+It starts a local stub of the Steam store that answers every request (appdetails and header images) after a fixed
+delay, then resolves the metadata and header of the same set of app ids serially (the old startup path) and
+through load_games, the path the browser uses, at a few concurrency limits. Every run starts from an empty cache
+so every id is a cache miss.
+
+Usage: python benchmarks/PrefetchBenchmark.py --apps 100 --latency 0.05 --concurrency 4 8 16
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import SteamAppAPI
+from BenchmarkHelpers import start_stub_server
+from GameLoader import load_games
+from HeaderCache import HeaderCache
+from MetadataStore import MetadataStore
+from SteamAppAPI import RequestScheduler, SteamApp, create_session
+
+
+def unlimited_scheduler():
+    # The stub server has no rate limit, so don't hold the benchmark to the real store budget
+    return RequestScheduler(rate=1e6, burst=1e6)
+
+
+def fresh_store():
+    shutil.rmtree('cache', ignore_errors=True)
+    return MetadataStore('cache/metadata.db')
+
+
+def run_serial(app_ids):
+    store = fresh_store()
+    header_cache = HeaderCache('cache/headers', store=store)
+    scheduler = unlimited_scheduler()
+    start = time.perf_counter()
+    for x in app_ids:
+        header_cache.fetch_app(x, SteamApp(x, store=store, scheduler=scheduler))
+    elapsed = time.perf_counter() - start
+    store.close()
+    return elapsed
+
+
+def run_load_games(app_ids, concurrency):
+    store = fresh_store()
+    start = time.perf_counter()
+    load_games(app_ids, header_cache=HeaderCache('cache/headers', store=store), max_workers=concurrency,
+               session=create_session(concurrency), store=store, scheduler=unlimited_scheduler())
+    elapsed = time.perf_counter() - start
+    store.close()
+    return elapsed
+
+
+def run_warm(app_ids):
+    # Second launch: every id is already in the store (a single bulk query) and every header is on disk
+    store = MetadataStore('cache/metadata.db')
+    start = time.perf_counter()
+    load_games(app_ids, header_cache=HeaderCache('cache/headers', store=store), store=store)
+    elapsed = time.perf_counter() - start
+    store.close()
+    return elapsed
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--apps', type=int, default=100, help='Number of uncached app ids to resolve')
+    arg_parser.add_argument('--latency', type=float, default=0.05, help='Stub server delay per request, in seconds')
+    arg_parser.add_argument('--concurrency', type=int, nargs='+', default=[4, 8, 16])
+    args = arg_parser.parse_args()
+
+    server = start_stub_server(latency=args.latency)
+    SteamAppAPI.STORE_API_URL = f'http://127.0.0.1:{server.server_port}/api/appdetails'
+    app_ids = [str(100000 + x) for x in range(args.apps)]
+
+    work_dir = tempfile.mkdtemp(prefix='sse_prefetch_bench_')
+    old_cwd = os.getcwd()
+    os.chdir(work_dir)
+    try:
+        serial = run_serial(app_ids)
+        print(f"serial            {serial:8.3f}s  {args.apps / serial:8.1f} apps/s")
+        for concurrency in args.concurrency:
+            elapsed = run_load_games(app_ids, concurrency)
+            print(f"load_games j={concurrency:<4} {elapsed:8.3f}s  {args.apps / elapsed:8.1f} apps/s  "
+                  f"speedup x{serial / elapsed:.1f}")
+        print(f"warm store        {run_warm(app_ids):8.3f}s")
+    finally:
+        os.chdir(old_cwd)
+        shutil.rmtree(work_dir, ignore_errors=True)
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
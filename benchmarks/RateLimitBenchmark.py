@@ -0,0 +1,78 @@
+"""
+Checks the store request scheduler against a local fake appdetails server that enforces its own rate limit.
+
+The fake server allows --server-rate requests per second (with a small burst) and answers anything over that
+with 429 and a Retry-After header. It also fails a share of requests with 503 and reports some ids as delisted.
+The script resolves the library twice. The first pass should finish with every listed app resolved despite the
+429s, and the second pass should send no requests at all, because good ids come from the metadata store and
+delisted ids from the negative cache. The client rate defaults to twice the server's, so the first pass is
+throttled and the script fails if it saw no 429s or didn't recover from them.
+
+Usage: python benchmarks/RateLimitBenchmark.py --apps 60 --server-rate 20 --client-rate 40
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import SteamAppAPI
+from BenchmarkHelpers import ServerBucket, StubStoreHandler, start_stub_server
+from GameLoader import load_games
+from HeaderCache import HeaderCache
+from MetadataStore import MetadataStore
+from SteamAppAPI import RequestScheduler
+
+
+def run_pass(label, app_ids, store, header_cache, scheduler):
+    stats = StubStoreHandler.stats
+    before = dict(stats)
+    start = time.perf_counter()
+    games = load_games(app_ids, header_cache=header_cache, max_workers=8, store=store, scheduler=scheduler)
+    elapsed = time.perf_counter() - start
+    # Games the store doesn't know come back without a title
+    available = sum(1 for _, title in games.values() if title is not None)
+    print(f"{label:<12} {elapsed:7.2f}s  resolved {available}/{len(app_ids)}  "
+          f"requests {stats['requests'] - before['requests']}  429s {stats['429'] - before['429']}  "
+          f"503s {stats['503'] - before['503']}  client retries {scheduler.retries}")
+    return available, stats['429'] - before['429']
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--apps', type=int, default=60)
+    arg_parser.add_argument('--delisted', type=int, default=5, help='How many of the ids the server reports as gone')
+    arg_parser.add_argument('--server-rate', type=float, default=20, help='Requests per second the server allows')
+    arg_parser.add_argument('--client-rate', type=float, default=40,
+                            help='Scheduler token bucket rate, above --server-rate so the backoff path is exercised')
+    arg_parser.add_argument('--error-rate', type=float, default=0.05, help='Share of requests that get a 503')
+    args = arg_parser.parse_args()
+
+    app_ids = [str(200000 + x) for x in range(args.apps)]
+    # The fake store's apps have no header art, so only appdetails requests are made
+    server = start_stub_server(header_bytes=b'', with_headers=False, bucket=ServerBucket(args.server_rate, 5),
+                               error_rate=args.error_rate, delisted=app_ids[:args.delisted])
+    SteamAppAPI.STORE_API_URL = f'http://127.0.0.1:{server.server_port}/api/appdetails'
+
+    work_dir = tempfile.mkdtemp(prefix='sse_ratelimit_bench_')
+    try:
+        store = MetadataStore(os.path.join(work_dir, 'metadata.db'))
+        header_cache = HeaderCache(os.path.join(work_dir, 'headers'), store=store)
+        scheduler = RequestScheduler(rate=args.client_rate, burst=5, backoff_base=0.2, backoff_max=5)
+        available, throttled = run_pass('cold', app_ids, store, header_cache, scheduler)
+        if throttled == 0:
+            raise SystemExit("The server sent no 429s, raise --client-rate above --server-rate")
+        if available != args.apps - args.delisted:
+            raise SystemExit(f"Only {available} of {args.apps - args.delisted} listed apps resolved after the 429s")
+        run_pass('relaunch', app_ids, store, header_cache, RequestScheduler(rate=args.client_rate, burst=5))
+        store.close()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
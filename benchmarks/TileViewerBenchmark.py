@@ -0,0 +1,154 @@
+"""
+Benchmark for the full size viewer.
+
+It writes a synthetic 8K screenshot to a temp dir and opens it in a TileView on the offscreen Qt platform, in a
+process of its own so its peak memory can be read. It times:
+  - the first frame (the overview tile) and the whole window sharp at fit
+  - zooming to 100% in the middle of the image until the viewport is sharp
+  - a drag across the image at 100%, how long each frame took and how long until it was sharp again
+and reports the tile cache's size and the process's peak RSS. For comparison it also loads the whole image into
+one QPixmap, as the viewer would otherwise have to, and draws it scaled.
+
+Usage: python benchmarks/TileViewerBenchmark.py --width 7680 --height 4320
+"""
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from BenchmarkHelpers import peak_rss_mb
+
+VIEW_WIDTH, VIEW_HEIGHT = 1280, 720
+PAN_STEPS = 40
+TIMEOUT_S = 60
+
+
+def write_screenshot(path, width, height):
+    # Smooth noise compresses about as well as a game screenshot does
+    rng = np.random.default_rng(0)
+    small = rng.integers(0, 256, (height // 16, width // 16, 3), dtype=np.uint8)
+    image = cv2.resize(small, (width, height), interpolation=cv2.INTER_CUBIC)
+    cv2.imwrite(path, image)
+
+
+def is_sharp(view):
+    level = view.level()
+    if level == view.source.top_level:
+        return view.overview is not None
+    return all(x in view.tiles.pixmaps for x in view.tiles_in_view(level))
+
+
+def wait_until(app, condition):
+    start = time.perf_counter()
+    while not condition() and time.perf_counter() - start < TIMEOUT_S:
+        app.processEvents()
+        time.sleep(0.001)
+    return (time.perf_counter() - start) * 1000
+
+
+def run_tiles(app, path):
+    from PySide2.QtCore import QPoint
+    from TileViewer import TileView
+
+    start = time.perf_counter()
+    view = TileView(path)
+    view.resize(VIEW_WIDTH, VIEW_HEIGHT)
+    view.show()
+    wait_until(app, lambda: view.overview is not None)
+    first_frame = (time.perf_counter() - start) * 1000
+    wait_until(app, lambda: is_sharp(view))
+    fit_sharp = (time.perf_counter() - start) * 1000
+    print(f"region decoding {view.source.region_decoding}, {view.source.top_level + 1} levels")
+    print(f"first frame {first_frame:8.1f} ms   sharp at fit {fit_sharp:8.1f} ms")
+
+    start = time.perf_counter()
+    view.zoom_at(1.0, QPoint(VIEW_WIDTH // 2, VIEW_HEIGHT // 2))
+    view.repaint()
+    zoom_frame = (time.perf_counter() - start) * 1000
+    zoom_sharp = zoom_frame + wait_until(app, lambda: is_sharp(view))
+    print(f"zoom to 100%: frame {zoom_frame:6.1f} ms   sharp {zoom_sharp:8.1f} ms")
+
+    # Down and to the right across the image, a drag's worth of pixels per frame
+    frames = []
+    for step in range(PAN_STEPS):
+        start = time.perf_counter()
+        view.origin_x += 120
+        view.origin_y += 60
+        view.view_changed()
+        view.repaint()
+        app.processEvents()
+        frames.append((time.perf_counter() - start) * 1000)
+    pan_sharp = wait_until(app, lambda: is_sharp(view) and view.pending_count() == 0)
+    print(f"pan: frame mean {statistics.mean(frames):6.2f} ms  worst {max(frames):6.2f} ms   "
+          f"sharp {pan_sharp:8.1f} ms after the drag")
+    print(f"tile cache {view.tiles.used_bytes / 1e6:6.1f} MB in {len(view.tiles.pixmaps)} tiles   "
+          f"peak RSS {peak_rss_mb():7.1f} MB")
+    view.close()
+
+
+def run_full(app, path):
+    from PySide2.QtCore import Qt
+    from PySide2.QtGui import QPainter, QPixmap
+    from PySide2.QtWidgets import QWidget
+
+    start = time.perf_counter()
+    pixmap = QPixmap(path)
+    load = (time.perf_counter() - start) * 1000
+    widget = QWidget()
+    widget.resize(VIEW_WIDTH, VIEW_HEIGHT)
+    frames = []
+    for step in range(10):
+        start = time.perf_counter()
+        image = widget.grab().toImage()
+        painter = QPainter(image)
+        painter.setRenderHint(QPainter.SmoothPixmapTransform)
+        painter.drawPixmap(image.rect(), pixmap.scaled(widget.size(), Qt.KeepAspectRatio, Qt.SmoothTransformation))
+        painter.end()
+        frames.append((time.perf_counter() - start) * 1000)
+    print(f"whole image: load {load:8.1f} ms   scaled frame mean {statistics.mean(frames):6.2f} ms   "
+          f"pixmap {pixmap.width() * pixmap.height() * pixmap.depth() / 8 / 1e6:6.1f} MB   "
+          f"peak RSS {peak_rss_mb():7.1f} MB")
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--width', type=int, default=7680)
+    arg_parser.add_argument('--height', type=int, default=4320)
+    arg_parser.add_argument('--format', default='jpg', choices=['jpg', 'png'])
+    arg_parser.add_argument('--child', choices=['tiles', 'full'], help=argparse.SUPPRESS)
+    arg_parser.add_argument('--path', help=argparse.SUPPRESS)
+    args = arg_parser.parse_args()
+
+    if args.child is not None:
+        from PySide2.QtWidgets import QApplication
+        app = QApplication(sys.argv[:1])
+        print(f"baseline RSS {peak_rss_mb():7.1f} MB")
+        (run_tiles if args.child == 'tiles' else run_full)(app, args.path)
+        return
+
+    tmp_dir = tempfile.mkdtemp(prefix='tile_viewer_bench_')
+    try:
+        path = os.path.join(tmp_dir, f"screenshot.{args.format}")
+        write_screenshot(path, args.width, args.height)
+        print(f"{args.width}x{args.height} {args.format}, {os.path.getsize(path) / 1e6:.1f} MB on disk, "
+              f"{VIEW_WIDTH}x{VIEW_HEIGHT} window")
+        for child in ('tiles', 'full'):
+            print(f"-- {child}")
+            subprocess.run([sys.executable, os.path.abspath(__file__), '--child', child, '--path', path],
+                           check=True)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
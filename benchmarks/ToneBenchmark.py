@@ -0,0 +1,69 @@
+"""
+Compares the lookup table tone engine with the HSV round trip the editor used for brightness.
+
+The HSV path converts BGR to HSV, splits, adds to V, clamps, merges and converts back. apply_tone folds
+brightness, contrast, gamma and levels into one table and makes a single cv2.LUT pass, so it is timed both with
+brightness alone and with every adjustment set.
+
+Usage: python benchmarks/ToneBenchmark.py --width 3840 --height 2160 --runs 10
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+import numpy as np
+
+from ImagePipeline import Tone, apply_tone, build_tone_lut
+
+
+def hsv_brightness(img, brightness_lvl):
+    # The editor's original set_brightness_levels
+    hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
+    h, s, v = cv2.split(hsv)
+    v = cv2.add(v, brightness_lvl)
+    v[v > 255] = 255
+    v[v < 0] = 0
+    final_hsv = cv2.merge((h, s, v))
+    return cv2.cvtColor(final_hsv, cv2.COLOR_HSV2BGR)
+
+
+def median_ms(function, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--width', type=int, default=3840)
+    arg_parser.add_argument('--height', type=int, default=2160)
+    arg_parser.add_argument('--runs', type=int, default=10)
+    args = arg_parser.parse_args()
+
+    img = np.random.default_rng(0).integers(0, 256, (args.height, args.width, 3), dtype=np.uint8)
+    brightness = Tone(brightness=20)
+    everything = Tone(brightness=20, contrast=15, gamma=1.2, black=10, white=245)
+
+    hsv = median_ms(lambda: hsv_brightness(img, 20), args.runs)
+    lut = median_ms(lambda: apply_tone(img, brightness), args.runs)
+    fused = median_ms(lambda: apply_tone(img, everything), args.runs)
+    build_tone_lut.cache_clear()
+    table = median_ms(lambda: (build_tone_lut.cache_clear(), build_tone_lut(everything)), args.runs)
+
+    print(f"{args.width}x{args.height}, median of {args.runs} runs")
+    print(f"HSV round trip, brightness        {hsv:8.2f} ms")
+    print(f"LUT, brightness                   {lut:8.2f} ms   x{hsv / lut:.1f}")
+    print(f"LUT, all four adjustments         {fused:8.2f} ms   x{hsv / fused:.1f}")
+    print(f"building the table (uncached)     {table:8.3f} ms")
+
+
+if __name__ == "__main__":
+    main()